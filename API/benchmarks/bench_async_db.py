@@ -0,0 +1,98 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: bench_async_db.py
+
+Description: Load test comparing the blocking
+SQLAlchemy path (def handlers on FastAPI's
+threadpool) against the async engine path (async
+def handlers on the event loop). Both routes run
+the same task page query in the same uvicorn
+process. The gap is largest against a networked
+MySQL server; point DATABASE_URL at one to
+measure it. SQLite only gives a local baseline.
+
+Usage (from the repository root):
+    python -m API.benchmarks.bench_async_db --concurrency 200 --duration 10
+***********************************************
+"""
+import argparse
+import asyncio
+import time
+from .common import configure_environment, create_schema, run_server, seed_tasks, summarize
+
+configure_environment("async_db")
+
+from fastapi import Depends, FastAPI
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from Database.src import database, models
+
+PAGE_SIZE = 100
+
+bench_app = FastAPI()
+
+
+@bench_app.get("/sync/tasks")
+def read_tasks_sync(owner_id: int, db: Session = Depends(database.get_sync_db)):
+    query = select(models.Task).where(models.Task.owner_id == owner_id).order_by(models.Task.id).limit(PAGE_SIZE)
+    return [{"id": t.id, "title": t.title} for t in db.execute(query).scalars()]
+
+
+@bench_app.get("/async/tasks")
+async def read_tasks_async(owner_id: int, db: AsyncSession = Depends(database.get_db)):
+    query = select(models.Task).where(models.Task.owner_id == owner_id).order_by(models.Task.id).limit(PAGE_SIZE)
+    result = await db.execute(query)
+    return [{"id": t.id, "title": t.title} for t in result.scalars()]
+
+
+async def drive(url: str, concurrency: int, duration: float):
+    import httpx
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await client.get(url)
+            if response.status_code != 200:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return {**summarize(latencies, duration), "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--tasks", type=int, default=10_000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    create_schema()
+    with database.SessionLocal() as db:
+        user = models.User(username="bench", hashed_password="x")
+        db.add(user)
+        db.commit()
+        owner_id = user.id
+    seed_tasks(owner_id, args.tasks)
+
+    with run_server("API.benchmarks.bench_async_db:bench_app", args.port) as base_url:
+        print(f"{'mode':>6} {'req/s':>10} {'p50':>10} {'p99':>10} {'errors':>8}")
+        for mode in ("sync", "async"):
+            url = f"{base_url}/{mode}/tasks?owner_id={owner_id}"
+            stats = asyncio.run(drive(url, args.concurrency, args.duration))
+            print(f"{mode:>6} {stats['rps']:>10.1f} {stats['p50']:>8.2f}ms {stats['p99']:>8.2f}ms {stats['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: bench_auth.py
+
+Description: Micro-benchmark of the cost of
+authorizing one request, i.e. of get_current_user.
+It times the JWT check on its own and then each
+path a request can take:
+
+- username token: a token from before token
+  versions (only "sub"), checked and looked up in
+  the users table, as every cache miss used to be
+- claims token: a token with "uid" and "ver",
+  checked with the user's token version cached
+- claims token, version read: the same with the
+  version read from the database (a cache miss)
+- token cache hit: a token verified before
+
+Usage (from the repository root):
+    python -m API.benchmarks.bench_auth --users 1000 --repeat 2000
+***********************************************
+"""
+import argparse
+import asyncio
+import time
+from .common import configure_environment, create_schema
+
+configure_environment("auth")
+
+from sqlalchemy import insert
+from Database.src import database, models
+from API.src.app import auth
+
+
+async def per_call(func, tokens, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        await func(tokens[i % len(tokens)])
+    return (time.perf_counter() - start) / repeat * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=2_000)
+    args = parser.parse_args()
+
+    create_schema()
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"username": f"authuser{i}", "hashed_password": "x"} for i in range(args.users)
+        ])
+    ids = range(1, args.users + 1)
+    username_tokens = [auth.create_access_token({"sub": f"authuser{i - 1}"}) for i in ids]
+    claims_tokens = [auth.create_tokens(i, f"authuser{i - 1}", 0)["access_token"] for i in ids]
+
+    async def decode(token):
+        auth.decode_access_token(token)
+
+    async def run():
+        async with database.AsyncSessionLocal() as db:
+            async def authorize(token):
+                # Time the verification itself, not the token cache
+                auth.token_cache.clear()
+                await auth.get_current_user(token, db)
+
+            async def authorize_uncached(token):
+                auth.token_versions.clear()
+                await authorize(token)
+
+            async def cached(token):
+                await auth.get_current_user(token, db)
+
+            # Warm up the connection and the caches
+            for token in claims_tokens:
+                await cached(token)
+            await authorize(username_tokens[0])
+
+            results = {
+                "JWT check only": await per_call(decode, claims_tokens, args.repeat),
+                "username token": await per_call(authorize, username_tokens, args.repeat),
+                "claims token": await per_call(authorize, claims_tokens, args.repeat),
+                "claims token, version read": await per_call(authorize_uncached, claims_tokens, args.repeat),
+            }
+            hot = claims_tokens[:auth.get_auth_settings().auth_cache_max_size]
+            for token in hot:
+                await cached(token)
+            results["token cache hit"] = await per_call(cached, hot, args.repeat)
+            return results
+
+    results = asyncio.run(run())
+    print(f"Authorizing one request, {args.users:,} users (mean of {args.repeat:,} calls)")
+    for label, micros in results.items():
+        print(f"{label:>28} {micros:>9.1f}us")
+
+
+if __name__ == "__main__":
+    main()
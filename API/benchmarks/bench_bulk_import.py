@@ -0,0 +1,66 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: bench_bulk_import.py
+
+Description: Benchmark for importing tasks. It
+times one POST /tasks/bulk call carrying the
+whole import, a bulk "mark all done" PATCH and a
+bulk DELETE. It then times a sample of single-task
+POSTs and projects their cost to the same number
+of tasks for comparison.
+
+Usage (from the repository root):
+    python -m API.benchmarks.bench_bulk_import --tasks 10000
+***********************************************
+"""
+import argparse
+import time
+from .common import configure_environment, create_schema
+
+configure_environment("bulk_import")
+
+from fastapi.testclient import TestClient
+from API.src.app.main import tdlapp
+
+
+def timed(func):
+    start = time.perf_counter()
+    response = func()
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    return response, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=10_000)
+    parser.add_argument("--single-sample", type=int, default=200)
+    args = parser.parse_args()
+
+    create_schema()
+    client = TestClient(tdlapp)
+    created = client.post("/users/", json={"username": "importer", "password": "importpass"})
+    headers = {"Authorization": f"Bearer {created.json()['access_token']}"}
+
+    payload = [{"title": f"Imported {i}", "description": "From the importer"} for i in range(args.tasks)]
+    response, bulk_create = timed(lambda: client.post("/tasks/bulk", json=payload, headers=headers))
+    ids = [r["id"] for r in response.json()]
+    _, bulk_update = timed(lambda: client.patch("/tasks/bulk", json=[{"id": i, "completed": True} for i in ids], headers=headers))
+    _, bulk_delete = timed(lambda: client.request("DELETE", "/tasks/bulk", json=ids, headers=headers))
+
+    start = time.perf_counter()
+    for i in range(args.single_sample):
+        client.post("/tasks/", json={"title": f"Single {i}"}, headers=headers).raise_for_status()
+    single = (time.perf_counter() - start) / args.single_sample * args.tasks
+
+    print(f"{args.tasks:,} tasks")
+    print(f"  bulk create:            {bulk_create * 1000:>10.1f} ms")
+    print(f"  bulk mark done:         {bulk_update * 1000:>10.1f} ms")
+    print(f"  bulk delete:            {bulk_delete * 1000:>10.1f} ms")
+    print(f"  single creates (proj.): {single * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: bench_compression.py
+
+Description: Measures what response compression
+costs and saves on task lists of 1k and 10k tasks.
+For each encoding available here (gzip always, br
+and zstd when brotli/zstandard are installed) and
+a few levels, it reports the bytes on the wire and
+the median CPU time to compress the real
+GET /tasks/ body. The time is what a worker spends
+per response, on the event loop or in a thread.
+
+Usage (from the repository root):
+    python -m API.benchmarks.bench_compression --tasks 1000 10000
+***********************************************
+"""
+import argparse
+import asyncio
+import time
+from statistics import median
+from .common import configure_environment, create_schema, seed_tasks
+
+configure_environment("compression")
+
+from sqlalchemy import select
+from Database.src import database, models
+from API.src.app.compression import load_codecs
+from API.src.app.responses import FastJSONResponse
+from API.src.app.routes.tasks import TASK_COLUMNS
+
+LEVELS = {
+    "gzip": [1, 6, 9],
+    "br": [1, 4, 11],
+    "zstd": [1, 3, 19],
+}
+
+
+async def task_list_body(owner_id, limit):
+    async with database.AsyncSessionLocal() as db:
+        query = select(*TASK_COLUMNS).where(models.Task.owner_id == owner_id).order_by(models.Task.id).limit(limit)
+        return FastJSONResponse([row._asdict() for row in await db.execute(query)]).body
+
+
+def cpu_ms(func, body, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.process_time()
+        func(body)
+        samples.append((time.process_time() - start) * 1000)
+    return median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    create_schema()
+    with database.SessionLocal() as db:
+        user = models.User(username="compressor", hashed_password="x")
+        db.add(user)
+        db.commit()
+        owner_id = user.id
+    seed_tasks(owner_id, max(args.tasks))
+
+    for count in args.tasks:
+        body = asyncio.run(task_list_body(owner_id, count))
+        print(f"\n{count:,} tasks: {len(body):,} bytes uncompressed (median of {args.repeat})")
+        print(f"{'encoding':>10} {'level':>6} {'bytes':>12} {'ratio':>7} {'cpu':>10}")
+        for encoding, levels in LEVELS.items():
+            for level in levels:
+                codecs = load_codecs({"gzip": level, "br": level, "zstd": level})
+                if encoding not in codecs:
+                    print(f"{encoding:>10} {'-':>6} {'not installed':>12}")
+                    break
+                size = len(codecs[encoding](body))
+                elapsed = cpu_ms(codecs[encoding], body, args.repeat)
+                print(f"{encoding:>10} {level:>6} {size:>12,} {len(body) / size:>6.1f}x {elapsed:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
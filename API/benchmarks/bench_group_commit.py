@@ -0,0 +1,89 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: bench_group_commit.py
+
+Description: Benchmark for write-behind group
+commit. Many clients toggle the completed box on
+their own tasks as fast as they can, like a user
+clicking through a list. It runs once with one
+commit per request and once with GROUP_COMMIT=true.
+It reports writes/sec, commits/sec and latency for
+each. Group commit should need far fewer commits
+(and fsyncs) for the same writes.
+
+Usage (from the repository root):
+    python -m API.benchmarks.bench_group_commit --clients 64 --duration 10
+***********************************************
+"""
+import argparse
+import asyncio
+import random
+import time
+from .common import configure_environment, create_schema, run_server, summarize
+
+configure_environment("group_commit")
+
+
+async def toggle_load(base_url: str, clients: int, tasks_per_client: int, duration: float) -> tuple:
+    import httpx
+    latencies = []
+    errors = 0
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=httpx.Limits(max_connections=clients)) as http:
+        accounts = []
+        for n in range(clients):
+            username = f"toggle{n}_{time.monotonic_ns()}"
+            created = await http.post("/users/", json={"username": username, "password": "togglepass"})
+            headers = {"Authorization": f"Bearer {created.json()['access_token']}"}
+            items = [{"title": f"Task {i}"} for i in range(tasks_per_client)]
+            result = await http.post("/tasks/bulk", json=items, headers=headers)
+            accounts.append((headers, [entry["id"] for entry in result.json()]))
+
+        deadline = time.perf_counter() + duration
+
+        async def client_loop(headers, task_ids):
+            nonlocal errors
+            rng = random.Random(task_ids[0])
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await http.patch(
+                    f"/tasks/{rng.choice(task_ids)}", json={"completed": rng.random() < 0.5}, headers=headers
+                )
+                if response.status_code != 200:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(client_loop(headers, task_ids) for headers, task_ids in accounts))
+        metrics = (await http.get("/metrics")).text
+    groups = next(
+        (float(line.split()[-1]) for line in metrics.splitlines() if line.startswith("tdl_group_commit_groups_total")), 0.0
+    )
+    return latencies, errors, groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--tasks", type=int, default=50, help="tasks per client")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--delay-ms", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=8769)
+    args = parser.parse_args()
+
+    print(f"{'mode':>14} {'writes/s':>9} {'commits/s':>10} {'p50':>10} {'p99':>10} {'errors':>7}")
+    for mode, enabled in (("per request", "false"), ("group commit", "true")):
+        create_schema()
+        env = {"GROUP_COMMIT": enabled, "GROUP_COMMIT_MAX_DELAY_MS": str(args.delay_ms), "BCRYPT_ROUNDS": "4"}
+        with run_server("API.src.app.main:tdlapp", args.port, env=env) as base_url:
+            latencies, errors, groups = asyncio.run(toggle_load(base_url, args.clients, args.tasks, args.duration))
+        stats = summarize(latencies, args.duration)
+        # Without group commit every successful write is its own commit
+        commits = groups / args.duration if enabled == "true" else stats["rps"]
+        print(f"{mode:>14} {stats['rps']:>9.1f} {commits:>10.1f} {stats['p50']:>8.2f}ms "
+              f"{stats['p99']:>8.2f}ms {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
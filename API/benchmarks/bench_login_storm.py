@@ -0,0 +1,81 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: bench_login_storm.py
+
+Description: Benchmark for password hashing under
+load. It measures GET /tasks/ latency on its own,
+then again while a storm of concurrent logins runs.
+bcrypt runs on the bounded password hash pool, so
+task reads should keep close to their idle latency
+and excess logins should get a fast 503.
+
+Usage (from the repository root):
+    python -m API.benchmarks.bench_login_storm --logins 64 --duration 10
+***********************************************
+"""
+import argparse
+import asyncio
+import time
+from .common import configure_environment, create_schema, run_server, seed_tasks, summarize
+
+configure_environment("login_storm")
+
+
+async def read_loop(client, headers, deadline, latencies):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/tasks/", headers=headers)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def login_loop(client, deadline, results):
+    form = {"username": "stormuser", "password": "stormpass"}
+    while time.perf_counter() < deadline:
+        response = await client.post("/login", data=form)
+        results[response.status_code] = results.get(response.status_code, 0) + 1
+
+
+async def run_phase(base_url, headers, readers, logins, duration):
+    import httpx
+    latencies = []
+    results = {}
+    deadline = time.perf_counter() + duration
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=httpx.Limits(max_connections=None)) as client:
+        await asyncio.gather(
+            *(read_loop(client, headers, deadline, latencies) for _ in range(readers)),
+            *(login_loop(client, deadline, results) for _ in range(logins)),
+        )
+    return summarize(latencies, duration), results
+
+
+def main():
+    import httpx
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--tasks", type=int, default=1_000)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    create_schema()
+    with run_server("API.src.app.main:tdlapp", args.port) as base_url:
+        created = httpx.post(base_url + "/users/", json={"username": "reader", "password": "readerpass"}).json()
+        headers = {"Authorization": f"Bearer {created['access_token']}"}
+        httpx.post(base_url + "/users/", json={"username": "stormuser", "password": "stormpass"})
+        seed_tasks(httpx.get(base_url + "/users/me", headers=headers).json()["id"], args.tasks)
+
+        idle, _ = asyncio.run(run_phase(base_url, headers, args.readers, 0, args.duration))
+        storm, logins = asyncio.run(run_phase(base_url, headers, args.readers, args.logins, args.duration))
+
+    print(f"{'phase':>8} {'reads/s':>10} {'p50':>10} {'p99':>10}")
+    for name, stats in (("idle", idle), ("storm", storm)):
+        print(f"{name:>8} {stats['rps']:>10.1f} {stats['p50']:>8.2f}ms {stats['p99']:>8.2f}ms")
+    print("login responses during storm:", dict(sorted(logins.items())))
+
+
+if __name__ == "__main__":
+    main()
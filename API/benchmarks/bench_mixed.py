@@ -0,0 +1,286 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: bench_mixed.py
+
+Description: Reproducible mixed-workload load test
+for the API. It seeds users that each own between
+--min-tasks and --max-tasks tasks. Then it runs
+login, list, get, create, update and delete
+requests in the proportions given by --mix, from
+--concurrency virtual users, for --duration
+seconds. It writes throughput and p50/p95/p99
+latency for each endpoint to a JSON file. Diff two
+of those files with API.benchmarks.compare to see
+how a change affected performance.
+
+Every virtual user picks its operations from its
+own seeded random generator, so the same --seed
+replays the same request mix. By default the
+benchmark starts its own server on a scratch
+SQLite file. Set DATABASE_URL to use a real
+database, and --workers to go through the
+production launcher. To load an already running
+server, pass --base-url and point DATABASE_URL at
+that server's database (tasks are seeded directly
+through it).
+
+Usage (from the repository root):
+    python -m API.benchmarks.bench_mixed --users 4 --concurrency 32 --duration 30 --output before.json
+***********************************************
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from .common import configure_environment, create_schema, run_server, seed_tasks, summarize
+
+configure_environment("mixed")
+
+DEFAULT_MIX = "list=45,get=20,create=15,update=10,delete=5,login=5"
+
+# What each operation sends, for the report
+ROUTES = {
+    "login": "POST /login",
+    "list": "GET /tasks/",
+    "get": "GET /tasks/{task_id}",
+    "create": "POST /tasks/",
+    "update": "PUT /tasks/{task_id}",
+    "delete": "DELETE /tasks/{task_id}",
+}
+
+
+"""
+***********************************************
+Method: parse_mix()
+
+Description: This method is used to read the
+operation weights from --mix.
+
+Parameters:
+- text (str): Weights such as "list=50,create=50".
+
+returns: A dictionary of operation to weight.
+***********************************************
+"""
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise SystemExit(f"Unknown operation {name!r} in --mix (choose from {', '.join(ROUTES)})")
+        mix[name] = float(weight)
+    return mix
+
+
+"""
+***********************************************
+Method: seed_accounts()
+
+Description: This method is used to create the
+benchmark users through the API and seed their
+tasks through the engine.
+
+Parameters:
+- base_url (str): The server address.
+- args (Namespace): The command line settings.
+- rng (Random): Picks each user's task count.
+
+returns: A list of accounts with their token and
+task ids.
+***********************************************
+"""
+def seed_accounts(base_url: str, args, rng: random.Random) -> list:
+    import httpx
+    from sqlalchemy import select
+    from Database.src import database, models
+    run_id = int(time.time()) if args.base_url else args.seed
+    accounts = []
+    for n in range(args.users):
+        username = f"load{run_id}_{n}"
+        password = "loadpass"
+        created = httpx.post(base_url + "/users/", json={"username": username, "password": password}, timeout=60)
+        created.raise_for_status()
+        token = created.json()["access_token"]
+        owner_id = httpx.get(base_url + "/users/me", headers={"Authorization": f"Bearer {token}"}).json()["id"]
+        count = rng.randint(args.min_tasks, args.max_tasks)
+        seed_tasks(owner_id, count)
+        with database.engine.connect() as conn:
+            task_ids = conn.execute(select(models.Task.id).where(models.Task.owner_id == owner_id)).scalars().all()
+        accounts.append({
+            "username": username,
+            "password": password,
+            "headers": {"Authorization": f"Bearer {token}"},
+            "task_ids": task_ids,
+            "created": [],
+        })
+        print(f"seeded {username} with {count} tasks")
+    return accounts
+
+
+"""
+***********************************************
+Method: run_load()
+
+Description: This method is used to drive the
+mixed workload at the server.
+
+Parameters:
+- base_url (str): The server address.
+- accounts (list): Accounts from seed_accounts().
+- mix (dict): Operation weights.
+- args (Namespace): The command line settings.
+
+returns: Latencies (ms) and error counts per
+operation.
+***********************************************
+"""
+async def run_load(base_url: str, accounts: list, mix: dict, args) -> tuple:
+    import httpx
+    latencies = {name: [] for name in mix}
+    errors = {name: 0 for name in mix}
+    names, weights = list(mix), list(mix.values())
+    deadline = time.perf_counter() + args.duration
+
+    async def request(client, name, account, rng):
+        if name == "delete" and not account["created"]:
+            name = "create"  # Only delete tasks made during the run
+        if name == "login":
+            data = {"username": account["username"], "password": account["password"]}
+            return name, await client.post("/login", data=data)
+        headers = account["headers"]
+        if name == "list":
+            params = {"limit": 100}
+            if rng.random() < 0.5:
+                params["after"] = rng.choice(account["task_ids"])
+            return name, await client.get("/tasks/", params=params, headers=headers)
+        if name == "get":
+            return name, await client.get(f"/tasks/{rng.choice(account['task_ids'])}", headers=headers)
+        if name == "create":
+            body = {"title": f"Load task {rng.randrange(10**6)}", "description": "Created by bench_mixed"}
+            response = await client.post("/tasks/", json=body, headers=headers)
+            if response.status_code == 200:
+                account["created"].append(response.json()["id"])
+            return name, response
+        if name == "update":
+            body = {"title": f"Updated {rng.randrange(10**6)}", "completed": rng.random() < 0.5}
+            return name, await client.put(f"/tasks/{rng.choice(account['task_ids'])}", json=body, headers=headers)
+        task_id = account["created"].pop(rng.randrange(len(account["created"])))
+        return name, await client.delete(f"/tasks/{task_id}", headers=headers)
+
+    async def virtual_user(client, index):
+        rng = random.Random(args.seed * 100_003 + index)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            account = rng.choice(accounts)
+            start = time.perf_counter()
+            try:
+                name, response = await request(client, name, account, rng)
+            except httpx.TransportError:
+                errors[name] += 1
+                continue
+            if response.status_code >= 400:
+                errors[name] += 1
+                continue
+            latencies.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await asyncio.gather(*(virtual_user(client, index) for index in range(args.concurrency)))
+    return latencies, errors
+
+
+"""
+***********************************************
+Method: build_report()
+
+Description: This method is used to turn the raw
+latencies into the JSON report.
+
+returns: The report dictionary.
+***********************************************
+"""
+def build_report(latencies: dict, errors: dict, args, server: str) -> dict:
+    from Database.src import database
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    def rounded(stats):
+        return {key: round(value, 3) if isinstance(value, float) else value for key, value in stats.items()}
+
+    endpoints = {}
+    for name, samples in latencies.items():
+        endpoints[name] = {"route": ROUTES[name], **rounded(summarize(samples, args.duration)), "errors": errors.get(name, 0)}
+    every = [sample for samples in latencies.values() for sample in samples]
+    return {
+        "meta": {
+            "commit": commit,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "database": database.engine.dialect.name,
+            "server": server,
+            "args": vars(args),
+        },
+        "endpoints": endpoints,
+        "total": {**rounded(summarize(every, args.duration)), "errors": sum(errors.values())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--min-tasks", type=int, default=10_000)
+    parser.add_argument("--max-tasks", type=int, default=100_000)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=0, help="run the production launcher with this many workers")
+    parser.add_argument("--base-url", default=None, help="load an already running server instead")
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--output", default="bench_mixed.json")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+
+    if args.base_url:
+        server, context = args.base_url, nullcontext(args.base_url.rstrip("/"))
+    else:
+        create_schema()
+        if args.workers:
+            server = f"launcher, {args.workers} workers"
+            env = {"WEB_CONCURRENCY": str(args.workers), "API_PORT": str(args.port),
+                   "API_HOST": "127.0.0.1", "LOG_LEVEL": "warning"}
+            context = run_server("", args.port, command=[sys.executable, "-m", "API.src.app.server"], env=env)
+        else:
+            server = "uvicorn, 1 worker"
+            context = run_server("API.src.app.main:tdlapp", args.port)
+
+    with context as base_url:
+        accounts = seed_accounts(base_url, args, rng)
+        latencies, errors = asyncio.run(run_load(base_url, accounts, mix, args))
+
+    report = build_report(latencies, errors, args, server)
+    with open(args.output, "w") as handle:
+        json.dump(report, handle, indent=2)
+
+    print(f"{'operation':>10} {'req/s':>9} {'p50':>10} {'p95':>10} {'p99':>10} {'errors':>7}")
+    for name, stats in report["endpoints"].items():
+        print(f"{name:>10} {stats['rps']:>9.1f} {stats['p50']:>8.2f}ms {stats['p95']:>8.2f}ms "
+              f"{stats['p99']:>8.2f}ms {stats['errors']:>7}")
+    print(f"Report written to {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: bench_reorder.py
+
+Description: Benchmark of drag-and-drop reordering
+on one user's 50k-task list. It times
+POST /tasks/{id}/move for random drags and for
+drags into the same spot over and over, which
+wears the gap down until the neighbours have to
+be spread out. For comparison it times the usual
+alternative: integer positions, where every task
+between the old and the new place is renumbered.
+That one runs straight on the engine, without the
+HTTP layer, so the comparison is in its favour.
+It also times the first and a deep page of the
+list in each sort order and shows the deep page's
+query plan.
+
+Usage (from the repository root):
+    python -m API.benchmarks.bench_reorder --tasks 50000 --moves 500
+***********************************************
+"""
+import argparse
+import random
+import time
+from .common import configure_environment, create_schema, seed_tasks, summarize, time_call
+
+configure_environment("reorder")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select, text, update
+from Database.src import database, models
+from API.src.app.main import tdlapp
+from API.src.app.routes import tasks
+
+
+def signup(client, username):
+    created = client.post("/users/", json={"username": username, "password": "benchpass"})
+    headers = {"Authorization": f"Bearer {created.json()['access_token']}"}
+    return headers, client.get("/users/me", headers=headers).json()["id"]
+
+
+def task_ids(owner_id):
+    with database.engine.connect() as conn:
+        return conn.execute(
+            select(models.Task.id).where(models.Task.owner_id == owner_id).order_by(models.Task.id)
+        ).scalars().all()
+
+
+def timed_moves(client, headers, drags):
+    latencies = []
+    for task_id, after_id in drags:
+        start = time.perf_counter()
+        response = client.post(f"/tasks/{task_id}/move", json={"after_id": after_id}, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.text
+    return latencies
+
+
+"""
+***********************************************
+Method: explain()
+
+Description: This method is used to show how the
+database runs a query: on MySQL the access type,
+index and estimated rows (a deep page should be
+"range" on the sort's index with about a page of
+rows), on SQLite the query plan.
+
+Parameters:
+- query: The SELECT statement.
+
+returns: A one-line summary of the plan.
+***********************************************
+"""
+def explain(query):
+    sql = str(query.compile(database.engine, compile_kwargs={"literal_binds": True}))
+    with database.engine.connect() as conn:
+        if database.engine.dialect.name == "mysql":
+            rows = conn.exec_driver_sql("EXPLAIN " + sql).mappings().all()
+            return "; ".join(f"type={r['type']} key={r['key']} rows={r['rows']} {r['Extra'] or ''}".strip() for r in rows)
+        return "; ".join(row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql))
+
+
+def renumber_move(conn, owner_id, task_id, after_id):
+    # Integer positions 1..n: shift everything between the two places by one
+    owned = models.Task.owner_id == owner_id
+    old = conn.execute(select(models.Task.position).where(models.Task.id == task_id)).scalar_one()
+    new = conn.execute(select(models.Task.position).where(models.Task.id == after_id)).scalar_one()
+    if new < old:
+        new += 1
+        shifted = conn.execute(
+            update(models.Task).where(owned, models.Task.position >= new, models.Task.position < old)
+            .values(position=models.Task.position + 1)
+        )
+    else:
+        shifted = conn.execute(
+            update(models.Task).where(owned, models.Task.position > old, models.Task.position <= new)
+            .values(position=models.Task.position - 1)
+        )
+    conn.execute(update(models.Task).where(models.Task.id == task_id).values(position=new))
+    return shifted.rowcount + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=50_000)
+    parser.add_argument("--moves", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    create_schema()
+    client = TestClient(tdlapp)
+    headers, owner_id = signup(client, "reorder")
+    seed_tasks(owner_id, args.tasks)
+    with database.engine.begin() as conn:
+        # Spread due dates and priorities over the list for the sorted pages
+        conn.execute(text(
+            "UPDATE tasks SET priority = id % 4,"
+            " due_at = CASE WHEN id % 5 = 0 THEN NULL ELSE DATETIME('2030-01-01', '+' || (id * 7919 % 100000) || ' minutes') END"
+            if database.engine.dialect.name == "sqlite" else
+            "UPDATE tasks SET priority = id % 4,"
+            " due_at = IF(id % 5 = 0, NULL, TIMESTAMP('2030-01-01') + INTERVAL (id * 7919 % 100000) MINUTE)"
+        ))
+    ids = task_ids(owner_id)
+
+    rebalanced = []
+    original = tasks.rebalance_positions
+    async def counting_rebalance(*rebalance_args):
+        rebalanced.append(await original(*rebalance_args))
+        return rebalanced[-1]
+    tasks.rebalance_positions = counting_rebalance
+
+    print(f"Drag-and-drop on a {args.tasks:,}-task list ({args.moves} moves each)")
+    print(f"{'':>32} {'p50':>9} {'p95':>9} {'p99':>9} {'rows/move':>10}")
+
+    def report(label, latencies, rows):
+        stats = summarize(latencies, 1)
+        print(f"{label:>32} {stats['p50']:>7.2f}ms {stats['p95']:>7.2f}ms {stats['p99']:>7.2f}ms {rows:>10.1f}")
+
+    drags = [tuple(rng.sample(ids, 2)) for _ in range(args.moves)]
+    latencies = timed_moves(client, headers, drags)
+    report("fractional, random drags", latencies, 1 + sum(rebalanced) / args.moves)
+
+    rebalanced.clear()
+    anchor, pair = ids[0], rng.sample(ids[1:], 2)
+    drags = [(pair[i % 2], anchor) for i in range(args.moves)]
+    latencies = timed_moves(client, headers, drags)
+    report("fractional, same spot", latencies, 1 + sum(rebalanced) / args.moves)
+    print(f"{'':>32} ({len(rebalanced)} rebalances of up to {max(rebalanced, default=0)} tasks)")
+    tasks.rebalance_positions = original
+
+    # The same random drags with integer positions on a second list
+    _, other_id = signup(client, "renumber")
+    seed_tasks(other_id, args.tasks)
+    with database.engine.begin() as conn:
+        first = conn.execute(select(func.min(models.Task.id)).where(models.Task.owner_id == other_id)).scalar_one()
+        conn.execute(
+            update(models.Task).where(models.Task.owner_id == other_id).values(position=models.Task.id - first + 1)
+        )
+    other_ids = task_ids(other_id)
+    latencies, rows = [], 0
+    for _ in range(args.moves):
+        task_id, after_id = rng.sample(other_ids, 2)
+        start = time.perf_counter()
+        with database.engine.begin() as conn:
+            rows += renumber_move(conn, other_id, task_id, after_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    report("renumber, random drags", latencies, rows / args.moves)
+
+    print(f"\n{'page of 100 sorted by':>32} {'first':>9} {'deep':>9}  deep page plan")
+    for sort in ("id", "position", "due_at", "priority"):
+        def page(**params):
+            return lambda: client.get("/tasks/", params={"limit": 100, "sort": sort, **params}, headers=headers)
+        # The deep page starts 90% of the way through the list
+        params, cursor = {"limit": 500, "sort": sort}, None
+        for _ in range(args.tasks * 9 // 10 // 500):
+            response = client.get("/tasks/", params={**params, **({"after": cursor} if cursor else {})}, headers=headers)
+            cursor = response.headers.get("X-Next-Cursor") or cursor
+        plan = explain(tasks.task_page_query(owner_id, sort, tasks.decode_cursor(cursor, sort)).limit(101))
+        print(f"{sort:>32} {time_call(page()):>7.2f}ms {time_call(page(after=cursor)):>7.2f}ms  {plan}")
+
+
+if __name__ == "__main__":
+    main()
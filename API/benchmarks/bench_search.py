@@ -0,0 +1,82 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: bench_search.py
+
+Description: Benchmark for GET /tasks/search. It
+seeds one user with --tasks tasks whose titles and
+descriptions are drawn from a small vocabulary of
+to-do words. It times the first search, which
+builds the in-process index when not on MySQL, and
+then the median and p95 latency of common, rare,
+prefix and multi-word queries. The goal is under
+20 ms for 100k tasks.
+
+Usage (from the repository root):
+    python -m API.benchmarks.bench_search --tasks 100000
+***********************************************
+"""
+import argparse
+import random
+import time
+from .common import configure_environment, create_schema, seed_tasks, summarize
+
+configure_environment("search")
+
+from fastapi.testclient import TestClient
+from API.src.app.main import tdlapp
+
+VERBS = ["buy", "call", "email", "fix", "plan", "book", "clean", "review", "write", "pay", "order", "pick"]
+NOUNS = ["milk", "bread", "report", "car", "dentist", "invoice", "garden", "slides", "rent", "tickets",
+         "laptop", "kitchen", "budget", "flight", "hotel", "groceries", "presentation", "insurance"]
+WORDS = ["before", "friday", "monday", "urgent", "with", "team", "for", "mom", "the", "weekend",
+         "quarterly", "online", "store", "appointment", "renewal", "backup", "draft", "final"]
+
+QUERIES = {
+    "common word": "buy",
+    "rare word": "insurance renewal",
+    "prefix": "pre",
+    "two words": "book flight",
+    "no match": "zebra",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    create_schema()
+    client = TestClient(tdlapp)
+    created = client.post("/users/", json={"username": "searchbench", "password": "benchpass"})
+    headers = {"Authorization": f"Bearer {created.json()['access_token']}"}
+    owner_id = client.get("/users/me", headers=headers).json()["id"]
+
+    rng = random.Random(args.seed)
+    def texts(i):
+        title = f"{rng.choice(VERBS)} {rng.choice(NOUNS)}"
+        if rng.random() < 0.3:
+            title += f" {rng.choice(WORDS)}"
+        return title, " ".join(rng.choice(WORDS + NOUNS) for _ in range(rng.randint(3, 10)))
+    seed_tasks(owner_id, args.tasks, texts=texts)
+
+    start = time.perf_counter()
+    client.get("/tasks/search", params={"q": "milk"}, headers=headers)
+    print(f"first search (index build): {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    print(f"{'query':>12} {'results':>8} {'p50':>10} {'p95':>10}")
+    for name, query in QUERIES.items():
+        latencies = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            response = client.get("/tasks/search", params={"q": query, "limit": 20}, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+        stats = summarize(latencies, 1)
+        print(f"{name:>12} {len(response.json()):>8} {stats['p50']:>8.2f}ms {stats['p95']:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
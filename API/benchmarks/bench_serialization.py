@@ -0,0 +1,101 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: bench_serialization.py
+
+Description: Micro-benchmark of the cost of
+building a 1k-task response. It compares the old
+path (full ORM objects passed through FastAPI's
+jsonable_encoder and the standard json module)
+with the current path (column tuples encoded by
+orjson), for both the query and the encoding.
+
+Usage (from the repository root):
+    python -m API.benchmarks.bench_serialization --tasks 1000
+***********************************************
+"""
+import argparse
+import asyncio
+import time
+from statistics import median
+from .common import configure_environment, create_schema, seed_tasks
+
+configure_environment("serialization")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from Database.src import database, models
+from API.src.app.responses import FastJSONResponse
+from API.src.app.routes.tasks import TASK_COLUMNS
+
+
+async def orm_response(owner_id, limit):
+    async with database.AsyncSessionLocal() as db:
+        query = select(models.Task).where(models.Task.owner_id == owner_id).order_by(models.Task.id).limit(limit)
+        tasks = (await db.execute(query)).scalars().all()
+        return JSONResponse(jsonable_encoder(tasks)).body
+
+
+async def tuple_response(owner_id, limit):
+    async with database.AsyncSessionLocal() as db:
+        query = select(*TASK_COLUMNS).where(models.Task.owner_id == owner_id).order_by(models.Task.id).limit(limit)
+        tasks = [row._asdict() for row in await db.execute(query)]
+        return FastJSONResponse(tasks).body
+
+
+async def measure(build, owner_id, limit, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await build(owner_id, limit)
+        samples.append((time.perf_counter() - start) * 1000)
+    return median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    create_schema()
+    with database.SessionLocal() as db:
+        user = models.User(username="serializer", hashed_password="x")
+        db.add(user)
+        db.commit()
+        owner_id = user.id
+    seed_tasks(owner_id, args.tasks)
+
+    async def run():
+        # Warm up both paths before timing
+        await orm_response(owner_id, args.tasks)
+        await tuple_response(owner_id, args.tasks)
+
+        # Encoding only, on data already in memory
+        async with database.AsyncSessionLocal() as db:
+            orm_tasks = (await db.execute(select(models.Task).where(models.Task.owner_id == owner_id))).scalars().all()
+            rows = [row._asdict() for row in await db.execute(select(*TASK_COLUMNS).where(models.Task.owner_id == owner_id))]
+        encode_old = median(_timed(lambda: JSONResponse(jsonable_encoder(orm_tasks))) for _ in range(args.repeat))
+        encode_new = median(_timed(lambda: FastJSONResponse(rows)) for _ in range(args.repeat))
+
+        full_old = await measure(orm_response, owner_id, args.tasks, args.repeat)
+        full_new = await measure(tuple_response, owner_id, args.tasks, args.repeat)
+        return encode_old, encode_new, full_old, full_new
+
+    encode_old, encode_new, full_old, full_new = asyncio.run(run())
+    print(f"{args.tasks:,} tasks per response (median of {args.repeat})")
+    print(f"{'':>24} {'encode only':>12} {'query + encode':>16}")
+    print(f"{'ORM + jsonable_encoder':>24} {encode_old:>10.2f}ms {full_old:>14.2f}ms")
+    print(f"{'tuples + orjson':>24} {encode_new:>10.2f}ms {full_new:>14.2f}ms")
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: bench_startup.py
+
+Description: Measures how long a fresh Python
+process takes to import the API, to build the
+app as a uvicorn worker does (create_app()), and
+to collect the test suite. Each step runs in a new
+interpreter several times and the median is
+reported. It also lists the modules with the
+largest cumulative import time from
+`python -X importtime`, to show where startup goes.
+
+Usage (from the repository root):
+    python -m API.benchmarks.bench_startup [--repeat 5] [--root PATH]
+
+--root points it at another checkout, e.g. a
+`git worktree` of the previous commit, to compare.
+***********************************************
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from statistics import median
+
+STEPS = {
+    "import API.src.app.main": "import API.src.app.main",
+    "create_app()": "from API.src.app.main import create_app; create_app()",
+}
+
+
+def run_env() -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix="tdl-bench-"), "startup.db")
+    return {
+        **os.environ,
+        "DATABASE_URL": os.environ.get("DATABASE_URL", f"sqlite:///{path}"),
+        "JWT_SECRET_KEY": os.environ.get("JWT_SECRET_KEY", "benchmark-secret-key"),
+    }
+
+
+def timed_run(command, root, env):
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if result.returncode != 0:
+        return None
+    return (time.perf_counter() - start) * 1000
+
+
+def report(label, command, root, env, repeat):
+    samples = [timed_run(command, root, env) for _ in range(repeat)]
+    if None in samples:
+        print(f"{label:>28} {'failed':>10}")
+    else:
+        print(f"{label:>28} {median(samples):>8.0f}ms")
+
+
+def slowest_imports(code, root, env, count):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=root, env=env, capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        # Only top-level imports, so nested modules are not counted twice
+        if depth <= 1:
+            rows.append((int(parts[1]) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--root", default=os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+    args = parser.parse_args()
+
+    env = run_env()
+    print(f"Startup of {args.root} (median of {args.repeat} fresh processes)")
+    report("python -c pass", [sys.executable, "-c", "pass"], args.root, env, args.repeat)
+    for label, code in STEPS.items():
+        report(label, [sys.executable, "-c", code], args.root, env, args.repeat)
+    collect = [sys.executable, "-m", "pytest", "--collect-only", "-q", "API/tests"]
+    report("pytest --collect-only", collect, args.root, env, args.repeat)
+
+    print("\nLargest imports while loading the app (cumulative)")
+    for ms, name in slowest_imports(STEPS["import API.src.app.main"] + "; API.src.app.main.tdlapp", args.root, env, args.top):
+        print(f"{ms:>8.1f}ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
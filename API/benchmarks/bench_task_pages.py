@@ -0,0 +1,61 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: bench_task_pages.py
+
+Description: Benchmark for the paginated task
+list. It keeps adding users that each own a large
+number of tasks and measures the latency of the
+first page, a deep page and a filtered page after
+every round. With the composite indexes the page
+latency should stay flat as the table grows.
+
+Usage (from the repository root):
+    python -m API.benchmarks.bench_task_pages --users 5 --tasks-per-user 100000
+***********************************************
+"""
+import argparse
+from .common import configure_environment, create_schema, seed_tasks, time_call
+
+configure_environment("task_pages")
+
+from fastapi.testclient import TestClient
+from API.src.app.main import tdlapp
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--tasks-per-user", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    create_schema()
+    client = TestClient(tdlapp)
+
+    print(f"{'total tasks':>12} {'first page':>12} {'deep page':>12} {'completed':>12} {'prefix':>12}")
+    for n in range(args.users):
+        created = client.post("/users/", json={"username": f"bench{n}", "password": "benchpass"})
+        headers = {"Authorization": f"Bearer {created.json()['access_token']}"}
+        me = client.get("/users/me", headers=headers).json()
+        seed_tasks(me["id"], args.tasks_per_user)
+
+        # The deep page starts close to the end of the newest user's list
+        last = client.get("/tasks/", params={"limit": 1, "after": 0, "completed": False}, headers=headers).json()
+        deep_cursor = last[0]["id"] + args.tasks_per_user - 2 * args.page_size
+
+        def page(**params):
+            return lambda: client.get("/tasks/", params={"limit": args.page_size, **params}, headers=headers)
+
+        first_ms = time_call(page(), args.repeat)
+        deep_ms = time_call(page(after=deep_cursor), args.repeat)
+        done_ms = time_call(page(completed=True, after=deep_cursor), args.repeat)
+        prefix_ms = time_call(page(title_prefix="Task 9"), args.repeat)
+        total = (n + 1) * args.tasks_per_user
+        print(f"{total:>12,} {first_ms:>10.2f}ms {deep_ms:>10.2f}ms {done_ms:>10.2f}ms {prefix_ms:>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: bench_workers.py
+
+Description: Benchmark for the production
+launcher (API/src/app/server.py). It starts the
+API with 1, 2, 4 and 8 worker processes and drives
+authenticated GET /tasks/ pages at it from several
+client processes. It reports requests/sec and
+latency for each worker count. Throughput should
+grow with the workers until it runs out of CPU
+cores or database connections.
+
+Usage (from the repository root):
+    python -m API.benchmarks.bench_workers --workers 1 2 4 8 --clients 4
+***********************************************
+"""
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import time
+from .common import configure_environment, create_schema, run_server, seed_tasks, summarize
+
+configure_environment("workers")
+
+
+def drive(url: str, token: str, concurrency: int, duration: float) -> tuple:
+    import httpx
+    latencies = []
+    errors = 0
+
+    async def run():
+        nonlocal errors
+        deadline = time.perf_counter() + duration
+        headers = {"Authorization": f"Bearer {token}"}
+
+        async def worker(client):
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url, headers=headers)
+                except httpx.TransportError:
+                    errors += 1
+                    continue
+                if response.status_code != 200:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+
+    asyncio.run(run())
+    return latencies, errors
+
+
+def main():
+    import httpx
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--clients", type=int, default=4, help="load generating processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="connections per client process")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--tasks", type=int, default=1_000)
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    create_schema()
+    print(f"{'workers':>8} {'req/s':>10} {'p50':>10} {'p99':>10} {'errors':>8}")
+    for index, workers in enumerate(args.workers):
+        env = {"WEB_CONCURRENCY": str(workers), "API_PORT": str(args.port), "API_HOST": "127.0.0.1", "LOG_LEVEL": "warning"}
+        command = [sys.executable, "-m", "API.src.app.server"]
+        with run_server("", args.port, command=command, env=env) as base_url:
+            username = f"bench{index}"
+            created = httpx.post(base_url + "/users/", json={"username": username, "password": "benchpass"}).json()
+            token = created["access_token"]
+            owner_id = httpx.get(base_url + "/users/me", headers={"Authorization": f"Bearer {token}"}).json()["id"]
+            seed_tasks(owner_id, args.tasks)
+
+            url = base_url + "/tasks/?limit=20"
+            with multiprocessing.Pool(args.clients) as pool:
+                results = pool.starmap(drive, [(url, token, args.concurrency, args.duration)] * args.clients)
+        latencies = [latency for result in results for latency in result[0]]
+        errors = sum(result[1] for result in results)
+        stats = summarize(latencies, args.duration)
+        print(f"{workers:>8} {stats['rps']:>10.1f} {stats['p50']:>8.2f}ms {stats['p99']:>8.2f}ms {errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: common.py
+
+Description: Shared helpers for the API benchmarks.
+The benchmarks run against a local SQLite file by
+default so they do not need the MySQL container;
+set DATABASE_URL to point them at a real server.
+***********************************************
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from statistics import median
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+
+"""
+***********************************************
+Method: configure_environment()
+
+Description: This method is used to point the
+app at a scratch database and set the rest of its
+environment. The engines are built and the
+settings read on first use, but settings such as
+RATE_LIMIT are read when their module is imported,
+so call this before importing any Database or API
+module.
+
+Parameters:
+- name (str): Name used for the scratch SQLite file.
+
+returns: The database URL that will be used.
+***********************************************
+"""
+def configure_environment(name: str) -> str:
+    if "DATABASE_URL" not in os.environ:
+        path = os.path.join(tempfile.mkdtemp(prefix="tdl-bench-"), f"{name}.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key")
+    # Load generators log in from one address far faster than any person
+    os.environ.setdefault("RATE_LIMIT", "false")
+    return os.environ["DATABASE_URL"]
+
+
+"""
+***********************************************
+Method: create_schema()
+
+Description: This method is used to create a
+fresh set of tables for a benchmark run by
+dropping everything and running the migrations.
+
+returns: N/A
+***********************************************
+"""
+def create_schema():
+    from sqlalchemy import MetaData
+    from Database.src import database, migrate
+    existing = MetaData()
+    existing.reflect(bind=database.engine)
+    existing.drop_all(bind=database.engine)
+    migrate.upgrade(database.engine)
+
+
+"""
+***********************************************
+Method: seed_tasks()
+
+Description: This method is used to bulk insert
+tasks for a user straight through the engine so
+seeding large lists stays fast.
+
+Parameters:
+- owner_id (int): The id of the user who owns the tasks.
+- count (int): How many tasks to insert.
+- batch_size (int): Rows per INSERT statement.
+- texts (callable): Optional function giving the
+  (title, description) of task i.
+
+returns: N/A
+***********************************************
+"""
+def seed_tasks(owner_id: int, count: int, batch_size: int = 5000, texts=None):
+    from sqlalchemy import insert, select, update
+    from Database.src import database, models
+    from API.src.app.routes.tasks import POSITION_GAP
+    with database.engine.begin() as conn:
+        # Reserve blocks of per-owner task numbers and positions and count
+        # the new tasks (every third one is completed) like the API does
+        last_number, last_position = conn.execute(
+            select(models.User.task_seq, models.User.last_position).where(models.User.id == owner_id)
+        ).one()
+        conn.execute(
+            update(models.User)
+            .where(models.User.id == owner_id)
+            .values(
+                task_seq=models.User.task_seq + count,
+                last_position=models.User.last_position + POSITION_GAP * count,
+                tasks_version=models.User.tasks_version + 1,
+                task_count=models.User.task_count + count,
+                completed_count=models.User.completed_count + (count + 2) // 3,
+            )
+        )
+        texts = texts or (lambda i: (f"Task {i}", f"Seeded task number {i}"))
+        for start in range(0, count, batch_size):
+            rows = []
+            for i in range(start, min(start + batch_size, count)):
+                title, description = texts(i)
+                rows.append({
+                    "title": title,
+                    "description": description,
+                    "completed": i % 3 == 0,
+                    "owner_id": owner_id,
+                    "number": last_number + 1 + i,
+                    "position": last_position + POSITION_GAP * (i + 1),
+                })
+            conn.execute(insert(models.Task), rows)
+
+
+"""
+***********************************************
+Method: time_call()
+
+Description: This method is used to time a
+callable several times and report the median.
+
+Parameters:
+- func (callable): The function to time.
+- repeat (int): How many times to call it.
+
+returns: The median duration in milliseconds.
+***********************************************
+"""
+def time_call(func, repeat: int = 20) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return median(samples)
+
+
+"""
+***********************************************
+Method: summarize()
+
+Description: This method is used to turn a list
+of latencies into throughput and percentiles.
+
+Parameters:
+- latencies (list): Request latencies in milliseconds.
+- duration (float): Length of the run in seconds.
+
+returns: A dictionary with count, rps, p50, p95 and p99.
+***********************************************
+"""
+def summarize(latencies: list, duration: float) -> dict:
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+    return {
+        "count": len(ordered),
+        "rps": len(ordered) / duration if duration else 0.0,
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+    }
+
+
+"""
+***********************************************
+Method: run_server()
+
+Description: This context manager is used to run
+an ASGI app under uvicorn in a child process for
+the length of a benchmark.
+
+Parameters:
+- app (str): The app import path, e.g.
+  "API.src.app.main:tdlapp".
+- port (int): Port to listen on.
+- extra_args (list): Extra uvicorn command line flags.
+- command (list): Run this command instead of
+  uvicorn (it must listen on the given port).
+- env (dict): Extra environment variables for it.
+
+returns: The base URL of the server.
+***********************************************
+"""
+@contextmanager
+def run_server(app: str, port: int, extra_args: list = None, command: list = None, env: dict = None):
+    import httpx
+    if command is None:
+        command = [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning", *(extra_args or [])]
+    server = subprocess.Popen(command, env={**os.environ, **(env or {})})
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(300):
+            try:
+                httpx.get(base_url + "/", timeout=1)
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        yield base_url
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,89 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: compare.py
+
+Description: Compares two bench_mixed JSON reports,
+for example from before and after a change. It
+prints the change in throughput and latency for
+each operation. It exits with status 1 when any
+operation's p95 latency got worse, or its
+throughput dropped, by more than --threshold
+percent, so it can gate a change in CI.
+
+Usage (from the repository root):
+    python -m API.benchmarks.compare before.json after.json --threshold 10
+***********************************************
+"""
+import argparse
+import json
+import sys
+
+
+"""
+***********************************************
+Method: percent_change()
+
+Description: This method is used to work out how
+much a value changed.
+
+returns: The change in percent, or 0 when the old
+value is 0.
+***********************************************
+"""
+def percent_change(old: float, new: float) -> float:
+    return (new - old) / old * 100 if old else 0.0
+
+
+"""
+***********************************************
+Method: compare_reports()
+
+Description: This method is used to compare the
+operations that appear in both reports.
+
+Parameters:
+- before (dict): The baseline report.
+- after (dict): The new report.
+- threshold (float): Allowed regression in percent.
+
+returns: A list of rows (operation, rps change,
+p95 change, p99 change, regressed).
+***********************************************
+"""
+def compare_reports(before: dict, after: dict, threshold: float) -> list:
+    rows = []
+    for name, old in before["endpoints"].items():
+        new = after["endpoints"].get(name)
+        if new is None:
+            continue
+        rps = percent_change(old["rps"], new["rps"])
+        p95 = percent_change(old["p95"], new["p95"])
+        p99 = percent_change(old["p99"], new["p99"])
+        rows.append((name, rps, p95, p99, p95 > threshold or rps < -threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+    with open(args.before) as handle:
+        before = json.load(handle)
+    with open(args.after) as handle:
+        after = json.load(handle)
+
+    print(f"{before['meta'].get('commit')} -> {after['meta'].get('commit')}")
+    print(f"{'operation':>10} {'req/s':>9} {'p95':>9} {'p99':>9}")
+    rows = compare_reports(before, after, args.threshold)
+    for name, rps, p95, p99, regressed in rows:
+        flag = "  REGRESSED" if regressed else ""
+        print(f"{name:>10} {rps:>+8.1f}% {p95:>+8.1f}% {p99:>+8.1f}%{flag}")
+    sys.exit(1 if any(row[-1] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
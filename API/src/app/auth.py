@@ -1,39 +1,118 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from threading import Lock
+from typing import Callable, NamedTuple, Optional
+import time
+from functools import lru_cache
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from dotenv import load_dotenv
 import os
-from Database.src import database, models
+from Database.src import models
+from Database.src.database import get_db
+from Database.src.settings import load_environment
 
-# Load environment variables from .env file
-load_dotenv()
+ALGORITHM = "HS256"
 
-# Import get_db function
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+"""
+***********************************************
+Class: AuthSettings(NamedTuple)
 
+Description: The token, cache and password
+hashing configuration.
+***********************************************
+"""
+class AuthSettings(NamedTuple):
+    # Token lifetimes. Access tokens are sent with every request; refresh
+    # tokens are only sent to /token/refresh to get a new pair
+    access_token_expire_minutes: int
+    refresh_token_expire_days: int
+    # Verified-token cache settings (a TTL of 0 turns the cache off)
+    auth_cache_ttl_seconds: float
+    auth_cache_max_size: int
+    # How long a user's token version is trusted before it is read again,
+    # i.e. how long other workers keep accepting a revoked token
+    token_version_ttl_seconds: float
+    token_version_cache_max_size: int
+    # Password hashing settings: bcrypt work factor, hashing threads and
+    # how many hash/verify calls may be running or queued before new ones
+    # are rejected with a 503
+    bcrypt_rounds: int
+    password_hash_workers: int
+    password_hash_max_pending: int
 
-# Secret key for signing JWTs (use a secure key in production)
-SECRET_KEY = os.getenv("JWT_SECRET_KEY")
-if not SECRET_KEY:
-    raise ValueError("JWT_SECRET_KEY is not set in the environment variables")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+"""
+***********************************************
+Method: get_auth_settings()
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+Description: This method is used to read the auth
+settings from the environment the first time they
+are needed, after the .env file is loaded, rather
+than when this module is imported.
+
+returns: The AuthSettings.
+***********************************************
+"""
+@lru_cache(maxsize=None)
+def get_auth_settings() -> AuthSettings:
+    load_environment()
+    return AuthSettings(
+        access_token_expire_minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")),
+        refresh_token_expire_days=int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7")),
+        auth_cache_ttl_seconds=float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60")),
+        auth_cache_max_size=int(os.getenv("AUTH_CACHE_MAX_SIZE", "10000")),
+        token_version_ttl_seconds=float(os.getenv("TOKEN_VERSION_TTL_SECONDS", "30")),
+        token_version_cache_max_size=int(os.getenv("TOKEN_VERSION_CACHE_MAX_SIZE", "100000")),
+        bcrypt_rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+        password_hash_workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        password_hash_max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32")),
+    )
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+"""
+***********************************************
+Method: get_secret_key()
+
+Description: This method is used to read the key
+that signs JWTs (use a secure key in production)
+the first time a token is made or checked.
+
+returns: The secret key.
+
+raises:
+- ValueError: If JWT_SECRET_KEY is not set.
+***********************************************
+"""
+@lru_cache(maxsize=None)
+def get_secret_key() -> str:
+    load_environment()
+    secret_key = os.getenv("JWT_SECRET_KEY")
+    if not secret_key:
+        raise ValueError("JWT_SECRET_KEY is not set in the environment variables")
+    return secret_key
+
+"""
+***********************************************
+Method: get_pwd_context()
+
+Description: This method is used to build the
+password hashing context on first use. passlib is
+only imported then, so workers and tests that
+never hash a password do not pay for it.
+
+returns: The bcrypt CryptContext.
+***********************************************
+"""
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=get_auth_settings().bcrypt_rounds)
+
 """
 ***********************************************
 Method: hash_password()
@@ -49,7 +128,7 @@ returns: A hashed version of the password.
 ***********************************************
 """
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 """
@@ -67,7 +146,101 @@ returns: A boolean indicating whether the passwords match.
 ***********************************************
 """
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+"""
+***********************************************
+Class: PasswordHashPool
+
+Description: Bounded thread pool that runs the
+bcrypt work. bcrypt releases the GIL while it
+hashes, so a few threads keep hashing off the
+event loop without starving other requests. Once
+max_pending calls are running or queued, new calls
+are rejected with a 503 instead of piling up.
+***********************************************
+"""
+class PasswordHashPool:
+    def __init__(self, workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    """
+    ***********************************************
+    Method: run()
+
+    Description: This method is used to run a
+    hashing function on the pool.
+
+    Parameters:
+    - func (callable): The blocking function to run.
+    - args: Arguments passed to func.
+
+    returns: The return value of func.
+
+    raises:
+    - HTTPException (503): If the pool is full.
+    ***********************************************
+    """
+    async def run(self, func, *args):
+        # Only touched from the event loop thread, so no lock is needed
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+"""
+***********************************************
+Method: hash_password_async()
+
+Description: This method is used to hash a
+password on the password hash pool so the event
+loop keeps serving other requests.
+
+Parameters:
+- password (str): The plain text password to be hashed.
+
+returns: A hashed version of the password.
+
+raises:
+- HTTPException (503): If too many hashes are pending.
+***********************************************
+"""
+async def hash_password_async(password: str) -> str:
+    return await build_caches()["password_hash_pool"].run(hash_password, password)
+
+"""
+***********************************************
+Method: verify_password_async()
+
+Description: This method is used to verify a
+password on the password hash pool so the event
+loop keeps serving other requests.
+
+Parameters:
+- plain_password (str): The plain text password provided by the user.
+- hashed_password (str): The hashed password stored in the database.
+
+returns: A boolean indicating whether the passwords match.
+
+raises:
+- HTTPException (503): If too many checks are pending.
+***********************************************
+"""
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await build_caches()["password_hash_pool"].run(verify_password, plain_password, hashed_password)
 
 """
 ***********************************************
@@ -87,13 +260,14 @@ returns: A JWT access token as a string.
 ***********************************************
 """
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    from jose import jwt
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = datetime.utcnow() + timedelta(minutes=get_auth_settings().access_token_expire_minutes)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, get_secret_key(), algorithm=ALGORITHM)
     return encoded_jwt
 
 """
@@ -114,8 +288,9 @@ raises:
 ***********************************************
 """
 def decode_access_token(token: str):
+    from jose import JWTError, jwt
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, get_secret_key(), algorithms=[ALGORITHM])
         return payload
     except JWTError:
         raise HTTPException(
@@ -124,41 +299,392 @@ def decode_access_token(token: str):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+"""
+***********************************************
+Method: create_tokens()
+
+Description: This method is used to issue the
+access and refresh tokens for a user. Both carry
+the user's id ("uid") and token version ("ver"),
+so a request can be authorized from the token
+alone; bumping the user's token version revokes
+them.
+
+Parameters:
+- user_id (int): The id of the user.
+- username (str): The user's name ("sub").
+- token_version (int): The user's token version.
+
+returns: A dictionary with access_token,
+refresh_token and token_type.
+***********************************************
+"""
+def create_tokens(user_id: int, username: str, token_version: int) -> dict:
+    claims = {"sub": username, "uid": user_id, "ver": token_version}
+    return {
+        "access_token": create_access_token({**claims, "type": "access"}),
+        "refresh_token": create_access_token(
+            {**claims, "type": "refresh"}, timedelta(days=get_auth_settings().refresh_token_expire_days)
+        ),
+        "token_type": "bearer",
+    }
+
+def invalid_token(detail: str = "Invalid token") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+"""
+***********************************************
+Class: UserPrincipal
+
+Description: Lightweight stand-in for the user
+row that authenticated endpoints receive. It only
+carries the fields handlers need so it can be
+cached without holding on to a database session.
+***********************************************
+"""
+class UserPrincipal(NamedTuple):
+    id: int
+    username: str
+    # None for tokens issued before token versions existed
+    token_version: Optional[int] = None
+
+"""
+***********************************************
+Class: TokenCache
+
+Description: In-process cache of verified tokens.
+It maps a raw token to the UserPrincipal it
+resolved to so repeat requests with the same
+token skip both the JWT check and the user lookup.
+Entries expire after the TTL or when the token
+itself expires, whichever comes first, and the
+least recently used entry is evicted once the
+cache is full. The cache is per worker, so other
+workers only see an invalidation once their own
+entry times out.
+***********************************************
+"""
+class TokenCache:
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries = OrderedDict()  # token -> (principal, expires_at)
+        self._tokens_by_user = {}      # user id -> set of cached tokens
+        self._lock = Lock()
+
+    """
+    ***********************************************
+    Method: get()
+
+    Description: This method is used to look up the
+    principal for a token.
+
+    Parameters:
+    - token (str): The raw JWT.
+
+    returns: The cached UserPrincipal, or None on a
+    miss or expired entry.
+    ***********************************************
+    """
+    def get(self, token: str) -> Optional[UserPrincipal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(token)
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    """
+    ***********************************************
+    Method: set()
+
+    Description: This method is used to cache the
+    principal a token resolved to.
+
+    Parameters:
+    - token (str): The raw JWT.
+    - principal (UserPrincipal): The resolved user.
+    - token_exp (Optional[float]): The token's own
+      "exp" claim as a unix timestamp.
+
+    returns: N/A
+    ***********************************************
+    """
+    def set(self, token: str, principal: UserPrincipal, token_exp: Optional[float] = None):
+        if self.ttl_seconds <= 0 or self.max_size <= 0:
+            return
+        ttl = self.ttl_seconds
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._remove(token)
+            self._entries[token] = (principal, time.monotonic() + ttl)
+            self._tokens_by_user.setdefault(principal.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    """
+    ***********************************************
+    Method: invalidate_user()
+
+    Description: This method is used to drop every
+    cached token that belongs to a user. It must be
+    called whenever the account changes or is deleted.
+
+    Parameters:
+    - user_id (int): The id of the user.
+
+    returns: N/A
+    ***********************************************
+    """
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    """
+    ***********************************************
+    Method: clear()
+
+    Description: This method is used to empty the cache.
+
+    returns: N/A
+    ***********************************************
+    """
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Caller must hold the lock
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_user.get(entry[0].id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry[0].id]
+
+
+"""
+***********************************************
+Class: TokenVersionCache
+
+Description: In-process cache of each user's
+token version, so checking that a token has not
+been revoked costs a dictionary lookup instead of
+a query. An entry is read again from the database
+once it is older than the TTL, so a token revoked
+through another worker stops working there within
+TOKEN_VERSION_TTL_SECONDS. The worker that made
+the change updates its own entry straight away.
+***********************************************
+"""
+class TokenVersionCache:
+    def __init__(self, ttl_seconds: float, max_size: int, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.clock = clock
+        self.lookups = 0
+        self._entries = OrderedDict()  # user id -> (token version, checked_at)
+        self._lock = Lock()
+
+    def get(self, user_id: int) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] + self.ttl_seconds <= self.clock():
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def set(self, user_id: int, token_version: int):
+        if self.ttl_seconds <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._entries[user_id] = (token_version, self.clock())
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    """
+    ***********************************************
+    Method: current()
+
+    Description: This method is used to find a
+    user's token version, from the cache when it is
+    fresh and otherwise from the database.
+
+    Parameters:
+    - db (AsyncSession): The request's session.
+    - user_id (int): The id of the user.
+
+    returns: The token version, or None if the user
+    no longer exists.
+    ***********************************************
+    """
+    async def current(self, db: AsyncSession, user_id: int) -> Optional[int]:
+        token_version = self.get(user_id)
+        if token_version is not None:
+            return token_version
+        self.lookups += 1
+        result = await db.execute(select(models.User.token_version).where(models.User.id == user_id))
+        token_version = result.scalar_one_or_none()
+        if token_version is not None:
+            self.set(user_id, token_version)
+        return token_version
+
+"""
+***********************************************
+Method: build_caches()
+
+Description: This method is used to create the
+token caches and the password hash pool the first
+time one of them is used, from get_auth_settings().
+
+returns: A dictionary of the module attributes it
+built (token_cache, token_versions,
+password_hash_pool).
+***********************************************
+"""
+@lru_cache(maxsize=None)
+def build_caches() -> dict:
+    settings = get_auth_settings()
+    return {
+        "token_cache": TokenCache(settings.auth_cache_ttl_seconds, settings.auth_cache_max_size),
+        "token_versions": TokenVersionCache(settings.token_version_ttl_seconds, settings.token_version_cache_max_size),
+        "password_hash_pool": PasswordHashPool(settings.password_hash_workers, settings.password_hash_max_pending),
+    }
+
+"""
+***********************************************
+Method: __getattr__()
+
+Description: This method is used to build the
+caches when one of them is first looked up as a
+module attribute (auth.token_cache, ...). The
+value is then stored on the module, so later
+lookups are plain attribute reads.
+
+Parameters:
+- name (str): The attribute being looked up.
+
+returns: The attribute.
+***********************************************
+"""
+def __getattr__(name: str):
+    if name.startswith("__"):
+        raise AttributeError(name)
+    built = build_caches()
+    if name not in built:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals().update(built)
+    return built[name]
+
+"""
+***********************************************
+Method: principal_from_token()
+
+Description: This method is used to verify a JWT
+and build the principal it stands for. Tokens
+with a "uid" claim need no database access.
+Tokens issued before token versions existed only
+carry the username, which is looked up instead.
+
+Parameters:
+- token (str): The raw JWT.
+- db (AsyncSession): The request's session.
+
+returns: A (UserPrincipal, exp) tuple.
+
+raises:
+- HTTPException (401): If the token is invalid or
+  is a refresh token.
+- HTTPException (404): If the user is not found.
+***********************************************
+"""
+async def principal_from_token(token: str, db: AsyncSession):
+    payload = decode_access_token(token)
+    username: str = payload.get("sub")
+    if username is None or payload.get("type", "access") != "access":
+        raise invalid_token()
+    if "uid" in payload:
+        return UserPrincipal(id=payload["uid"], username=username, token_version=payload.get("ver", 0)), payload.get("exp")
+
+    result = await db.execute(select(models.User.id, models.User.username).where(models.User.username == username))
+    user = result.first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return UserPrincipal(id=user.id, username=user.username), payload.get("exp")
+
+
 """
 ***********************************************
 Method: get_current_user()
 
 Description: This method is a dependency used to 
 retrieve the currently authenticated user based 
-on the provided JWT token. It validates the token 
-and fetches the user from the database.
+on the provided JWT token. The user comes from
+the token's claims, and the token's version is
+checked against the user's cached token version,
+so a request normally does not touch the
+database. Verified tokens are kept in the token
+cache so repeat requests also skip the JWT check.
 
 Parameters:
 - token (str): The JWT token provided in the 
   Authorization header (automatically extracted 
   by FastAPI's dependency injection).
-- db (Session): The database session used to query 
+- db (AsyncSession): The database session used to query 
   the user.
 
-returns: The user object corresponding to the token.
+returns: The UserPrincipal corresponding to the token.
 
 raises:
-- HTTPException (401): If the token is invalid or expired.
+- HTTPException (401): If the token is invalid, expired
+  or revoked.
 - HTTPException (404): If the user is not found in the database.
 ***********************************************
 """
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    payload = decode_access_token(token)
-    username: str = payload.get("sub")
-    if username is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
\ No newline at end of file
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> UserPrincipal:
+    caches = build_caches()
+    principal = caches["token_cache"].get(token)
+    if principal is None:
+        principal, token_exp = await principal_from_token(token, db)
+        caches["token_cache"].set(token, principal, token_exp)
+
+    if principal.token_version is not None:
+        token_version = await caches["token_versions"].current(db, principal.id)
+        if token_version is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        if token_version != principal.token_version:
+            raise invalid_token("Token has been revoked")
+    return principal
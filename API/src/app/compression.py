@@ -0,0 +1,262 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: compression.py
+
+Description: Response compression and default
+cache headers for the API. CompressionMiddleware
+compresses response bodies with the best encoding
+the client accepts: br (needs the brotli package),
+zstd (needs zstandard) or gzip. Small bodies are
+not worth compressing, so each content type has a
+minimum size. Bodies above
+COMPRESSION_THREAD_MIN_SIZE are compressed in a
+worker thread so a 10k-task list does not stall
+the event loop for other requests.
+
+Every compressible response carries
+"Vary: Accept-Encoding" so shared caches keep the
+encodings apart, and a compressed response's ETag
+is made weak (W/"..."). Streaming responses (the
+SSE task stream) are never buffered or compressed.
+Responses that do not set Cache-Control get
+DEFAULT_CACHE_CONTROL, so tokens and profiles are
+not stored by browsers or proxies.
+***********************************************
+"""
+import gzip
+import os
+from typing import Callable, Dict, Optional, Sequence
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from Database.src.pool import env_flag
+
+COMPRESSION = env_flag("COMPRESSION", True)
+
+# Encodings in the server's order of preference (unavailable ones are skipped)
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "br,zstd,gzip")
+
+# Content types to compress, each with an optional minimum size in bytes
+COMPRESSION_TYPES = os.getenv(
+    "COMPRESSION_TYPES",
+    "application/json,text/plain,text/html,text/css,application/javascript",
+)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Bodies at least this large are compressed off the event loop
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", "65536"))
+
+# Levels favour speed: the API compresses every response on the fly
+COMPRESSION_LEVELS = {
+    "gzip": int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+    "br": int(os.getenv("COMPRESSION_BR_QUALITY", "4")),
+    "zstd": int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3")),
+}
+
+# Cache policy for responses that do not choose their own
+DEFAULT_CACHE_CONTROL = os.getenv("DEFAULT_CACHE_CONTROL", "no-store")
+
+
+"""
+***********************************************
+Method: load_codecs()
+
+Description: This method is used to build the
+compress function of every encoding that can be
+used in this environment. gzip is always there;
+br and zstd only when their packages are installed.
+
+Parameters:
+- levels (dict): Compression level per encoding.
+
+returns: A dictionary of encoding name to a
+function that compresses bytes.
+***********************************************
+"""
+def load_codecs(levels: Dict[str, int]) -> Dict[str, Callable[[bytes], bytes]]:
+    # mtime=0 keeps gzip output identical for identical bodies
+    codecs = {"gzip": lambda body: gzip.compress(body, compresslevel=levels["gzip"], mtime=0)}
+    try:
+        import brotli
+        codecs["br"] = lambda body: brotli.compress(body, quality=levels["br"])
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        # Compressor objects are not thread safe, so make one per body
+        codecs["zstd"] = lambda body: zstandard.ZstdCompressor(level=levels["zstd"]).compress(body)
+    except ImportError:
+        pass
+    return codecs
+
+
+"""
+***********************************************
+Method: parse_content_types()
+
+Description: This method is used to read the
+COMPRESSION_TYPES setting, a comma separated list
+of "type" or "type:min_size" entries.
+
+Parameters:
+- value (str): The setting.
+- default_min_size (int): Minimum size for entries
+  that do not give one.
+
+returns: A dictionary of content type to minimum
+body size.
+***********************************************
+"""
+def parse_content_types(value: str, default_min_size: int) -> Dict[str, int]:
+    types = {}
+    for entry in value.split(","):
+        name, _, min_size = entry.strip().partition(":")
+        if name:
+            types[name.lower()] = int(min_size) if min_size else default_min_size
+    return types
+
+
+"""
+***********************************************
+Method: choose_encoding()
+
+Description: This method is used to pick the
+response encoding from an Accept-Encoding header.
+The client's q-values decide which encodings are
+acceptable; among equally acceptable ones the
+server's preference order wins.
+
+Parameters:
+- header (str): The Accept-Encoding header.
+- available (Sequence[str]): Usable encodings in
+  order of preference.
+
+returns: The encoding, or None to send the body
+as it is.
+***********************************************
+"""
+def choose_encoding(header: str, available: Sequence[str]) -> Optional[str]:
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for name in available:
+        quality = accepted.get(name, wildcard)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+"""
+***********************************************
+Class: CompressionMiddleware
+
+Description: Pure ASGI middleware that compresses
+buffered responses and fills in cache headers.
+***********************************************
+"""
+class CompressionMiddleware:
+    def __init__(self, app, enabled: bool = COMPRESSION, encodings: str = COMPRESSION_ENCODINGS,
+                 content_types: str = COMPRESSION_TYPES, min_size: int = COMPRESSION_MIN_SIZE,
+                 thread_min_size: int = COMPRESSION_THREAD_MIN_SIZE,
+                 default_cache_control: str = DEFAULT_CACHE_CONTROL):
+        self.app = app
+        self.codecs = load_codecs(COMPRESSION_LEVELS) if enabled else {}
+        self.encodings = [name.strip() for name in encodings.split(",") if name.strip() in self.codecs]
+        self.min_sizes = parse_content_types(content_types, min_size)
+        self.thread_min_size = thread_min_size
+        self.default_cache_control = default_cache_control
+
+    """
+    ***********************************************
+    Method: min_size_for()
+
+    Description: This method is used to find the
+    minimum body size to compress for a content type.
+
+    Parameters:
+    - content_type (Optional[str]): The response's
+      Content-Type header.
+
+    returns: The minimum size, or None if the type is
+    not compressed.
+    ***********************************************
+    """
+    def min_size_for(self, content_type: Optional[str]) -> Optional[int]:
+        if not content_type:
+            return None
+        return self.min_sizes.get(content_type.split(";", 1)[0].strip().lower())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding")
+        encoding = choose_encoding(accept_encoding, self.encodings) if accept_encoding else None
+        held_start = None
+        min_size = None
+
+        async def send_compressed(message):
+            nonlocal held_start, min_size
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if self.default_cache_control and "cache-control" not in headers:
+                    headers["Cache-Control"] = self.default_cache_control
+                min_size = self.min_size_for(headers.get("content-type"))
+                if min_size is not None and "content-encoding" not in headers:
+                    headers.add_vary_header("Accept-Encoding")
+                else:
+                    min_size = None
+                # Only buffered bodies (with a Content-Length) are held back;
+                # streams and bodies too small to bother with go straight out
+                length = headers.get("content-length")
+                if encoding is None or min_size is None or not length or int(length) < min_size:
+                    await send(message)
+                else:
+                    held_start = message
+                return
+
+            if held_start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            start, held_start = held_start, None
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                # A body sent in pieces is passed through as it is
+                await send(start)
+                await send(message)
+                return
+            compress = self.codecs[encoding]
+            if len(body) >= self.thread_min_size:
+                compressed = await anyio.to_thread.run_sync(compress, body)
+            else:
+                compressed = compress(body)
+            if len(compressed) >= len(body):
+                await send(start)
+                await send(message)
+                return
+
+            headers = MutableHeaders(scope=start)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
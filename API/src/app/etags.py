@@ -0,0 +1,137 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: etags.py
+
+Description: File that contains the helpers for
+ETag based conditional requests. Task ETags are
+built from the owner's tasks_version counter,
+which goes up on every task write. A client's
+cached copy can therefore be checked against one
+small counter read instead of loading the tasks.
+Tags look like "<version>-<digest>", where the
+digest covers the owner, the resource and any
+query parameters.
+***********************************************
+"""
+import hashlib
+from typing import List, Optional
+from fastapi import Response, status
+
+# Cache policy for task responses: browsers may keep them but must
+# revalidate with the ETag before every use
+TASKS_CACHE_CONTROL = "private, no-cache"
+
+
+"""
+***********************************************
+Method: make_etag()
+
+Description: This method is used to build the
+ETag for a resource at a given tasks version.
+
+Parameters:
+- version (int): The owner's tasks_version.
+- parts: Values that identify the resource (owner
+  id, task id, query parameters, ...).
+
+returns: A quoted ETag string.
+***********************************************
+"""
+def make_etag(version: int, *parts) -> str:
+    digest = hashlib.blake2b(repr((version, *parts)).encode(), digest_size=8).hexdigest()
+    return f'"{version}-{digest}"'
+
+
+"""
+***********************************************
+Method: parse_etags()
+
+Description: This method is used to split an
+If-None-Match or If-Match header into its tags.
+Weak tags are compared like strong ones, because
+compressing a response weakens its ETag.
+
+Parameters:
+- header (Optional[str]): The raw header value.
+
+returns: The list of tags (or ["*"]).
+***********************************************
+"""
+def parse_etags(header: Optional[str]) -> List[str]:
+    if not header:
+        return []
+    tags = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag:
+            tags.append(tag)
+    return tags
+
+
+"""
+***********************************************
+Method: etag_matches()
+
+Description: This method is used to check an
+If-None-Match header against the current ETag.
+
+Parameters:
+- header (Optional[str]): The raw header value.
+- etag (str): The current ETag of the resource.
+
+returns: True if the client's copy is current.
+***********************************************
+"""
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    tags = parse_etags(header)
+    return "*" in tags or etag in tags
+
+
+"""
+***********************************************
+Method: etag_version()
+
+Description: This method is used to find the
+tasks version a client's If-Match header was
+issued for. Only tags this API built for the same
+resource are accepted.
+
+Parameters:
+- header (str): The raw If-Match header value.
+- parts: The same identifying values passed to
+  make_etag() for the resource.
+
+returns: The tasks version, or None if no tag in
+the header belongs to this resource.
+***********************************************
+"""
+def etag_version(header: str, *parts) -> Optional[int]:
+    for tag in parse_etags(header):
+        version, _, _ = tag.strip('"').partition("-")
+        if version.isdigit() and make_etag(int(version), *parts) == tag:
+            return int(version)
+    return None
+
+
+"""
+***********************************************
+Method: not_modified()
+
+Description: This method is used to build a 304
+response for a client whose copy is current.
+
+Parameters:
+- etag (str): The current ETag of the resource.
+
+returns: A 304 Not Modified response.
+***********************************************
+"""
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": TASKS_CACHE_CONTROL},
+    )
@@ -0,0 +1,349 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: events.py
+
+Description: File that contains the task change
+pub/sub used by the /tasks/stream endpoint. Task
+routes publish a small delta after every commit.
+Each open stream owns a bounded queue, so a slow
+client can only fall behind by a fixed number of
+events before it is told to resync.
+
+The broker is pluggable. LocalBroker fans events
+out inside one worker. RedisBroker relays them
+through Redis pub/sub so every uvicorn worker sees
+every user's changes. Set EVENT_BROKER_URL (e.g.
+redis://redis:6379/0) to use it; it needs the
+redis package from requirements.txt.
+***********************************************
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, Optional, Set
+import orjson
+
+# Events a subscriber may have queued before it is marked as lagging
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "64"))
+
+# Open streams allowed per worker, and per user within a worker
+MAX_SUBSCRIBERS = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "10000"))
+MAX_SUBSCRIBERS_PER_USER = int(os.getenv("STREAM_MAX_SUBSCRIBERS_PER_USER", "10"))
+
+# Wait before resubscribing after losing Redis, doubling up to the maximum
+REDIS_RETRY_MIN_SECONDS = 0.5
+REDIS_RETRY_MAX_SECONDS = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+"""
+***********************************************
+Class: Subscriber
+
+Description: One open task stream. Events wait in
+a bounded queue. When the queue is full the
+pending events are dropped and the subscriber is
+flagged as lagging, which makes the stream send a
+single "resync" event instead of buffering without
+limit.
+***********************************************
+"""
+class Subscriber:
+    __slots__ = ("owner_id", "queue", "lagging")
+
+    def __init__(self, owner_id: int, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.owner_id = owner_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.lagging = False
+
+    """
+    ***********************************************
+    Method: offer()
+
+    Description: This method is used to hand an
+    event to the subscriber without ever blocking
+    the publisher.
+
+    Parameters:
+    - event (dict): The task change event.
+
+    returns: N/A
+    ***********************************************
+    """
+    def offer(self, event: dict):
+        if self.lagging:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Drop what is queued; the client has to re-fetch anyway
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.lagging = True
+            self.queue.put_nowait({"type": "resync"})
+
+    """
+    ***********************************************
+    Method: next_event()
+
+    Description: This method is used to wait for the
+    next event.
+
+    Parameters:
+    - timeout (float): Seconds to wait before giving up.
+
+    returns: The next event, or None on timeout.
+    ***********************************************
+    """
+    async def next_event(self, timeout: float) -> Optional[dict]:
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event.get("type") == "resync":
+            self.lagging = False
+        return event
+
+
+"""
+***********************************************
+Class: SubscriberLimitReached(Exception)
+
+Description: Raised when a worker or user already
+has the maximum number of open streams.
+***********************************************
+"""
+class SubscriberLimitReached(Exception):
+    pass
+
+
+"""
+***********************************************
+Class: LocalBroker
+
+Description: In-process broker. It keeps the open
+subscribers per user and delivers each published
+event to that user's subscribers on this worker.
+***********************************************
+"""
+class LocalBroker:
+    def __init__(self, max_subscribers: int = MAX_SUBSCRIBERS, max_per_user: int = MAX_SUBSCRIBERS_PER_USER):
+        self.max_subscribers = max_subscribers
+        self.max_per_user = max_per_user
+        self.subscribers: Dict[int, Set[Subscriber]] = {}
+        self.count = 0
+
+    """
+    ***********************************************
+    Method: subscribe()
+
+    Description: This method is used to open a new
+    subscription for a user.
+
+    Parameters:
+    - owner_id (int): The id of the user.
+
+    returns: The new Subscriber.
+
+    raises:
+    - SubscriberLimitReached: If a limit is hit.
+    ***********************************************
+    """
+    def subscribe(self, owner_id: int) -> Subscriber:
+        if not self.has_capacity(owner_id):
+            raise SubscriberLimitReached()
+        subscriber = Subscriber(owner_id)
+        self.subscribers.setdefault(owner_id, set()).add(subscriber)
+        self.count += 1
+        return subscriber
+
+    """
+    ***********************************************
+    Method: has_capacity()
+
+    Description: This method is used to check whether
+    a user may open another stream on this worker.
+
+    Parameters:
+    - owner_id (int): The id of the user.
+
+    returns: True if a subscription can be opened.
+    ***********************************************
+    """
+    def has_capacity(self, owner_id: int) -> bool:
+        return self.count < self.max_subscribers and len(self.subscribers.get(owner_id, ())) < self.max_per_user
+
+    """
+    ***********************************************
+    Method: unsubscribe()
+
+    Description: This method is used to close a
+    subscription.
+
+    Parameters:
+    - subscriber (Subscriber): The subscription to close.
+
+    returns: N/A
+    ***********************************************
+    """
+    def unsubscribe(self, subscriber: Subscriber):
+        user_subscribers = self.subscribers.get(subscriber.owner_id)
+        if user_subscribers is None or subscriber not in user_subscribers:
+            return
+        user_subscribers.discard(subscriber)
+        self.count -= 1
+        if not user_subscribers:
+            del self.subscribers[subscriber.owner_id]
+
+    """
+    ***********************************************
+    Method: publish()
+
+    Description: This method is used to send an event
+    to every subscriber of a user.
+
+    Parameters:
+    - owner_id (int): The id of the user.
+    - event (dict): The task change event.
+
+    returns: N/A
+    ***********************************************
+    """
+    async def publish(self, owner_id: int, event: dict):
+        self.deliver(owner_id, event)
+
+    def deliver(self, owner_id: int, event: dict):
+        for subscriber in tuple(self.subscribers.get(owner_id, ())):
+            subscriber.offer(event)
+
+    """
+    ***********************************************
+    Method: resync_all()
+
+    Description: This method is used to tell every
+    open stream on this worker to re-fetch, after
+    events may have been missed.
+
+    returns: N/A
+    ***********************************************
+    """
+    def resync_all(self):
+        for user_subscribers in tuple(self.subscribers.values()):
+            for subscriber in tuple(user_subscribers):
+                subscriber.offer({"type": "resync"})
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+"""
+***********************************************
+Class: RedisBroker(LocalBroker)
+
+Description: Broker that relays events through
+Redis pub/sub. Events are published to a shared
+channel, and each worker runs one listener that
+passes every event it receives to its own local
+subscribers. A malformed message is logged and
+skipped. If the connection to Redis drops, the
+listener resubscribes with backoff and then sends
+every local stream a resync, since events
+published in between are lost. Needs the redis
+package.
+***********************************************
+"""
+class RedisBroker(LocalBroker):
+    CHANNEL = "tdl:task-events"
+
+    def __init__(self, url: Optional[str] = None, client=None, **kwargs):
+        super().__init__(**kwargs)
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url)
+        self.redis = client
+        self._listener: Optional[asyncio.Task] = None
+
+    async def publish(self, owner_id: int, event: dict):
+        await self.redis.publish(self.CHANNEL, orjson.dumps({"owner_id": owner_id, "event": event}))
+
+    async def start(self):
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        await self.redis.aclose()
+
+    async def _listen(self):
+        delay = REDIS_RETRY_MIN_SECONDS
+        reconnecting = False
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                if reconnecting:
+                    logger.info("Task event listener resubscribed to Redis")
+                    self.resync_all()
+                delay = REDIS_RETRY_MIN_SECONDS
+                async for message in pubsub.listen():
+                    try:
+                        payload = orjson.loads(message["data"])
+                        self.deliver(payload["owner_id"], payload["event"])
+                    except Exception:
+                        logger.warning("Skipping malformed task event: %r", message.get("data"))
+                logger.warning("Task event subscription ended; resubscribing")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Task event listener lost Redis; retrying in %.1fs", delay)
+            finally:
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+            reconnecting = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, REDIS_RETRY_MAX_SECONDS)
+
+
+"""
+***********************************************
+Method: create_broker()
+
+Description: This method is used to build the
+broker selected by EVENT_BROKER_URL.
+
+returns: A RedisBroker when a redis:// URL is
+configured, otherwise a LocalBroker.
+***********************************************
+"""
+def create_broker() -> LocalBroker:
+    url = os.getenv("EVENT_BROKER_URL")
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisBroker(url)
+    return LocalBroker()
+
+broker = create_broker()
+
+
+"""
+***********************************************
+Method: format_sse()
+
+Description: This method is used to encode an
+event in the Server-Sent Events wire format.
+
+Parameters:
+- event (dict): The task change event.
+
+returns: The encoded event.
+***********************************************
+"""
+def format_sse(event: dict) -> bytes:
+    return b"event: " + event["type"].encode() + b"\ndata: " + orjson.dumps(event) + b"\n\n"
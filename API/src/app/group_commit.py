@@ -0,0 +1,192 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: group_commit.py
+
+Description: Opt-in write-behind batching for
+single-task writes. With GROUP_COMMIT=true, create,
+update and delete requests put their database work
+on a per-worker queue instead of committing on
+their own. A flusher runs everything that arrived
+within GROUP_COMMIT_MAX_DELAY_MS (or up to
+GROUP_COMMIT_MAX_BATCH writes) in one transaction,
+so one commit (and one fsync on the database)
+covers the whole group.
+
+Durability is unchanged: a request only gets its
+response after the group it was in has committed.
+Each write runs inside its own SAVEPOINT, so a 404
+or 412 for one write is rolled back without
+affecting the others. Writes in a group are
+applied in owner id order, so concurrent groups
+always lock users' rows in the same order.
+***********************************************
+"""
+import asyncio
+import contextvars
+import os
+from typing import Awaitable, Callable, List, Optional
+from Database.src import database
+from Database.src.pool import env_flag
+
+GROUP_COMMIT = env_flag("GROUP_COMMIT", False)
+
+# How long the first write of a group waits for company, and the group size cap
+GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv("GROUP_COMMIT_MAX_DELAY_MS", "2"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+
+
+"""
+***********************************************
+Class: PendingWrite
+
+Description: One queued write and the future its
+request is waiting on.
+***********************************************
+"""
+class PendingWrite:
+    __slots__ = ("owner_id", "operation", "future")
+
+    def __init__(self, owner_id: int, operation: Callable, future: asyncio.Future):
+        self.owner_id = owner_id
+        self.operation = operation
+        self.future = future
+
+
+"""
+***********************************************
+Class: GroupCommitter
+
+Description: The per-worker write queue and the
+task that flushes it.
+***********************************************
+"""
+class GroupCommitter:
+    def __init__(self, max_delay_ms: float = GROUP_COMMIT_MAX_DELAY_MS, max_batch: int = GROUP_COMMIT_MAX_BATCH):
+        self.max_delay = max_delay_ms / 1000
+        self.max_batch = max_batch
+        self.groups = 0
+        self.writes = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._loop = None
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._flusher is None or self._flusher.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            # The first writer's request starts the flusher; give it an empty
+            # context so it does not keep that request's metrics.current_request
+            self._flusher = loop.create_task(self._run(), context=contextvars.Context())
+
+    """
+    ***********************************************
+    Method: submit()
+
+    Description: This method is used to run a write
+    in the next group commit.
+
+    Parameters:
+    - owner_id (int): The user the write belongs to.
+    - operation (Callable): An async function taking
+      the group's session. It must not commit.
+
+    returns: What the operation returned, once its
+    group has committed.
+
+    raises: Whatever the operation raised (its
+    changes are rolled back), or the commit error.
+    ***********************************************
+    """
+    async def submit(self, owner_id: int, operation: Callable[..., Awaitable]):
+        self._ensure_started()
+        future = self._loop.create_future()
+        self._queue.put_nowait(PendingWrite(owner_id, operation, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    write = self._queue.get_nowait()
+                elif (remaining := deadline - loop.time()) > 0:
+                    try:
+                        write = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    break
+                if write is None:
+                    stopping = True  # Shutting down: flush what we have, then exit
+                    break
+                batch.append(write)
+            await self.flush(batch)
+
+    """
+    ***********************************************
+    Method: flush()
+
+    Description: This method is used to apply a group
+    of writes in one transaction and then hand each
+    request its result.
+
+    Parameters:
+    - batch (list): The PendingWrite objects.
+
+    returns: N/A
+    ***********************************************
+    """
+    async def flush(self, batch: List[PendingWrite]):
+        outcomes = []
+        try:
+            async with database.AsyncSessionLocal() as db:
+                for write in sorted(batch, key=lambda write: write.owner_id):
+                    try:
+                        async with db.begin_nested():
+                            outcomes.append((write, await write.operation(db), None))
+                    except Exception as error:
+                        outcomes.append((write, None, error))
+                await db.commit()
+        except Exception as error:
+            for write in batch:
+                if not write.future.done():
+                    write.future.set_exception(error)
+            return
+
+        self.groups += 1
+        self.writes += len(batch)
+        for write, result, error in outcomes:
+            if write.future.done():
+                continue  # The request was cancelled
+            if error is not None:
+                write.future.set_exception(error)
+            else:
+                write.future.set_result(result)
+
+    """
+    ***********************************************
+    Method: stop()
+
+    Description: This method is used on shutdown to
+    flush anything still queued and stop the flusher.
+
+    returns: N/A
+    ***********************************************
+    """
+    async def stop(self):
+        if self._flusher is None or self._loop is not asyncio.get_running_loop():
+            return
+        self._queue.put_nowait(None)
+        await self._flusher
+        self._flusher = None
+
+committer = GroupCommitter()
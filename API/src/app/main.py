@@ -7,65 +7,120 @@ File: main.py
 Description: File that contains the main API.
 ***********************************************
 """
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy import text
-from sqlalchemy.orm import Session
-from Database.src import models, database
-from .routes import users, tasks
-from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from Database.src import database
+from Database.src.database import get_db
+from Database.src.settings import load_environment
 
+# Routes defined in this file (the rest live in routes/)
+router = APIRouter()
 
-"""
-***********************************************
-Method: get_db()
-
-Description: This method is used to fetch the 
-database session and close it when it is done.
-
-returns: N/A
-***********************************************
-"""
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 """
 ***********************************************
 Method: startup()
 
 
-Description: This method is used to populate 
-the database with the tables that are defined 
-in Database/src/models.py. from the start.
+Description: This method is used to check that
+the database schema has been migrated (see
+Database/src/migrate.py) before serving requests.
+Tables are never created or dropped here, so
+restarting the API keeps all the data.
 
 returns: N/A
 ***********************************************
 """
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    from Database.src import migrate, replicas
+    from . import events, group_commit
     # Startup logic
-    models.Base.metadata.drop_all(bind=database.engine)
-    models.Base.metadata.create_all(bind=database.engine)
+    async with database.async_engine.begin() as conn:
+        await conn.run_sync(migrate.verify_schema)
+    await events.broker.start()
+    await replicas.router.start()
     yield
+    # Shutdown logic
+    await group_commit.committer.stop()
+    await events.broker.stop()
+    await replicas.router.stop()
+    await database.async_engine.dispose()
+
+"""
+***********************************************
+Method: create_app()
+
+Description: This method is used to build the API
+application. Importing this module does no work:
+the .env file, the route modules (which read their
+settings from the environment when imported) and
+the database engines are only loaded here. uvicorn
+calls it once per worker (see server.py).
+
+returns: The FastAPI application.
+***********************************************
+"""
+def create_app() -> FastAPI:
+    load_environment()
+    from fastapi.middleware.cors import CORSMiddleware
+    from .routes import users, tasks
+    from .compression import CompressionMiddleware
+    from .metrics import MetricsMiddleware, instrument_sql
+    from .responses import FastJSONResponse
+
+    app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+    # Add CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000"],  # Frontend origin
+        allow_credentials=True,
+        allow_methods=["*"],  # Allow all HTTP methods
+        allow_headers=["*"],  # Allow all headers
+        expose_headers=["X-Next-Cursor", "X-Next-Offset", "ETag"],  # Pagination headers and cache validator
+    )
+
+    # Compress large responses and fill in default cache headers
+    app.add_middleware(CompressionMiddleware)
+
+    # Time every request and the SQL it runs (added last so it wraps everything)
+    app.add_middleware(MetricsMiddleware)
+    instrument_sql(database.engine)
+    instrument_sql(database.async_engine.sync_engine)
+    for replica_engine in database.replica_engines:
+        instrument_sql(replica_engine.sync_engine)
+
+    # Include routers from separate files
+    app.include_router(users.router)
+    app.include_router(tasks.router)
+    app.include_router(router)
+    return app
+
+"""
+***********************************************
+Method: __getattr__()
 
-tdlapp = FastAPI(lifespan=lifespan)
+Description: This method is used to build the
+shared application the first time
+main.tdlapp is looked up, for the tests and for
+`uvicorn src.app.main:tdlapp --reload`.
 
-# Add CORS middleware
-tdlapp.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000"],  # Frontend origin
-    allow_credentials=True,
-    allow_methods=["*"],  # Allow all HTTP methods
-    allow_headers=["*"],  # Allow all headers
-)
+Parameters:
+- name (str): The attribute being looked up.
 
-# Include routers from separate files
-tdlapp.include_router(users.router)
-tdlapp.include_router(tasks.router)
+returns: The application.
+***********************************************
+"""
+def __getattr__(name: str):
+    if name != "tdlapp":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    app = create_app()
+    globals()["tdlapp"] = app
+    return app
 
 
 """
@@ -80,10 +135,10 @@ returns: The table models that are in the
 database.
 ***********************************************
 """
-@tdlapp.get("/tables")
-def list_tables(db: Session = Depends(get_db)):
+@router.get("/tables")
+async def list_tables(db: AsyncSession = Depends(get_db)):
     try:
-        result = db.execute(text("SHOW TABLES"))
+        result = await db.execute(text("SHOW TABLES"))
         tables = [row[0] for row in result]
         return {"tables": tables}
     except Exception as e:
@@ -101,15 +156,49 @@ returns: A message indicating the status of the
 connection.
 ***********************************************
 """
-@tdlapp.get("/test-db-connection")
-def test_db_connection(db: Session = Depends(get_db)):
+@router.get("/test-db-connection")
+async def test_db_connection(db: AsyncSession = Depends(get_db)):
     try:
         # Execute a simple query to test the connection
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         return {"status": "Connection successful"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+"""
+***********************************************
+Method: pool_stats()
+
+
+Description: This method is used to report the
+database connection pool usage (checked out
+connections, overflow, checkout waits and
+invalidations) for sizing the pool.
+
+returns: The pool statistics for each engine.
+***********************************************
+"""
+@router.get("/pool-stats")
+def pool_stats():
+    return {"pools": database.get_pool_stats()}
+
+"""
+***********************************************
+Method: read_metrics()
+
+
+Description: This method is used to export the
+request latency, in-flight, SQL and pool metrics
+of this worker for Prometheus to scrape.
+
+returns: The metrics in the Prometheus text format.
+***********************************************
+"""
+@router.get("/metrics", include_in_schema=False)
+def read_metrics():
+    from .metrics import metrics
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 """
 ***********************************************
 Method: read_root()
@@ -121,6 +210,6 @@ root(/) endpoint.
 returns: A welcome message.
 ***********************************************
 """
-@tdlapp.get("/")
+@router.get("/")
 def read_root():
     return "Welcome to my To-Do List API!"
\ No newline at end of file
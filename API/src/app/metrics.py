@@ -0,0 +1,360 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: metrics.py
+
+Description: Request and SQL instrumentation for
+the API. MetricsMiddleware times every request
+and counts requests in flight. SQLAlchemy cursor
+events time every statement and add it to the
+request that ran it. Per route, this shows how
+many statements a request makes (which exposes
+N+1 loops) and how long they take. render_metrics()
+writes everything, including the connection pool
+stats, in the Prometheus text format for /metrics.
+Statements slower than SLOW_QUERY_MS are logged.
+
+The numbers are kept per worker process.
+***********************************************
+"""
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+from sqlalchemy import event
+from Database.src import database, replicas
+from . import auth, group_commit, ratelimit
+
+# Statements slower than this many milliseconds are logged (0 turns it off)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+slow_query_logger = logging.getLogger("tdl.slow_query")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SQL_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+# Pool stats that go up and down; the rest only ever grow
+POOL_GAUGES = {"size", "checked_out", "checked_in", "overflow", "overflow_max", "checkout_wait_seconds_max"}
+
+
+"""
+***********************************************
+Method: format_labels()
+
+Description: This method is used to write a label
+set in the Prometheus text format.
+
+Parameters:
+- names (tuple): Label names.
+- values (tuple): Label values.
+
+returns: A string like {method="GET",route="/"}.
+***********************************************
+"""
+def format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+"""
+***********************************************
+Class: Histogram
+
+Description: A Prometheus style histogram with
+one set of buckets per label combination.
+***********************************************
+"""
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labelnames = labelnames
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    """
+    ***********************************************
+    Method: observe()
+
+    Description: This method is used to record one
+    value for a label combination.
+
+    Parameters:
+    - labels (tuple): Values for the label names.
+    - value (float): The observed value.
+
+    returns: N/A
+    ***********************************************
+    """
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts, then the +Inf count and the sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    """
+    ***********************************************
+    Method: render()
+
+    Description: This method is used to write the
+    histogram in the Prometheus text format.
+
+    returns: A list of lines.
+    ***********************************************
+    """
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        bucket_names = self.labelnames + ("le",)
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(bucket_names, labels + (bound,))} {cumulative}")
+            cumulative += values[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{format_labels(bucket_names, labels + ('+Inf',))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {values[-1]:.6f}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+"""
+***********************************************
+Class: RequestStats
+
+Description: The SQL statements run while serving
+one request. The middleware creates one per
+request, and the cursor events find it through a
+context variable.
+***********************************************
+"""
+class RequestStats:
+    __slots__ = ("path", "statements", "sql_seconds")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+"""
+***********************************************
+Class: Metrics
+
+Description: All the metrics kept by one worker.
+***********************************************
+"""
+class Metrics:
+    def __init__(self):
+        self.request_duration = Histogram(
+            "tdl_http_request_duration_seconds", "Time spent serving HTTP requests.",
+            LATENCY_BUCKETS, ("method", "route", "status"),
+        )
+        self.request_statements = Histogram(
+            "tdl_http_request_sql_statements", "SQL statements executed per HTTP request.",
+            SQL_COUNT_BUCKETS, ("method", "route"),
+        )
+        self.request_sql_time = Histogram(
+            "tdl_http_request_sql_duration_seconds", "Time spent in SQL per HTTP request.",
+            SQL_TIME_BUCKETS, ("method", "route"),
+        )
+        self.in_flight = 0
+        self.statements_total = 0
+        self.sql_seconds_total = 0.0
+        self.slow_queries_total = 0
+        self._lock = threading.Lock()
+
+    """
+    ***********************************************
+    Method: observe_request()
+
+    Description: This method is used to record a
+    finished request.
+
+    Parameters:
+    - method (str): The HTTP method.
+    - route (str): The route template, e.g.
+      /tasks/{task_id}, so ids do not create new series.
+    - status (int): The response status code.
+    - seconds (float): How long the request took.
+    - stats (RequestStats): Its SQL statements.
+
+    returns: N/A
+    ***********************************************
+    """
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        self.request_duration.observe((method, route, str(status)), seconds)
+        self.request_statements.observe((method, route), stats.statements)
+        self.request_sql_time.observe((method, route), stats.sql_seconds)
+
+    """
+    ***********************************************
+    Method: observe_statement()
+
+    Description: This method is used to record one
+    SQL statement and log it if it was slow.
+
+    Parameters:
+    - statement (str): The SQL text.
+    - seconds (float): How long it took.
+
+    returns: N/A
+    ***********************************************
+    """
+    def observe_statement(self, statement: str, seconds: float):
+        stats = current_request.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.sql_seconds += seconds
+        slow = SLOW_QUERY_MS > 0 and seconds * 1000 >= SLOW_QUERY_MS
+        with self._lock:
+            self.statements_total += 1
+            self.sql_seconds_total += seconds
+            if slow:
+                self.slow_queries_total += 1
+        if slow:
+            slow_query_logger.warning(
+                "Slow query (%.1f ms) during %s: %s",
+                seconds * 1000, stats.path if stats else "background work", " ".join(statement.split())[:1000],
+            )
+
+    """
+    ***********************************************
+    Method: render()
+
+    Description: This method is used to write all
+    the metrics and the pool stats in the
+    Prometheus text format.
+
+    returns: The exposition text.
+    ***********************************************
+    """
+    def render(self) -> str:
+        lines = []
+        for histogram in (self.request_duration, self.request_statements, self.request_sql_time):
+            lines.extend(histogram.render())
+        with self._lock:
+            scalars = (
+                ("tdl_http_requests_in_flight", "gauge", "HTTP requests being served.", self.in_flight),
+                ("tdl_db_statements_total", "counter", "SQL statements executed.", self.statements_total),
+                ("tdl_db_statement_seconds_total", "counter", "Time spent executing SQL.", round(self.sql_seconds_total, 6)),
+                ("tdl_db_slow_queries_total", "counter", f"SQL statements slower than {SLOW_QUERY_MS:g} ms.", self.slow_queries_total),
+                ("tdl_group_commit_groups_total", "counter", "Group commits (GROUP_COMMIT=true).", group_commit.committer.groups),
+                ("tdl_group_commit_writes_total", "counter", "Task writes applied by group commits.", group_commit.committer.writes),
+                ("tdl_rate_limited_total", "counter", "Requests rejected by rate limits.", ratelimit.limiter.rejected),
+                ("tdl_db_replica_reads_total", "counter", "Read-only requests served by a read replica.", replicas.router.replica_reads),
+                ("tdl_db_primary_reads_total", "counter", "Read-only requests served by the primary.", replicas.router.primary_reads),
+                ("tdl_db_replica_lagging_total", "counter", "Replicas skipped for a read because they were behind the user's last write.", replicas.router.lagging_reads),
+                ("tdl_auth_token_version_lookups_total", "counter", "Token versions read from the database (cache misses).", auth.token_versions.lookups),
+            )
+        for name, kind, help_text, value in scalars:
+            lines.extend((f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"))
+
+        pools = database.get_pool_stats()
+        for key in pools[0]:
+            if key == "pool":
+                continue
+            name = f"tdl_db_pool_{key}"
+            kind = "gauge" if key in POOL_GAUGES else "counter"
+            samples = [(snapshot["pool"], snapshot[key]) for snapshot in pools if snapshot.get(key) is not None]
+            if not samples:
+                continue
+            lines.extend((f"# HELP {name} Connection pool {key.replace('_', ' ')}.", f"# TYPE {name} {kind}"))
+            lines.extend(f"{name}{format_labels(('pool',), (pool,))} {value}" for pool, value in samples)
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+
+"""
+***********************************************
+Class: MetricsMiddleware
+
+Description: Plain ASGI middleware that times
+each HTTP request, counts requests in flight and
+collects the request's SQL statements. It does
+not buffer the response, so streams such as
+/tasks/stream pass straight through.
+***********************************************
+"""
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope["path"])
+        token = current_request.set(stats)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        metrics.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.in_flight -= 1
+            current_request.reset(token)
+            # Label by route template; unmatched paths share one series
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            metrics.observe_request(scope["method"], route, status_code, elapsed, stats)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._tdl_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_tdl_query_start", None)
+    if start is not None:
+        metrics.observe_statement(statement, time.perf_counter() - start)
+
+
+"""
+***********************************************
+Method: instrument_sql()
+
+Description: This method is used to time every
+statement run by an engine.
+
+Parameters:
+- engine (Engine): A synchronous engine, or the
+  sync_engine of an async engine.
+
+returns: N/A
+***********************************************
+"""
+def instrument_sql(engine):
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,379 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: ratelimit.py
+
+Description: Token bucket rate limiting for the
+expensive auth endpoints. /login and POST /users/
+run bcrypt, so one client sending them without
+pause could keep every hash worker busy. Each
+limited route has buckets keyed by client IP and,
+for /login, by username. A request takes a token
+from each of its buckets only if every one of them
+has a token. Otherwise it is rejected with 429 and
+Retry-After and takes nothing, so requests refused
+for one key do not use up another. The check runs as
+a route dependency, before the route opens the
+database or hashes anything.
+
+Limits are written "<requests>/<second|minute|hour>":
+up to <requests> at once, refilled evenly over the
+period. They are set per route with
+RATE_LIMIT_<ROUTE> (e.g. RATE_LIMIT_LOGIN=
+"ip=30/minute,username=5/minute").
+
+The store is pluggable like the event broker.
+MemoryBucketStore keeps the buckets of one worker
+in sharded dictionaries and drops idle ones.
+RedisBucketStore keeps them in Redis so all
+workers share one limit. Set RATE_LIMIT_URL (e.g.
+redis://redis:6379/1) to use it.
+***********************************************
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+from typing import Callable, Dict, NamedTuple, Optional
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+from Database.src.pool import env_flag
+
+RATE_LIMIT = env_flag("RATE_LIMIT", True)
+
+# Default limits per route; RATE_LIMIT_<ROUTE> overrides them
+DEFAULT_RATE_LIMITS = {
+    "login": "ip=30/minute,username=5/minute",
+    "signup": "ip=5/minute",
+}
+
+# Buckets per worker before the least recently used ones are dropped
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_SHARDS = 16
+
+# Keys are cut to this length so long usernames cannot grow the store
+MAX_KEY_LENGTH = 128
+
+PERIODS = {"second": 1.0, "minute": 60.0, "hour": 3600.0}
+
+
+"""
+***********************************************
+Class: Rate(NamedTuple)
+
+Description: One bucket's size and refill speed.
+***********************************************
+"""
+class Rate(NamedTuple):
+    capacity: float
+    refill_per_second: float
+
+    """
+    ***********************************************
+    Method: parse()
+
+    Description: This method is used to read a
+    limit like "5/minute".
+
+    Parameters:
+    - value (str): The limit.
+
+    returns: The Rate.
+    ***********************************************
+    """
+    @classmethod
+    def parse(cls, value: str) -> "Rate":
+        count, _, period = value.strip().partition("/")
+        if period not in PERIODS or not count.isdigit() or int(count) < 1:
+            raise ValueError(f"Invalid rate limit {value!r}, expected e.g. 5/minute")
+        return cls(float(count), int(count) / PERIODS[period])
+
+
+"""
+***********************************************
+Method: parse_limits()
+
+Description: This method is used to read a route's
+limits, a comma separated list of "<key>=<rate>"
+entries where key is ip or username.
+
+Parameters:
+- value (str): The route's setting.
+
+returns: A dictionary of key kind to Rate.
+***********************************************
+"""
+def parse_limits(value: str) -> Dict[str, Rate]:
+    limits = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        kind, _, rate = entry.partition("=")
+        kind = kind.strip().lower()
+        if kind not in ("ip", "username"):
+            raise ValueError(f"Invalid rate limit key {kind!r}, expected ip or username")
+        limits[kind] = Rate.parse(rate)
+    return limits
+
+
+"""
+***********************************************
+Class: MemoryBucketStore
+
+Description: In-process token buckets. Keys are
+spread over shards, each with its own lock and an
+OrderedDict in least recently used order. Taking
+a token moves the bucket to the end, so buckets
+that have been idle long enough to be full again
+collect at the front and are dropped there, a few
+per call. Every operation is O(1).
+***********************************************
+"""
+class MemoryBucketStore:
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, shards: int = RATE_LIMIT_SHARDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.max_keys_per_shard = max(1, max_keys // shards)
+        self.shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+
+    """
+    ***********************************************
+    Method: take()
+
+    Description: This method is used to take one
+    token from each of a request's buckets, or none
+    if any of them is empty. The shards involved are
+    locked in order, so the check and the take are
+    one step.
+
+    Parameters:
+    - buckets (dict): Each bucket's key and Rate.
+
+    returns: 0 if the tokens were taken, otherwise the
+    seconds until every bucket has one.
+    ***********************************************
+    """
+    async def take(self, buckets: Dict[str, Rate]) -> float:
+        shard_of = {key: hash(key) % len(self.shards) for key in buckets}
+        touched = sorted(set(shard_of.values()))
+        now = self.clock()
+        with ExitStack() as stack:
+            for index in touched:
+                stack.enter_context(self.shards[index][0])
+
+            levels = {}
+            for key, rate in buckets.items():
+                bucket = self.shards[shard_of[key]][1].pop(key, None)
+                if bucket is None:
+                    levels[key] = rate.capacity
+                else:
+                    tokens, updated, _ = bucket
+                    levels[key] = min(rate.capacity, tokens + (now - updated) * rate.refill_per_second)
+            wait = max(
+                ((1 - levels[key]) / rate.refill_per_second for key, rate in buckets.items() if levels[key] < 1),
+                default=0.0,
+            )
+
+            for key, rate in buckets.items():
+                tokens = levels[key] - 1 if wait == 0 else levels[key]
+                # Remember when the bucket will be full again so it can be dropped then
+                full_at = now + (rate.capacity - tokens) / rate.refill_per_second
+                self.shards[shard_of[key]][1][key] = (tokens, now, full_at)
+
+            for index in touched:
+                shard = self.shards[index][1]
+                for _ in range(2):
+                    oldest_key, oldest = next(iter(shard.items()))
+                    if oldest_key in buckets or (oldest[2] > now and len(shard) <= self.max_keys_per_shard):
+                        break
+                    del shard[oldest_key]
+            return wait
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for _, buckets in self.shards)
+
+
+"""
+***********************************************
+Class: RedisBucketStore
+
+Description: Token buckets kept in Redis, shared
+by every worker. A Lua script refills a request's
+buckets, checks them and takes from all or none
+in one atomic step, and sets each key to expire
+once the bucket would be full again, so idle
+buckets clean themselves up. Needs the redis
+package.
+***********************************************
+"""
+class RedisBucketStore:
+    SCRIPT = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 2])
+    local refill = tonumber(ARGV[i * 2 + 1])
+    local bucket = redis.call('HMGET', KEYS[i], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1])
+    if tokens == nil then
+        tokens = capacity
+    else
+        tokens = math.min(capacity, tokens + (now - tonumber(bucket[2])) * refill)
+    end
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / refill)
+    end
+    levels[i] = tokens
+end
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 2])
+    local refill = tonumber(ARGV[i * 2 + 1])
+    local tokens = levels[i]
+    if wait == 0 then
+        tokens = tokens - 1
+    end
+    redis.call('HSET', KEYS[i], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('PEXPIRE', KEYS[i], math.ceil((capacity - tokens) / refill * 1000) + 1000)
+end
+return tostring(wait)
+"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url)
+        self.script = self.redis.register_script(self.SCRIPT)
+
+    async def take(self, buckets: Dict[str, Rate]) -> float:
+        args = [time.time()]
+        for rate in buckets.values():
+            args.extend((rate.capacity, rate.refill_per_second))
+        wait = await self.script(keys=[f"tdl:rate:{key}" for key in buckets], args=args)
+        return float(wait)
+
+
+"""
+***********************************************
+Method: create_store()
+
+Description: This method is used to build the
+bucket store selected by RATE_LIMIT_URL.
+
+returns: A RedisBucketStore when a redis:// URL
+is configured, otherwise a MemoryBucketStore.
+***********************************************
+"""
+def create_store():
+    url = os.getenv("RATE_LIMIT_URL")
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisBucketStore(url)
+    return MemoryBucketStore()
+
+
+"""
+***********************************************
+Class: RateLimiter
+
+Description: The limits of every route and the
+store holding their buckets.
+***********************************************
+"""
+class RateLimiter:
+    def __init__(self, store=None, enabled: bool = RATE_LIMIT, limits: Optional[Dict[str, str]] = None):
+        self.store = store if store is not None else create_store()
+        self.enabled = enabled
+        self.rejected = 0
+        self.routes = {
+            route: parse_limits(os.getenv(f"RATE_LIMIT_{route.upper()}", default))
+            for route, default in (limits or DEFAULT_RATE_LIMITS).items()
+        }
+
+    """
+    ***********************************************
+    Method: check()
+
+    Description: This method is used to take a token
+    for a request from each of the route's buckets,
+    all in one call to the store so that a request
+    refused by one bucket takes nothing from the
+    others.
+
+    Parameters:
+    - route (str): The limited route's name.
+    - keys (dict): The request's value for each key
+      kind (ip, username).
+
+    returns: N/A. Raises a 429 HTTPException when a
+    bucket is empty.
+    ***********************************************
+    """
+    async def check(self, route: str, keys: Dict[str, Optional[str]]):
+        if not self.enabled:
+            return
+        buckets = {
+            f"{route}:{kind}:{keys[kind][:MAX_KEY_LENGTH]}": rate
+            for kind, rate in self.routes[route].items() if keys.get(kind)
+        }
+        if not buckets:
+            return
+        wait = await self.store.take(buckets)
+        if wait > 0:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, try again later",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+limiter = RateLimiter()
+
+
+"""
+***********************************************
+Method: client_ip()
+
+Description: This method is used to find the
+address a request came from. Behind a proxy,
+uvicorn fills it in from X-Forwarded-For for the
+proxies listed in FORWARDED_ALLOW_IPS.
+
+Parameters:
+- request (Request): The incoming request.
+
+returns: The client's IP address.
+***********************************************
+"""
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+"""
+***********************************************
+Method: limit_login()
+
+Description: Route dependency that limits /login
+by client IP and by the username being tried.
+It shares the parsed form with the route.
+
+returns: N/A
+***********************************************
+"""
+async def limit_login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    await limiter.check("login", {"ip": client_ip(request), "username": form_data.username})
+
+
+"""
+***********************************************
+Method: limit_signup()
+
+Description: Route dependency that limits
+POST /users/ by client IP.
+
+returns: N/A
+***********************************************
+"""
+async def limit_signup(request: Request):
+    await limiter.check("signup", {"ip": client_ip(request)})
@@ -0,0 +1,27 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: responses.py
+
+Description: File that contains the API's default
+response class. Responses are encoded with orjson,
+which is several times faster than the standard
+library json module on large task lists.
+***********************************************
+"""
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse
+
+
+"""
+***********************************************
+Class: FastJSONResponse(JSONResponse)
+
+Description: JSON response rendered with orjson.
+***********************************************
+"""
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
@@ -7,23 +7,827 @@ File: tasks.py
 Description: File that contains task-related endpoints.
 ***********************************************
 """
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from datetime import datetime
+from typing import Any, List, Literal, Optional
+import base64
+import binascii
+import logging
+import orjson
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy import text
-from sqlalchemy.orm import Session
-from Database.src import database, models
-from ..auth import get_current_user
+from pydantic import ValidationError
+from starlette.background import BackgroundTask
+from sqlalchemy import Integer, and_, case, cast, delete, func, insert, literal, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from Database.src import database, models, replicas
+from Database.src.database import get_db
+from .. import events, group_commit, search
+from ..auth import UserPrincipal, get_current_user, oauth2_scheme
+from ..etags import TASKS_CACHE_CONTROL, etag_matches, etag_version, make_etag, not_modified
+from ..responses import FastJSONResponse
+from ..schemas import BulkItemResult, BulkTaskUpdate, Message, TaskCreate, TaskMove, TaskOut, TaskSummary, TaskUpdate
 
 # Create a router
 router = APIRouter()
 
-# Import get_db function
-def get_db():
-    db = database.SessionLocal()
-    try:
+logger = logging.getLogger(__name__)
+
+# Page sizes for the task list
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Limits for the bulk endpoints; ids are sent to IN (...) in chunks
+MAX_BULK_ITEMS = 10_000
+BULK_CHUNK_SIZE = 500
+
+# Page sizes for search results, and how deep a search can page
+DEFAULT_SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_OFFSET = 10_000
+
+# Seconds between keep-alive comments on an idle task stream
+STREAM_KEEPALIVE_SECONDS = 15
+
+# Task positions are fractions: new tasks go POSITION_GAP after the
+# user's last_position (never below their last task) and a moved task
+# takes the midpoint of its new neighbours.
+# When two neighbours end up closer than POSITION_MIN_GAP, the tasks
+# around them are spread out again, POSITION_REBALANCE_WINDOW on each
+# side to start with (widened until there is room)
+POSITION_GAP = 1024.0
+POSITION_MIN_GAP = 1e-6
+POSITION_REBALANCE_WINDOW = 16
+
+# Columns sent back for a task; list endpoints select just these
+# instead of loading full ORM objects
+TASK_COLUMNS = (
+    models.Task.id,
+    models.Task.title,
+    models.Task.description,
+    models.Task.completed,
+    models.Task.number,
+    models.Task.owner_id,
+    models.Task.due_at,
+    models.Task.priority,
+    models.Task.position,
+)
+
+# Sort orders of the task list: column, newest/highest first, and how
+# to read the column's value back from a cursor. Each has an
+# (owner_id, column, id) index; ties are broken by id
+TASK_SORTS = {
+    "position": (models.Task.position, False, float),
+    "due_at": (models.Task.due_at, False, datetime.fromisoformat),
+    "priority": (models.Task.priority, True, int),
+}
+
+"""
+***********************************************
+Method: get_read_db()
+
+Description: This method is used to fetch a
+session for a read-only task request. It is on a
+read replica when one is configured and has caught
+up to the user's tasks_version on the primary (see
+Database/src/replicas.py), otherwise it is the
+request's own session.
+
+returns: N/A
+***********************************************
+"""
+async def get_read_db(db: AsyncSession = Depends(get_db), current_user: UserPrincipal = Depends(get_current_user)):
+    min_version = None
+    if replicas.router.replicas and not replicas.router.wrote_recently(current_user.id):
+        # The user's last write may have gone through another worker
+        min_version = await read_tasks_version(db, current_user.id)
+    replica_db = await replicas.router.replica_session(current_user.id, min_version)
+    if replica_db is None:
         yield db
+        return
+    # Hand back the primary connection auth may have used
+    await db.rollback()
+    try:
+        yield replica_db
     finally:
-        db.close()
+        await replica_db.close()
+
+"""
+***********************************************
+Method: escape_like()
+
+Description: This method is used to escape the
+LIKE wildcards in user input so a title prefix
+is matched literally.
+
+Parameters:
+- value (str): The raw text to escape.
+
+returns: The escaped text.
+***********************************************
+"""
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+"""
+***********************************************
+Method: keyset_condition()
+
+Description: This method is used to build the
+condition for the rows that come after (or
+before) a (column value, id) point in a sort
+order. It is written out as
+"col > v OR (col = v AND id > i)" rather than as
+a row comparison "(col, id) > (v, i)", because
+MySQL only uses the (owner_id, col, id) index as
+a range for the expanded form. With a row
+comparison it reads every row of the owner up to
+the point.
+
+Parameters:
+- column: The sort column.
+- value: The point's column value.
+- task_id (int): The point's task id.
+- before (bool): Rows before the point instead of
+  after it.
+- inclusive (bool): Include the point's own row.
+
+returns: A SQL condition.
+***********************************************
+"""
+def keyset_condition(column, value, task_id: int, before: bool = False, inclusive: bool = False):
+    if before:
+        past_value = column < value
+        past_id = models.Task.id <= task_id if inclusive else models.Task.id < task_id
+    else:
+        past_value = column > value
+        past_id = models.Task.id >= task_id if inclusive else models.Task.id > task_id
+    return or_(past_value, and_(column == value, past_id))
+
+
+"""
+***********************************************
+Method: encode_cursor()
+
+Description: This method is used to build the
+opaque X-Next-Cursor of a sorted task list page
+from the last task's sort value and id.
+
+Parameters:
+- value: The last task's sort column value.
+- task_id (int): The last task's id.
+
+returns: The cursor string.
+***********************************************
+"""
+def encode_cursor(value, task_id: int) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps([value, task_id])).decode().rstrip("=")
+
+
+"""
+***********************************************
+Method: decode_cursor()
+
+Description: This method is used to read back a
+cursor made by encode_cursor() (or a plain task
+id when the list is sorted by id).
+
+Parameters:
+- cursor (str): The cursor sent as `after`.
+- sort (str): The list's sort order.
+
+returns: The task id, or a (value, task id) tuple
+for the other sort orders.
+
+raises:
+- HTTPException (400): If the cursor is not valid
+  for this sort order.
+***********************************************
+"""
+def decode_cursor(cursor: str, sort: str):
+    try:
+        if sort == "id":
+            task_id = int(cursor)
+            if task_id < 0:
+                raise ValueError(cursor)
+            return task_id
+        value, task_id = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not is_task_id(task_id):
+            raise ValueError(cursor)
+        return TASK_SORTS[sort][2](value), task_id
+    except (ValueError, TypeError, binascii.Error, orjson.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+"""
+***********************************************
+Method: allocate_task_numbers()
+
+Description: This method is used to reserve a
+block of per-owner task numbers by bumping the
+user's task_seq counter, and a block of positions
+at the end of the user's order by moving their
+last_position on by POSITION_GAP per task. The
+same UPDATE bumps tasks_version, since new tasks
+change the list, and adds the new tasks to the
+user's counters. It only locks that user's row,
+so other users are never blocked.
+
+Parameters:
+- db (AsyncSession): The database session.
+- owner_id (int): The id of the user.
+- count (int): How many numbers to reserve.
+- completed (int): How many of the new tasks are
+  already completed.
+
+returns: The first number and the first position
+of the reserved blocks, and the new tasks_version.
+
+raises:
+- HTTPException (404): If the user no longer exists
+  (deleted while their token is still cached).
+***********************************************
+"""
+async def allocate_task_numbers(db: AsyncSession, owner_id: int, count: int, completed: int = 0) -> tuple:
+    statement = (
+        update(models.User)
+        .where(models.User.id == owner_id)
+        .values(
+            task_seq=models.User.task_seq + count,
+            last_position=models.User.last_position + POSITION_GAP * count,
+            tasks_version=models.User.tasks_version + 1,
+            task_count=models.User.task_count + count,
+            completed_count=models.User.completed_count + completed,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    columns = (models.User.task_seq, models.User.last_position, models.User.tasks_version)
+    if db.get_bind().dialect.update_returning:
+        result = await db.execute(statement.returning(*columns))
+    else:
+        await db.execute(statement)
+        result = await db.execute(select(*columns).where(models.User.id == owner_id))
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    last_number, last_position, version = row
+    replicas.router.note_write(owner_id)
+    return last_number - count + 1, last_position - POSITION_GAP * (count - 1), version
+
+
+"""
+***********************************************
+Method: bump_tasks_version()
+
+Description: This method is used to record a
+write to the user's tasks by bumping their
+tasks_version, which changes every task ETag.
+Writes bump the counter before touching any task
+rows so the user's row is always locked first.
+
+Parameters:
+- db (AsyncSession): The database session.
+- owner_id (int): The id of the user.
+- expected_version (Optional[int]): If given, only
+  bump when the counter still has this value
+  (used for If-Match).
+- task_delta / completed_delta: Changes to the
+  user's task counters made by the same write.
+  They may be SQL expressions, so a write can
+  adjust the counters from the rows it is about
+  to change without an extra round trip.
+
+returns: The new tasks_version, or None if it no
+longer matched expected_version.
+
+raises:
+- HTTPException (404): If the user no longer exists.
+***********************************************
+"""
+async def bump_tasks_version(db: AsyncSession, owner_id: int, expected_version: Optional[int] = None,
+                             task_delta=None, completed_delta=None) -> Optional[int]:
+    values = {"tasks_version": models.User.tasks_version + 1}
+    if task_delta is not None:
+        values["task_count"] = models.User.task_count + task_delta
+    if completed_delta is not None:
+        values["completed_count"] = models.User.completed_count + completed_delta
+    statement = (
+        update(models.User)
+        .where(models.User.id == owner_id)
+        .values(values)
+        .execution_options(synchronize_session=False)
+    )
+    if expected_version is not None:
+        statement = statement.where(models.User.tasks_version == expected_version)
+    replicas.router.note_write(owner_id)
+    if db.get_bind().dialect.update_returning:
+        result = await db.execute(statement.returning(models.User.tasks_version))
+        version = result.scalar_one_or_none()
+    else:
+        result = await db.execute(statement)
+        version = None if result.rowcount == 0 else await read_tasks_version(db, owner_id)
+    if version is None:
+        # No row updated: a changed version, or no user at all
+        if expected_version is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        await read_tasks_version(db, owner_id)
+    return version
+
+
+"""
+***********************************************
+Method: read_tasks_version()
+
+Description: This method is used to read the
+user's current tasks_version.
+
+Parameters:
+- db (AsyncSession): The database session.
+- owner_id (int): The id of the user.
+
+returns: The tasks_version.
+
+raises:
+- HTTPException (404): If the user no longer exists.
+***********************************************
+"""
+async def read_tasks_version(db: AsyncSession, owner_id: int) -> int:
+    result = await db.execute(select(models.User.tasks_version).where(models.User.id == owner_id))
+    version = result.scalar_one_or_none()
+    if version is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return version
+
+
+"""
+***********************************************
+Method: adjust_task_counters()
+
+Description: This method is used by the bulk
+writes to apply the counter changes they worked
+out while writing. The user's row is already
+locked by then.
+
+Parameters:
+- db (AsyncSession): The database session.
+- owner_id (int): The id of the user.
+- task_delta (int): Change to task_count.
+- completed_delta (int): Change to completed_count.
+
+returns: N/A
+***********************************************
+"""
+async def adjust_task_counters(db: AsyncSession, owner_id: int, task_delta: int, completed_delta: int):
+    if task_delta or completed_delta:
+        await db.execute(
+            update(models.User)
+            .where(models.User.id == owner_id)
+            .values(
+                task_count=models.User.task_count + task_delta,
+                completed_count=models.User.completed_count + completed_delta,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+"""
+***********************************************
+Method: stored_completed()
+
+Description: This method is used to build a SQL
+subquery for a task's stored completed flag as 0
+or 1 (NULL if the task does not exist).
+
+Parameters:
+- owner_id (int): The id of the user.
+- task_id (int): The id of the task.
+
+returns: A scalar subquery.
+***********************************************
+"""
+def stored_completed(owner_id: int, task_id: int):
+    return (
+        select(cast(models.Task.completed, Integer))
+        .where(models.Task.id == task_id, models.Task.owner_id == owner_id)
+        .scalar_subquery()
+    )
+
+
+"""
+***********************************************
+Method: publish_task_event()
+
+Description: This method is used to tell the
+user's open task streams about a committed change.
+A broker failure is logged rather than raised,
+since the write itself has already succeeded.
+
+Parameters:
+- owner_id (int): The id of the user.
+- event_type (str): created, updated or deleted.
+- fields: The event payload (tasks, task_ids, changes).
+
+returns: N/A
+***********************************************
+"""
+async def publish_task_event(owner_id: int, event_type: str, **fields):
+    try:
+        await events.broker.publish(owner_id, {"type": event_type, **fields})
+    except Exception:
+        logger.exception("Could not publish %s event for user %s", event_type, owner_id)
+
+
+"""
+***********************************************
+Method: write_task_changes()
+
+Description: This method is used to apply changes
+to one of the user's tasks with a single
+owner-scoped UPDATE of just those columns. It gets
+the new row back from the same statement
+(RETURNING) where the database supports it, and
+otherwise re-reads only that row by primary key.
+
+Parameters:
+- db (AsyncSession): The database session.
+- owner_id (int): The id of the user.
+- task_id (int): The id of the task.
+- changes (dict): Column -> new value.
+
+returns: The updated task as a dictionary, or None
+if the user has no such task.
+***********************************************
+"""
+async def write_task_changes(db: AsyncSession, owner_id: int, task_id: int, changes: dict) -> Optional[dict]:
+    owned = (models.Task.id == task_id, models.Task.owner_id == owner_id)
+    statement = update(models.Task).where(*owned).values(changes).execution_options(synchronize_session=False)
+    if db.get_bind().dialect.update_returning:
+        result = await db.execute(statement.returning(*TASK_COLUMNS))
+    else:
+        await db.execute(statement)
+        result = await db.execute(select(*TASK_COLUMNS).where(*owned))
+    row = result.first()
+    return row._asdict() if row is not None else None
+
+
+"""
+***********************************************
+Method: commit_write()
+
+Description: This method is used to run a single
+task write and commit it. Normally it runs in the
+request's own transaction. With GROUP_COMMIT on it
+joins the worker's next group commit instead. In
+both cases it only returns once the write is
+committed.
+
+Parameters:
+- db (AsyncSession): The request's session.
+- owner_id (int): The id of the user.
+- operation (Callable): An async function that
+  does the write with the session it is given.
+
+returns: What the operation returned.
+***********************************************
+"""
+async def commit_write(db: AsyncSession, owner_id: int, operation):
+    if group_commit.GROUP_COMMIT:
+        # The committer uses its own session; don't hold this one's connection
+        await db.rollback()
+        return await group_commit.committer.submit(owner_id, operation)
+    result = await operation(db)
+    await db.commit()
+    return result
+
+
+"""
+***********************************************
+Method: insert_task()
+
+Description: This method is used to write a new
+task with INSERT ... RETURNING. Without RETURNING
+the row is built from the inserted values and the
+new primary key, so it never needs a refresh.
+
+Parameters:
+- db (AsyncSession): The database session.
+- owner_id (int): The id of the user.
+- task_data (TaskCreate): The new task.
+
+returns: The task as a dictionary and the new
+tasks_version.
+***********************************************
+"""
+async def insert_task(db: AsyncSession, owner_id: int, task_data: TaskCreate) -> tuple:
+    number, position, version = await allocate_task_numbers(db, owner_id, 1, completed=int(task_data.completed))
+    values = {**task_data.model_dump(), "owner_id": owner_id, "number": number, "position": position}
+    statement = insert(models.Task).values(values)
+    if db.get_bind().dialect.insert_returning:
+        result = await db.execute(statement.returning(*TASK_COLUMNS))
+        return result.one()._asdict(), version
+    # Every column is known apart from the new id
+    result = await db.execute(statement)
+    return {**values, "id": result.inserted_primary_key[0]}, version
+
+
+"""
+***********************************************
+Method: change_task()
+
+Description: This method is used to bump the
+user's tasks_version (checking If-Match) and then
+apply changes to one task.
+
+Parameters:
+- db (AsyncSession): The database session.
+- owner_id (int): The id of the user.
+- task_id (int): The id of the task.
+- changes (dict): Column -> new value.
+- expected_version (Optional[int]): The version
+  from If-Match, if one was sent.
+
+returns: The updated task and the new tasks_version.
+
+raises:
+- HTTPException (412): If the tasks changed since
+  expected_version.
+- HTTPException (404): If the user has no such task.
+***********************************************
+"""
+async def change_task(db: AsyncSession, owner_id: int, task_id: int, changes: dict, expected_version: Optional[int]) -> tuple:
+    # Bumping the version first both locks the user's row and, with
+    # If-Match, checks nothing changed since the client's copy. A change
+    # to completed moves completed_count by new minus stored value.
+    completed_delta = None
+    if "completed" in changes:
+        new_value = int(changes["completed"])
+        completed_delta = new_value - func.coalesce(stored_completed(owner_id, task_id), new_value)
+    version = await bump_tasks_version(db, owner_id, expected_version, completed_delta=completed_delta)
+    if version is None:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Task has been modified")
+    task = await write_task_changes(db, owner_id, task_id, changes)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found or access denied")
+    return task, version
+
+
+"""
+***********************************************
+Method: remove_task()
+
+Description: This method is used to delete one of
+the user's tasks with a single owner-scoped
+DELETE. The row count tells us whether it existed.
+
+Parameters:
+- db (AsyncSession): The database session.
+- owner_id (int): The id of the user.
+- task_id (int): The id of the task.
+
+returns: The new tasks_version.
+
+raises:
+- HTTPException (404): If the user has no such task.
+***********************************************
+"""
+async def remove_task(db: AsyncSession, owner_id: int, task_id: int) -> int:
+    # Take the task out of the counters in the same statement that locks the user
+    exists = func.coalesce(
+        select(literal(1))
+        .where(models.Task.id == task_id, models.Task.owner_id == owner_id)
+        .scalar_subquery(),
+        0,
+    )
+    version = await bump_tasks_version(
+        db, owner_id,
+        task_delta=-exists,
+        completed_delta=-func.coalesce(stored_completed(owner_id, task_id), 0),
+    )
+    result = await db.execute(delete(models.Task).where(models.Task.id == task_id, models.Task.owner_id == owner_id))
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Task not found or access denied")
+    return version
+
+
+"""
+***********************************************
+Method: raise_last_position()
+
+Description: This method is used to keep the
+user's last_position at or above the position of
+their last task, after a write that puts tasks
+at the end of the order.
+
+Parameters:
+- db (AsyncSession): The database session.
+- owner_id (int): The id of the user.
+- position (float): The highest position written.
+
+returns: N/A
+***********************************************
+"""
+async def raise_last_position(db: AsyncSession, owner_id: int, position: float):
+    await db.execute(
+        update(models.User)
+        .where(models.User.id == owner_id)
+        .values(last_position=case((models.User.last_position < position, position), else_=models.User.last_position))
+        .execution_options(synchronize_session=False)
+    )
+
+
+"""
+***********************************************
+Method: neighbour_positions()
+
+Description: This method is used to find the
+positions a moved task has to go between: that of
+the task it is put after, and that of the task
+now following it (leaving out the moved task).
+
+Parameters:
+- db (AsyncSession): The database session.
+- owner_id (int): The id of the user.
+- task_id (int): The id of the task being moved.
+- after_id (Optional[int]): The task to put it
+  after, or None to put it first.
+
+returns: The (before, after) positions; either is
+None at the start or end of the order.
+
+raises:
+- HTTPException (404): If the user has no task
+  after_id.
+***********************************************
+"""
+async def neighbour_positions(db: AsyncSession, owner_id: int, task_id: int, after_id: Optional[int]) -> tuple:
+    following = select(models.Task.position).where(models.Task.owner_id == owner_id, models.Task.id != task_id)
+    if after_id is None:
+        before = None
+    else:
+        result = await db.execute(
+            select(models.Task.position).where(models.Task.id == after_id, models.Task.owner_id == owner_id)
+        )
+        before = result.scalar_one_or_none()
+        if before is None:
+            raise HTTPException(status_code=404, detail="Task to move after not found or access denied")
+        following = following.where(keyset_condition(models.Task.position, before, after_id))
+    result = await db.execute(following.order_by(models.Task.position, models.Task.id).limit(1))
+    return before, result.scalar_one_or_none()
+
+
+"""
+***********************************************
+Method: rebalance_positions()
+
+Description: This method is used to spread out
+the tasks around a spot whose neighbours have run
+out of room between them. It takes the window
+tasks on each side and spaces them evenly between
+the tasks just outside the window, widening the
+window until they are at least
+POSITION_MIN_GAP * POSITION_GAP apart (or spacing
+them POSITION_GAP apart once the window reaches
+the start or end). Only the window is rewritten,
+so a move stays cheap however long the list is.
+
+Parameters:
+- db (AsyncSession): The database session.
+- owner_id (int): The id of the user.
+- anchor (tuple): The (position, id) of the task
+  the window is centred on.
+
+returns: How many tasks were given new positions.
+***********************************************
+"""
+async def rebalance_positions(db: AsyncSession, owner_id: int, anchor: tuple) -> int:
+    position, anchor_id = anchor
+    owned = select(models.Task.id, models.Task.position).where(models.Task.owner_id == owner_id)
+    window = POSITION_REBALANCE_WINDOW
+    while True:
+        # One extra row on each side gives the bounds the window is spread between
+        below = (await db.execute(
+            owned.where(keyset_condition(models.Task.position, position, anchor_id, before=True, inclusive=True))
+            .order_by(models.Task.position.desc(), models.Task.id.desc()).limit(window + 1)
+        )).all()
+        above = (await db.execute(
+            owned.where(keyset_condition(models.Task.position, position, anchor_id)).order_by(models.Task.position, models.Task.id).limit(window + 1)
+        )).all()
+        low = below[window].position if len(below) > window else None
+        high = above[window].position if len(above) > window else None
+        task_ids = [row.id for row in reversed(below[:window])] + [row.id for row in above[:window]]
+
+        step = POSITION_GAP
+        if low is not None and high is not None:
+            step = (high - low) / (len(task_ids) + 1)
+            if step < POSITION_MIN_GAP * POSITION_GAP:
+                window *= 4
+                continue
+            start = low
+        elif low is not None:
+            start = low
+        elif high is not None:
+            start = high - step * (len(task_ids) + 1)
+        else:
+            start = 0.0
+        await db.execute(
+            update(models.Task),
+            [{"id": task_id, "position": start + step * (i + 1)} for i, task_id in enumerate(task_ids)],
+        )
+        if high is None:
+            await raise_last_position(db, owner_id, start + step * len(task_ids))
+        return len(task_ids)
+
+
+"""
+***********************************************
+Method: move_task()
+
+Description: This method is used to put one of the
+user's tasks right after another one (or first).
+The task takes the midpoint of its new neighbours'
+positions, so only its own row is written; the
+tasks around it are spread out again only when the
+gap has become too small.
+
+Parameters:
+- db (AsyncSession): The database session.
+- owner_id (int): The id of the user.
+- task_id (int): The id of the task to move.
+- after_id (Optional[int]): The task to put it
+  after, or None to put it first.
+
+returns: The moved task and the new tasks_version.
+
+raises:
+- HTTPException (404): If the user has no such task.
+***********************************************
+"""
+async def move_task(db: AsyncSession, owner_id: int, task_id: int, after_id: Optional[int]) -> tuple:
+    # Lock the user's row first, like every other task write
+    version = await bump_tasks_version(db, owner_id)
+    before, following = await neighbour_positions(db, owner_id, task_id, after_id)
+    if before is not None and following is not None and following - before < POSITION_MIN_GAP:
+        await rebalance_positions(db, owner_id, (before, after_id))
+        before, following = await neighbour_positions(db, owner_id, task_id, after_id)
+
+    if before is None and following is None:
+        position = POSITION_GAP
+    elif before is None:
+        position = following - POSITION_GAP
+    elif following is None:
+        position = before + POSITION_GAP
+        await raise_last_position(db, owner_id, position)
+    else:
+        position = (before + following) / 2
+    task = await write_task_changes(db, owner_id, task_id, {"position": position})
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found or access denied")
+    return task, version
+
+
+"""
+***********************************************
+Method: task_page_query()
+
+Description: This method is used to build the
+query for one page of the task list (without its
+LIMIT). Every sort order and cursor reads as a
+range of the sort's (owner_id, column, id) index.
+
+Parameters:
+- owner_id (int): The id of the user.
+- sort (str): The sort order (see read_tasks()).
+- cursor: The decoded cursor, or None.
+- completed (Optional[bool]): Completion filter.
+- title_prefix (Optional[str]): Title prefix filter.
+
+returns: The SELECT statement.
+***********************************************
+"""
+def task_page_query(owner_id: int, sort: str = "id", cursor=None, completed: Optional[bool] = None,
+                    title_prefix: Optional[str] = None):
+    query = select(*TASK_COLUMNS).where(models.Task.owner_id == owner_id)
+    if completed is not None:
+        query = query.where(models.Task.completed == completed)
+    if title_prefix:
+        # A range of ix_tasks_owner_title_id on MySQL; SQLite's LIKE ignores
+        # case, so it cannot use the index
+        query = query.where(models.Task.title.like(escape_like(title_prefix) + "%", escape="\\"))
+    if sort == "id":
+        if cursor is not None:
+            query = query.where(models.Task.id > cursor)
+        query = query.order_by(models.Task.id)
+    else:
+        column, descending, _ = TASK_SORTS[sort]
+        if sort == "due_at":
+            query = query.where(models.Task.due_at.is_not(None))
+        if cursor is not None:
+            query = query.where(keyset_condition(column, *cursor, before=descending))
+        if descending:
+            query = query.order_by(column.desc(), models.Task.id.desc())
+        else:
+            query = query.order_by(column, models.Task.id)
+    return query
 
 
 """
@@ -39,34 +843,485 @@ for the authenticated user.
 returns: The created task object.
 ***********************************************
 """
-@router.post("/tasks/")
-async def create_task(request: Request, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    task_data = await request.json()
-    title = task_data.get("title")
-    description = task_data.get("description")
-    completed = task_data.get("completed", False)
-
+@router.post("/tasks/", response_model=TaskOut)
+async def create_task(task_data: TaskCreate, db: AsyncSession = Depends(get_db), current_user: UserPrincipal = Depends(get_current_user)):
     # Create a new task and associate it with the current user
-    new_task = models.Task(title=title, description=description, completed=completed, owner_id=current_user.id)
-    db.add(new_task)
-    db.commit()
-    db.refresh(new_task)
-    return new_task
+    task, version = await commit_write(db, current_user.id, lambda session: insert_task(session, current_user.id, task_data))
+    task_out = TaskOut.model_validate(task)
+    search.task_index.record_write(current_user.id, version, created=[task_out.model_dump()])
+    await publish_task_event(current_user.id, "created", tasks=[task_out.model_dump()])
+    return task_out
 
 """
 ***********************************************
 Method: read_tasks()
 
-Description: This method is used to fetch all 
-tasks for the authenticated user.
+Description: This method is used to fetch one page
+of tasks for the authenticated user, ordered by id
+or by one of the TASK_SORTS. Pages are keyset
+based: pass the X-Next-Cursor response header as
+`after` to get the next page. The header is left
+out on the last page. Each sort order reads its
+pages as a range scan of its own index. Each page
+carries an ETag; a request whose If-None-Match
+still matches gets a 304 after a single counter
+read, without loading any tasks.
+
+Parameters:
+- limit (int): The maximum number of tasks to return.
+- after (Optional[str]): The cursor of the previous
+  page. Sorted by id, it is the last task's id.
+- sort (str): id (oldest first), position (the
+  user's own order), due_at (soonest first; only
+  tasks with a due date) or priority (highest
+  first, newest first within a priority).
+- completed (Optional[bool]): Only return tasks with
+  this completion status.
+- title_prefix (Optional[str]): Only return tasks whose
+  title starts with this text.
+
+returns: A list of tasks. The rows are read as
+plain column tuples and encoded straight to JSON.
+***********************************************
+"""
+@router.get("/tasks/", response_model=List[TaskOut])
+async def read_tasks(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, max_length=200),
+    sort: Literal["id", "position", "due_at", "priority"] = "id",
+    completed: Optional[bool] = None,
+    title_prefix: Optional[str] = Query(None, max_length=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserPrincipal = Depends(get_current_user),
+):
+    cursor = decode_cursor(after, sort) if after is not None else None
+
+    # Read the version before the rows so the ETag is never newer than the data
+    version = await read_tasks_version(db, current_user.id)
+    etag = make_etag(version, current_user.id, "tasks", limit, after, sort, completed, title_prefix)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+
+    query = task_page_query(current_user.id, sort, cursor, completed, title_prefix)
+    # Fetch one extra row to find out whether another page exists
+    result = await db.execute(query.limit(limit + 1))
+    tasks = [row._asdict() for row in result]
+    headers = {"ETag": etag, "Cache-Control": TASKS_CACHE_CONTROL}
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        last = tasks[-1]
+        headers["X-Next-Cursor"] = str(last["id"]) if sort == "id" else encode_cursor(last[sort], last["id"])
+    return FastJSONResponse(tasks, headers=headers)
+
+"""
+***********************************************
+Method: read_task_summary()
+
+Description: This method is used to fetch how many
+tasks the authenticated user has, and how many of
+them are done, for "X of Y done". It reads the
+counters kept on the user's row, so it costs the
+same for 10 tasks as for 100k. It carries an ETag
+like the task list.
+
+returns: The total, completed and open task counts.
+
+raises:
+- HTTPException (404): If the user no longer exists.
+***********************************************
+"""
+@router.get("/tasks/summary", response_model=TaskSummary)
+async def read_task_summary(request: Request, db: AsyncSession = Depends(get_read_db), current_user: UserPrincipal = Depends(get_current_user)):
+    result = await db.execute(
+        select(models.User.tasks_version, models.User.task_count, models.User.completed_count)
+        .where(models.User.id == current_user.id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    version, total, completed = row
+    etag = make_etag(version, current_user.id, "summary")
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    return FastJSONResponse(
+        {"total": total, "completed": completed, "open": total - completed},
+        headers={"ETag": etag, "Cache-Control": TASKS_CACHE_CONTROL},
+    )
+
+"""
+***********************************************
+Method: search_tasks()
+
+Description: This method is used to search the
+authenticated user's task titles and descriptions.
+Every word in `q` has to match a word in the task
+(or the start of one). Results are ranked with
+title matches first. Like the task list, results
+carry an ETag.
+
+Parameters:
+- q (str): The search text.
+- limit (int): The maximum number of tasks to return.
+- offset (int): Results to skip. The X-Next-Offset
+  response header gives the offset of the next
+  page and is left out on the last page.
+
+returns: A list of tasks, best match first.
+***********************************************
+"""
+@router.get("/tasks/search", response_model=List[TaskOut])
+async def search_tasks(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_SEARCH_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_user),
+):
+    version = await read_tasks_version(db, current_user.id)
+    etag = make_etag(version, current_user.id, "search", q, limit, offset)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+
+    tasks, has_more = await search.search_tasks(db, current_user.id, version, q, TASK_COLUMNS, limit, offset)
+    headers = {"ETag": etag, "Cache-Control": TASKS_CACHE_CONTROL}
+    if has_more:
+        headers["X-Next-Offset"] = str(offset + limit)
+    return FastJSONResponse(tasks, headers=headers)
+
+"""
+***********************************************
+Method: task_event_stream()
+
+Description: This method is used to produce the
+Server-Sent Events body of a task stream. It sends
+a keep-alive comment whenever the stream has been
+idle, and it always releases the subscription when
+the client goes away.
+
+Parameters:
+- subscriber (Subscriber): The stream's subscription.
+
+returns: An async iterator of encoded events.
+***********************************************
+"""
+async def task_event_stream(subscriber: events.Subscriber):
+    try:
+        yield b"retry: 5000\n: connected\n\n"
+        while True:
+            event = await subscriber.next_event(STREAM_KEEPALIVE_SECONDS)
+            if event is None:
+                yield b": keep-alive\n\n"
+            else:
+                yield events.format_sse(event)
+    finally:
+        events.broker.unsubscribe(subscriber)
+
+"""
+***********************************************
+Method: stream_tasks()
 
-returns: A list of tasks.
+Description: This method is used to push changes
+to the authenticated user's tasks as they happen,
+as a Server-Sent Events stream. Events are
+"created" and "updated" (carrying the tasks or
+the ids and changes), "deleted" (carrying the
+ids), and "resync" when the client fell too far
+behind and should re-fetch its list. The stream
+holds no database connection while it is open.
+
+returns: A text/event-stream response.
+
+raises:
+- HTTPException (503): If too many streams are open.
 ***********************************************
 """
-@router.get("/tasks/")
-def read_tasks(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    tasks = db.query(models.Task).filter(models.Task.owner_id == current_user.id).all()
-    return tasks
+@router.get("/tasks/stream")
+async def stream_tasks(token: str = Depends(oauth2_scheme)):
+    # Resolve the user with a short-lived session instead of a request
+    # dependency so no pooled connection stays checked out while streaming
+    async with database.AsyncSessionLocal() as db:
+        current_user = await get_current_user(token, db)
+
+    # Take the slot before answering, so a full worker refuses the
+    # stream with a 503 instead of sending a 200 that ends at once
+    try:
+        subscriber = events.broker.subscribe(current_user.id)
+    except events.SubscriberLimitReached:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many open task streams",
+            headers={"Retry-After": "5"},
+        )
+    # The background task also frees the slot if the body never started
+    return StreamingResponse(
+        task_event_stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(events.broker.unsubscribe, subscriber),
+    )
+
+"""
+***********************************************
+Method: validation_detail()
+
+Description: This method is used to turn a
+Pydantic validation error for one bulk item into
+a short message.
+
+Parameters:
+- error (ValidationError): The validation error.
+
+returns: The error message.
+***********************************************
+"""
+def validation_detail(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" if e["loc"] else e["msg"]
+        for e in error.errors()
+    )
+
+"""
+***********************************************
+Method: is_task_id()
+
+Description: This method is used to check that a
+value sent as a task id is an integer (and not a
+boolean, which Python treats as an int).
+
+Parameters:
+- value (Any): The value to check.
+
+returns: True if the value is a usable task id.
+***********************************************
+"""
+def is_task_id(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+"""
+***********************************************
+Method: owned_task_ids()
+
+Description: This method is used to find which of
+the given task ids belong to the user. Callers
+bump tasks_version first, so the user's row lock
+is held; the rows are read FOR UPDATE, which sees
+the latest commits and keeps them until the
+transaction ends, so the ids found are the ones
+the bulk write will change.
+
+Parameters:
+- db (AsyncSession): The database session.
+- owner_id (int): The id of the user.
+- task_ids (list): The task ids to check.
+
+returns: The set of ids owned by the user.
+***********************************************
+"""
+async def owned_task_ids(db: AsyncSession, owner_id: int, task_ids: list) -> set:
+    owned = set()
+    for start in range(0, len(task_ids), BULK_CHUNK_SIZE):
+        chunk = task_ids[start:start + BULK_CHUNK_SIZE]
+        result = await db.execute(
+            select(models.Task.id)
+            .where(models.Task.owner_id == owner_id, models.Task.id.in_(chunk))
+            .with_for_update()
+        )
+        owned.update(result.scalars())
+    return owned
+
+"""
+***********************************************
+Method: create_tasks_bulk()
+
+Description: This method is used to create many
+tasks for the authenticated user in a single
+transaction. Valid items get a block of task
+numbers from one counter update and are written
+with multi-row INSERTs.
+
+Body: A JSON array of {"title", "description",
+"completed"} objects.
+
+returns: One result per item, in order, with its
+new id or the reason it was rejected.
+***********************************************
+"""
+@router.post("/tasks/bulk", response_model=List[BulkItemResult])
+async def create_tasks_bulk(
+    items: List[Any] = Body(max_length=MAX_BULK_ITEMS),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_user),
+):
+    results = []
+    rows = []
+    for index, item in enumerate(items):
+        try:
+            task_data = TaskCreate.model_validate(item)
+        except ValidationError as error:
+            results.append({"index": index, "status": "invalid", "detail": validation_detail(error)})
+            continue
+        results.append({"index": index, "status": "created"})
+        rows.append({**task_data.model_dump(), "owner_id": current_user.id})
+
+    if rows:
+        first_number, first_position, version = await allocate_task_numbers(
+            db, current_user.id, len(rows), completed=sum(1 for row in rows if row["completed"])
+        )
+        for offset, row in enumerate(rows):
+            row["number"] = first_number + offset
+            row["position"] = first_position + POSITION_GAP * offset
+
+        # The per-owner numbers tie each new row back to its item
+        if db.get_bind().dialect.insert_executemany_returning:
+            result = await db.execute(insert(models.Task).returning(models.Task.number, models.Task.id), rows)
+        else:
+            await db.execute(insert(models.Task), rows)
+            result = await db.execute(
+                select(models.Task.number, models.Task.id).where(
+                    models.Task.owner_id == current_user.id,
+                    models.Task.number.between(first_number, first_number + len(rows) - 1),
+                )
+            )
+        ids_by_number = dict(result.all())
+        new_ids = [ids_by_number[row["number"]] for row in rows]
+        await db.commit()
+        new_tasks = [{**row, "id": task_id} for row, task_id in zip(rows, new_ids)]
+        search.task_index.record_write(current_user.id, version, created=new_tasks)
+        await publish_task_event(current_user.id, "created", tasks=new_tasks)
+
+        created = iter(new_ids)
+        for entry in results:
+            if entry["status"] == "created":
+                entry["id"] = next(created)
+    return results
+
+"""
+***********************************************
+Method: update_tasks_bulk()
+
+Description: This method is used to update many
+tasks for the authenticated user in a single
+transaction. Items asking for the same change are
+grouped into one set-based UPDATE, so marking a
+whole list as done is a single statement.
+
+Body: A JSON array of {"id", "title",
+"description", "completed"} objects. Fields are
+applied the same way as in update_task().
+
+returns: One result per item, in order.
+***********************************************
+"""
+@router.patch("/tasks/bulk", response_model=List[BulkItemResult])
+async def update_tasks_bulk(
+    items: List[Any] = Body(max_length=MAX_BULK_ITEMS),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_user),
+):
+    updates = []
+    for item in items:
+        try:
+            updates.append(BulkTaskUpdate.model_validate(item))
+        except ValidationError as error:
+            updates.append(error)
+    valid_ids = [u.id for u in updates if isinstance(u, BulkTaskUpdate)]
+    # Lock the user's row before reading ownership, like every other task write
+    version = await bump_tasks_version(db, current_user.id) if valid_ids else None
+    owned = await owned_task_ids(db, current_user.id, valid_ids)
+
+    results = []
+    groups = {}  # tuple of changed columns -> task ids
+    for index, item in enumerate(updates):
+        if isinstance(item, ValidationError):
+            results.append({"index": index, "status": "invalid", "detail": validation_detail(item)})
+            continue
+        if item.id not in owned:
+            results.append({"index": index, "id": item.id, "status": "not_found"})
+            continue
+        changes = item.changes()
+        changes.pop("id", None)
+        results.append({"index": index, "id": item.id, "status": "updated"})
+        if changes:
+            groups.setdefault(tuple(sorted(changes.items())), []).append(item.id)
+
+    if not groups:
+        # Nothing to write, so leave tasks_version where it was
+        await db.rollback()
+        return results
+    completed_delta = 0
+    for changes, task_ids in groups.items():
+        new_completed = dict(changes).get("completed")
+        for start in range(0, len(task_ids), BULK_CHUNK_SIZE):
+            chunk = (models.Task.owner_id == current_user.id, models.Task.id.in_(task_ids[start:start + BULK_CHUNK_SIZE]))
+            if new_completed is not None:
+                # Count the tasks this chunk will flip before it flips them
+                flipped = await db.execute(
+                    select(func.count()).where(*chunk, models.Task.completed != new_completed)
+                )
+                completed_delta += flipped.scalar_one() * (1 if new_completed else -1)
+            await db.execute(update(models.Task).where(*chunk).values(dict(changes)))
+    await adjust_task_counters(db, current_user.id, 0, completed_delta)
+    await db.commit()
+    search.task_index.record_write(
+        current_user.id, version, updated=[(task_ids, dict(changes)) for changes, task_ids in groups.items()]
+    )
+    for changes, task_ids in groups.items():
+        await publish_task_event(current_user.id, "updated", task_ids=task_ids, changes=dict(changes))
+    return results
+
+"""
+***********************************************
+Method: delete_tasks_bulk()
+
+Description: This method is used to delete many
+tasks for the authenticated user in a single
+transaction with a set-based DELETE.
+
+Body: A JSON array of task ids.
+
+returns: One result per id, in order.
+***********************************************
+"""
+@router.delete("/tasks/bulk", response_model=List[BulkItemResult])
+async def delete_tasks_bulk(
+    task_ids: List[Any] = Body(max_length=MAX_BULK_ITEMS),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_user),
+):
+    valid_ids = [task_id for task_id in task_ids if is_task_id(task_id)]
+    # Lock the user's row before reading ownership, like every other task write
+    version = await bump_tasks_version(db, current_user.id) if valid_ids else None
+    owned = await owned_task_ids(db, current_user.id, valid_ids)
+
+    owned_list = list(owned)
+    deleted_count = 0
+    deleted_completed = 0
+    for start in range(0, len(owned_list), BULK_CHUNK_SIZE):
+        chunk = (models.Task.owner_id == current_user.id, models.Task.id.in_(owned_list[start:start + BULK_CHUNK_SIZE]))
+        completed = await db.execute(select(func.count()).where(*chunk, models.Task.completed))
+        deleted_completed += completed.scalar_one()
+        result = await db.execute(delete(models.Task).where(*chunk))
+        deleted_count += result.rowcount
+    if owned_list:
+        await adjust_task_counters(db, current_user.id, -deleted_count, -deleted_completed)
+        await db.commit()
+        search.task_index.record_write(current_user.id, version, deleted=owned_list)
+        await publish_task_event(current_user.id, "deleted", task_ids=owned_list)
+    else:
+        # Nothing to write, so leave tasks_version where it was
+        await db.rollback()
+
+    results = []
+    for index, task_id in enumerate(task_ids):
+        if not is_task_id(task_id):
+            results.append({"index": index, "status": "invalid", "detail": "Task ids must be integers"})
+        elif task_id in owned:
+            results.append({"index": index, "id": task_id, "status": "deleted"})
+        else:
+            results.append({"index": index, "id": task_id, "status": "not_found"})
+    return results
 
 """
 ***********************************************
@@ -74,15 +1329,25 @@ Method: read_task()
 
 Description: This method is used to retrieve a task
 based on the task_id for the authenticated user.
+Like the task list it carries an ETag and answers
+a matching If-None-Match with a 304.
 
 returns: A task object.
 ***********************************************
 """
-@router.get("/tasks/{task_id}")
-def read_task(task_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    task = db.query(models.Task).filter(models.Task.id == task_id, models.Task.owner_id == current_user.id).first()
+@router.get("/tasks/{task_id}", response_model=TaskOut)
+async def read_task(task_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_read_db), current_user: UserPrincipal = Depends(get_current_user)):
+    version = await read_tasks_version(db, current_user.id)
+    etag = make_etag(version, current_user.id, "task", task_id)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+
+    result = await db.execute(select(models.Task).where(models.Task.id == task_id, models.Task.owner_id == current_user.id))
+    task = result.scalar_one_or_none()
     if task is None:
         raise HTTPException(status_code=404, detail="Task not found or access denied")
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = TASKS_CACHE_CONTROL
     return task
 
 """
@@ -90,32 +1355,76 @@ def read_task(task_id: int, db: Session = Depends(get_db), current_user: models.
 Method: update_task()
 
 Description: This method is used to update a task's
-information for the authenticated user.
+information for the authenticated user. PUT and
+PATCH both change only the fields in the body. A
+field that is sent is stored as given, so "" or
+null clears the description and "" clears the
+title. Sending the task's ETag in If-Match makes
+the update conditional: if any of the user's tasks
+changed since that ETag was issued the update is
+refused with a 412.
 
 returns: The updated task details.
 ***********************************************
 """
-@router.put("/tasks/{task_id}")
-async def update_task(task_id: int, request: Request, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    task_data = await request.json()
-    title = task_data.get("title")
-    description = task_data.get("description")
-    completed = task_data.get("completed")
+@router.patch("/tasks/{task_id}", response_model=TaskOut)
+@router.put("/tasks/{task_id}", response_model=TaskOut)
+async def update_task(task_id: int, task_data: TaskUpdate, request: Request, response: Response, db: AsyncSession = Depends(get_db), current_user: UserPrincipal = Depends(get_current_user)):
+    changes = task_data.changes()
 
-    task = db.query(models.Task).filter(models.Task.id == task_id, models.Task.owner_id == current_user.id).first()
-    if task is None:
-        raise HTTPException(status_code=404, detail="Task not found or access denied")
+    expected_version = None
+    if_match = request.headers.get("if-match")
+    if if_match is not None and if_match.strip() != "*":
+        expected_version = etag_version(if_match, current_user.id, "task", task_id)
+        if expected_version is None:
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Task has been modified")
 
-    if title:
-        task.title = title
-    if description:
-        task.description = description
-    if completed is not None:
-        task.completed = completed
+    if not changes:
+        # Nothing to write: check the precondition and return the task as it is
+        version = await read_tasks_version(db, current_user.id)
+        if expected_version is not None and expected_version != version:
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Task has been modified")
+        result = await db.execute(select(*TASK_COLUMNS).where(models.Task.id == task_id, models.Task.owner_id == current_user.id))
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Task not found or access denied")
+        response.headers["ETag"] = make_etag(version, current_user.id, "task", task_id)
+        return row._asdict()
 
-    db.commit()
-    db.refresh(task)
-    return task
+    task, version = await commit_write(
+        db, current_user.id, lambda session: change_task(session, current_user.id, task_id, changes, expected_version)
+    )
+
+    response.headers["ETag"] = make_etag(version, current_user.id, "task", task_id)
+    task_out = TaskOut.model_validate(task)
+    search.task_index.record_write(current_user.id, version, updated=[([task_id], changes)])
+    await publish_task_event(current_user.id, "updated", tasks=[task_out.model_dump()])
+    return task_out
+
+"""
+***********************************************
+Method: move_task_endpoint()
+
+Description: This method is used to reorder the
+authenticated user's tasks, e.g. after a drag and
+drop: the task is put right after after_id, or
+first when after_id is null. List the tasks with
+sort=position to get them in this order.
+
+returns: The moved task, with its new position.
+***********************************************
+"""
+@router.post("/tasks/{task_id}/move", response_model=TaskOut)
+async def move_task_endpoint(task_id: int, move: TaskMove, db: AsyncSession = Depends(get_db), current_user: UserPrincipal = Depends(get_current_user)):
+    if move.after_id == task_id:
+        raise HTTPException(status_code=400, detail="A task cannot be moved after itself")
+    task, version = await commit_write(
+        db, current_user.id, lambda session: move_task(session, current_user.id, task_id, move.after_id)
+    )
+    task_out = TaskOut.model_validate(task)
+    search.task_index.record_write(current_user.id, version, updated=[([task_id], {"position": task_out.position})])
+    await publish_task_event(current_user.id, "updated", tasks=[task_out.model_dump()])
+    return task_out
 
     
 """
@@ -128,18 +1437,10 @@ from the database by its ID for the authenticated user.
 returns: A message indicating the result.
 ***********************************************
 """
-@router.delete("/tasks/{task_id}")
-def delete_task(task_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    task = db.query(models.Task).filter(models.Task.id == task_id, models.Task.owner_id == current_user.id).first()
-    if task is None:
-        raise HTTPException(status_code=404, detail="Task not found or access denied")
-
-    db.delete(task)
-    db.commit()
+@router.delete("/tasks/{task_id}", response_model=Message)
+async def delete_task(task_id: int, db: AsyncSession = Depends(get_db), current_user: UserPrincipal = Depends(get_current_user)):
+    version = await commit_write(db, current_user.id, lambda session: remove_task(session, current_user.id, task_id))
+    search.task_index.record_write(current_user.id, version, deleted=[task_id])
+    await publish_task_event(current_user.id, "deleted", task_ids=[task_id])
 
-    task_count = db.query(models.Task).filter(models.Task.owner_id == current_user.id).count()
-    if task_count == 0:
-        db.execute(text("ALTER TABLE tasks AUTO_INCREMENT = 1"))
-        db.commit()
-        
     return {"detail": "Task deleted"}
@@ -7,24 +7,25 @@ File: users.py
 Description: File that contains user-related endpoints.
 ***********************************************
 """
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
-from Database.src import database, models
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from Database.src import models
+from Database.src.database import get_db
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi import status
-from ..auth import hash_password, verify_password, create_access_token, get_current_user
+from .. import auth, search
+from ..ratelimit import limit_login, limit_signup
+from ..auth import (
+    UserPrincipal, hash_password_async, verify_password_async, create_tokens, decode_access_token,
+    get_current_user, invalid_token,
+)
+from ..schemas import Message, Token, TokenRefresh, UserCreate, UserCreated, UserOut, UserUpdate
 
 # Create a router
 router = APIRouter()
 
-# Import get_db function
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 """
 ***********************************************
            All User Endpoints/Methods
@@ -40,34 +41,39 @@ in the database.
 returns: The created user object.
 ***********************************************
 """
-@router.post("/users/")
-async def create_user(request: Request, db: Session = Depends(get_db)):
-    user_data = await request.json()
-    username = user_data.get("username")
-    password = user_data.get("password")
+@router.post("/users/", response_model=UserCreated, dependencies=[Depends(limit_signup)])
+async def create_user(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
+    username = user_data.username
+    password = user_data.password
 
     if not username or not password:
         raise HTTPException(status_code=400, detail="Username and password are required")
 
     # Check if the username already exists
-    existing_user = db.query(models.User).filter(models.User.username == username).first()
-    if existing_user:
+    result = await db.execute(select(models.User.id).where(models.User.username == username))
+    if result.first():
         raise HTTPException(status_code=400, detail="Username already exists")
 
-    # Hash the password and create the user
-    hashed_password = hash_password(password)
+    # Give the pooled connection back while bcrypt runs so slow hashes
+    # cannot exhaust the pool for other requests
+    await db.rollback()
+
+    # Hash the password off the event loop and create the user
+    hashed_password = await hash_password_async(password)
     new_user = models.User(username=username, hashed_password=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-
-      # Generate a JWT token for the new user
-    access_token = create_access_token(data={"sub": new_user.username})
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Another signup took the name while this one was hashing
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Username already exists")
 
+    # Generate the JWT tokens for the new user
+    auth.token_versions.set(new_user.id, new_user.token_version)
     return {
         "message": "User created successfully",
-        "access_token": access_token,
-        "token_type": "bearer"
+        **create_tokens(new_user.id, new_user.username, new_user.token_version),
     }
 
 """
@@ -83,19 +89,54 @@ returns: A dictionary containing the access token
 and token type.
 ***********************************************
 """
-@router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+@router.post("/login", response_model=Token, dependencies=[Depends(limit_login)])
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     # Check if the user exists
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    result = await db.execute(
+        select(models.User.id, models.User.username, models.User.hashed_password, models.User.token_version)
+        .where(models.User.username == form_data.username)
+    )
+    user = result.first()
+
+    # Give the pooled connection back while bcrypt runs
+    await db.rollback()
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    # Create a JWT token
-    access_token = create_access_token(data={"sub": user.username})
-    return {"access_token": access_token, "token_type": "bearer"}
+    # Create the JWT tokens
+    return create_tokens(user.id, user.username, user.token_version)
+
+"""
+***********************************************
+Method: refresh_token()
+
+Description: This method is used to trade a
+refresh token for a new access and refresh token
+pair, without sending the password again. The
+user's token version is read from the database,
+not the cache, so a revoked refresh token is
+refused on every worker at once.
+
+returns: A dictionary containing the new tokens.
+***********************************************
+"""
+@router.post("/token/refresh", response_model=Token)
+async def refresh_token(body: TokenRefresh, db: AsyncSession = Depends(get_db)):
+    payload = decode_access_token(body.refresh_token)
+    if payload.get("type") != "refresh" or "uid" not in payload:
+        raise invalid_token()
+
+    result = await db.execute(
+        select(models.User.username, models.User.token_version).where(models.User.id == payload["uid"])
+    )
+    user = result.first()
+    if user is None or user.token_version != payload.get("ver"):
+        raise invalid_token("Token has been revoked")
+    auth.token_versions.set(payload["uid"], user.token_version)
+    return create_tokens(payload["uid"], user.username, user.token_version)
 
 """
 ***********************************************
@@ -108,8 +149,8 @@ personal profile.
 returns: A user object.
 ***********************************************
 """
-@router.get("/users/me")
-def read_user_profile(current_user: models.User = Depends(get_current_user)):
+@router.get("/users/me", response_model=UserOut)
+async def read_user_profile(current_user: UserPrincipal = Depends(get_current_user)):
     return {
         "id": current_user.id,
         "username": current_user.username,
@@ -121,29 +162,51 @@ def read_user_profile(current_user: models.User = Depends(get_current_user)):
 Method: update_user()
 
 Description: This method is used to update a 
-user's information.
+user's information. Only the user themselves may
+change it, since a new username or password
+revokes every token they hold.
 
 returns: The updated user details.
+
+raises:
+- HTTPException (403): If the token belongs to
+  another user.
 ***********************************************
 """
 # 4. Update a User
-@router.put("/users/{user_id}")
-async def update_user(user_id: int, request: Request, db: Session = Depends(get_db)):
-    user_data = await request.json()
-    username = user_data.get("username")
-    password = user_data.get("password")  # Accept plain password for hashing
+@router.put("/users/{user_id}", response_model=UserOut)
+async def update_user(user_id: int, user_data: UserUpdate, db: AsyncSession = Depends(get_db),
+                      current_user: UserPrincipal = Depends(get_current_user)):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to update this user")
+
+    username = user_data.username
+    password = user_data.password  # Accept plain password for hashing
 
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    # Hash before touching the database so no connection is held during bcrypt
+    if password:
+        await db.rollback()  # Hand back the connection auth may have used
+        hashed_password = await hash_password_async(password)
+    else:
+        hashed_password = None
+
+    result = await db.execute(select(models.User).where(models.User.id == user_id))
+    user = result.scalar_one_or_none()
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
     if username:
         user.username = username
-    if password:
-        user.hashed_password = hash_password(password)  # Hash the new password
-
-    db.commit()
-    db.refresh(user)
+    if hashed_password:
+        user.hashed_password = hashed_password  # Store the new password hash
+    if username or hashed_password:
+        # Revoke every token issued before the change
+        user.token_version = models.User.token_version + 1
+
+    await db.commit()
+    auth.token_cache.invalidate_user(user_id)
+    await db.refresh(user)
+    auth.token_versions.set(user_id, user.token_version)
     return user
 
 """
@@ -156,16 +219,21 @@ user from the database by their ID.
 returns: A message indicating the result.
 ***********************************************
 """
-@router.delete("/users/me")
-def delete_user(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.delete("/users/me", response_model=Message)
+async def delete_user(current_user: UserPrincipal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     # Fetch the current user from the database
-    user = db.query(models.User).filter(models.User.id == current_user.id).first()
+    result = await db.execute(select(models.User.id).where(models.User.id == current_user.id))
 
-    if user is None:
+    if result.first() is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Delete the user
-    db.delete(user)
-    db.commit()
+    # Delete the user's tasks and then the user with set-based deletes
+    # so the ORM cascade does not have to load every task first
+    await db.execute(delete(models.Task).where(models.Task.owner_id == current_user.id))
+    await db.execute(delete(models.User).where(models.User.id == current_user.id))
+    await db.commit()
+    auth.token_cache.invalidate_user(current_user.id)
+    auth.token_versions.invalidate_user(current_user.id)
+    search.task_index.forget(current_user.id)
 
     return {"detail": "Your account has been deleted"}
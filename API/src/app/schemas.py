@@ -0,0 +1,253 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: schemas.py
+
+Description: File that contains the Pydantic
+request and response models used by the API.
+Response models only list the fields that are
+safe to send back, so hashed passwords and other
+internal columns never leave the API.
+***********************************************
+"""
+from datetime import datetime, timezone
+from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+# Task priorities run from 0 (none) to MAX_PRIORITY (highest)
+MAX_PRIORITY = 3
+
+
+"""
+***********************************************
+Method: to_utc()
+
+Description: This method is used to store due
+dates as naive UTC, since DATETIME columns keep no
+time zone. Naive values are taken to be UTC.
+
+Parameters:
+- value (Optional[datetime]): The sent date.
+
+returns: The naive UTC datetime, or None.
+***********************************************
+"""
+def to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+"""
+***********************************************
+Class: TaskCreate(BaseModel)
+
+Description: Body of a request that creates a task.
+***********************************************
+"""
+class TaskCreate(BaseModel):
+    title: str = Field(min_length=1, max_length=100)
+    description: Optional[str] = Field(None, max_length=255)
+    completed: bool = False
+    due_at: Optional[datetime] = None
+    priority: int = Field(0, ge=0, le=MAX_PRIORITY)
+
+    @field_validator("due_at")
+    @classmethod
+    def due_at_utc(cls, value):
+        return to_utc(value)
+
+"""
+***********************************************
+Class: TaskUpdate(BaseModel)
+
+Description: Body of a request that updates a
+task. Fields that are left out are not changed.
+Fields that are sent are stored as given, so an
+empty string (or null for the description and due
+date) clears them. Title, completed and priority cannot be
+null. The position is changed by moving the task.
+***********************************************
+"""
+class TaskUpdate(BaseModel):
+    title: Optional[str] = Field(None, max_length=100)
+    description: Optional[str] = Field(None, max_length=255)
+    completed: Optional[bool] = None
+    due_at: Optional[datetime] = None
+    priority: Optional[int] = Field(None, ge=0, le=MAX_PRIORITY)
+
+    @field_validator("title", "completed", "priority")
+    @classmethod
+    def not_null(cls, value):
+        # Only runs for fields that were sent; left out fields keep their default
+        if value is None:
+            raise ValueError("may not be null")
+        return value
+
+    @field_validator("due_at")
+    @classmethod
+    def due_at_utc(cls, value):
+        return to_utc(value)
+
+    """
+    ***********************************************
+    Method: changes()
+
+    Description: This method is used to get the
+    fields the client actually sent.
+
+    returns: A dictionary of column -> new value.
+    ***********************************************
+    """
+    def changes(self) -> dict:
+        return self.model_dump(include=self.model_fields_set & TaskUpdate.model_fields.keys())
+
+"""
+***********************************************
+Class: BulkTaskUpdate(TaskUpdate)
+
+Description: One item of a bulk task update.
+***********************************************
+"""
+class BulkTaskUpdate(TaskUpdate):
+    id: int
+
+"""
+***********************************************
+Class: TaskOut(BaseModel)
+
+Description: A task as returned by the API.
+***********************************************
+"""
+class TaskOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: str
+    description: Optional[str] = None
+    completed: bool
+    number: Optional[int] = None
+    owner_id: int
+    due_at: Optional[datetime] = None
+    priority: int = 0
+    position: float = 0
+
+"""
+***********************************************
+Class: TaskMove(BaseModel)
+
+Description: Body of a request that moves a task
+in the user's own order: it is put right after
+after_id, or first when after_id is null.
+***********************************************
+"""
+class TaskMove(BaseModel):
+    after_id: Optional[int] = None
+
+"""
+***********************************************
+Class: TaskSummary(BaseModel)
+
+Description: How many tasks a user has and how
+many of them are done.
+***********************************************
+"""
+class TaskSummary(BaseModel):
+    total: int
+    completed: int
+    open: int
+
+"""
+***********************************************
+Class: BulkItemResult(BaseModel)
+
+Description: The outcome of one item sent to a
+bulk endpoint. status is one of created, updated,
+deleted, not_found or invalid.
+***********************************************
+"""
+class BulkItemResult(BaseModel):
+    index: int
+    status: str
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+"""
+***********************************************
+Class: UserCreate(BaseModel)
+
+Description: Body of a request that registers a user.
+***********************************************
+"""
+class UserCreate(BaseModel):
+    username: str = Field(max_length=50)
+    password: str
+
+"""
+***********************************************
+Class: UserUpdate(BaseModel)
+
+Description: Body of a request that updates a
+user. Fields that are left out are not changed.
+***********************************************
+"""
+class UserUpdate(BaseModel):
+    username: Optional[str] = Field(None, max_length=50)
+    password: Optional[str] = None
+
+"""
+***********************************************
+Class: UserOut(BaseModel)
+
+Description: A user as returned by the API.
+***********************************************
+"""
+class UserOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str
+
+"""
+***********************************************
+Class: Token(BaseModel)
+
+Description: The access and refresh tokens
+returned after login.
+***********************************************
+"""
+class Token(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str
+
+"""
+***********************************************
+Class: TokenRefresh(BaseModel)
+
+Description: Request body of /token/refresh.
+***********************************************
+"""
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
+"""
+***********************************************
+Class: UserCreated(Token)
+
+Description: Response of a successful registration.
+***********************************************
+"""
+class UserCreated(Token):
+    message: str
+
+"""
+***********************************************
+Class: Message(BaseModel)
+
+Description: A plain status message.
+***********************************************
+"""
+class Message(BaseModel):
+    detail: str
@@ -0,0 +1,517 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: search.py
+
+Description: Full-text search over a user's task
+titles and descriptions for GET /tasks/search.
+
+On MySQL the search uses the FULLTEXT indexes from
+migrations 0003 and 0008 (MATCH ... AGAINST in
+boolean mode, with every word treated as a
+prefix). InnoDB leaves stopwords and words shorter
+than innodb_ft_min_token_size out of the index, so
+such query words are matched with a REGEXP on the
+rows the other words found instead. Other
+databases such as SQLite in tests fall back to an
+in-process inverted index per user. It is built
+on the first search and kept current by the task
+write routes (record_write). It is checked against
+the user's tasks_version on every search, so
+writes made through other workers force a rebuild
+instead of returning stale results. Set
+SEARCH_BACKEND to "fulltext" or "memory" to force
+one backend.
+
+Both backends require every query word to match
+(as a word or a word prefix) and rank title
+matches above description matches: the in-process
+index weights title hits by TITLE_WEIGHT, MySQL
+orders by the title-only FULLTEXT score first.
+***********************************************
+"""
+import asyncio
+import heapq
+import math
+import os
+import re
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import desc, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from Database.src import models
+
+# "auto" uses FULLTEXT on MySQL and the in-process index elsewhere
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto").lower()
+
+# Users whose in-process index is kept in memory (least recently searched go first)
+SEARCH_INDEX_MAX_OWNERS = int(os.getenv("SEARCH_INDEX_MAX_OWNERS", "256"))
+
+# Words and word prefixes used from a query
+MAX_QUERY_TERMS = 8
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Title hits count double; a prefix hit counts a bit less than a whole word
+TITLE_WEIGHT = 2.0
+PREFIX_WEIGHT = 0.7
+
+# Words InnoDB leaves out of FULLTEXT indexes: shorter than the server's
+# innodb_ft_min_token_size, or in its default stopword list
+# (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD). Match the server's settings.
+FULLTEXT_MIN_TOKEN_SIZE = int(os.getenv("SEARCH_FULLTEXT_MIN_TOKEN_SIZE", "3"))
+FULLTEXT_STOPWORDS = frozenset((
+    "a about an are as at be by com de en for from how i in is it la of on or "
+    "that the this to was what when where who will with und www"
+).split())
+
+
+"""
+***********************************************
+Method: tokenize()
+
+Description: This method is used to split text
+into lower case words.
+
+Parameters:
+- value (Optional[str]): The text to split.
+
+returns: A list of words.
+***********************************************
+"""
+def tokenize(value: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(value.lower()) if value else []
+
+
+"""
+***********************************************
+Method: query_terms()
+
+Description: This method is used to turn a search
+query into distinct words, keeping their order.
+
+Parameters:
+- query (str): The raw query text.
+
+returns: Up to MAX_QUERY_TERMS words.
+***********************************************
+"""
+def query_terms(query: str) -> List[str]:
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+"""
+***********************************************
+Class: OwnerIndex
+
+Description: Inverted index over one user's tasks.
+Postings map each word to the task ids that use
+it, kept separately for titles and descriptions.
+A sorted vocabulary makes prefix lookups a binary
+search. Each task's words are stored as well, so
+a task can be changed or removed without a
+rebuild.
+***********************************************
+"""
+class OwnerIndex:
+    def __init__(self, version: int):
+        self.version = version
+        self.title_postings: Dict[str, set] = {}
+        self.description_postings: Dict[str, set] = {}
+        self.docs: Dict[int, Tuple[frozenset, frozenset]] = {}
+        self.vocabulary: List[str] = []
+        # Sorted once after the initial load, then kept sorted word by word
+        self._vocabulary_dirty = True
+
+    def _post(self, postings: dict, words: Iterable[str], task_id: int):
+        for word in words:
+            ids = postings.get(word)
+            if ids is None:
+                if not self._vocabulary_dirty and word not in self.title_postings and word not in self.description_postings:
+                    insort(self.vocabulary, word)
+                ids = postings[word] = set()
+            ids.add(task_id)
+
+    def _unpost(self, postings: dict, words: Iterable[str], task_id: int):
+        # Words left without tasks stay in the vocabulary; expand() skips them
+        for word in words:
+            ids = postings.get(word)
+            if ids is not None:
+                ids.discard(task_id)
+                if not ids:
+                    del postings[word]
+
+    """
+    ***********************************************
+    Method: put()
+
+    Description: This method is used to add a task,
+    or replace the words of one already indexed.
+
+    Parameters:
+    - task_id (int): The id of the task.
+    - title (Optional[str]): The new title, or None
+      to keep the indexed one.
+    - description (Optional[str]): The new
+      description, or None to keep the indexed one.
+
+    returns: N/A
+    ***********************************************
+    """
+    def put(self, task_id: int, title: Optional[str] = None, description: Optional[str] = None):
+        old_title, old_description = self.docs.get(task_id, (frozenset(), frozenset()))
+        new_title = frozenset(tokenize(title)) if title is not None else old_title
+        new_description = frozenset(tokenize(description)) if description is not None else old_description
+        self._unpost(self.title_postings, old_title - new_title, task_id)
+        self._unpost(self.description_postings, old_description - new_description, task_id)
+        self._post(self.title_postings, new_title - old_title, task_id)
+        self._post(self.description_postings, new_description - old_description, task_id)
+        self.docs[task_id] = (new_title, new_description)
+
+    """
+    ***********************************************
+    Method: remove()
+
+    Description: This method is used to drop a task
+    from the index.
+
+    Parameters:
+    - task_id (int): The id of the task.
+
+    returns: N/A
+    ***********************************************
+    """
+    def remove(self, task_id: int):
+        words = self.docs.pop(task_id, None)
+        if words is not None:
+            self._unpost(self.title_postings, words[0], task_id)
+            self._unpost(self.description_postings, words[1], task_id)
+
+    """
+    ***********************************************
+    Method: expand()
+
+    Description: This method is used to find every
+    indexed word that starts with a query word.
+
+    Parameters:
+    - term (str): The query word.
+
+    returns: A list of matching words.
+    ***********************************************
+    """
+    def expand(self, term: str) -> List[str]:
+        if self._vocabulary_dirty:
+            self.vocabulary = sorted(self.title_postings.keys() | self.description_postings.keys())
+            self._vocabulary_dirty = False
+        words = []
+        for position in range(bisect_left(self.vocabulary, term), len(self.vocabulary)):
+            word = self.vocabulary[position]
+            if not word.startswith(term):
+                break
+            if word in self.title_postings or word in self.description_postings:
+                words.append(word)
+        return words
+
+    """
+    ***********************************************
+    Method: search()
+
+    Description: This method is used to rank the
+    tasks that match every query word. Candidates
+    come from intersecting the matches of each
+    word, starting with the rarest, so only those
+    tasks are scored.
+
+    Parameters:
+    - terms (list): Query words from query_terms().
+    - limit (int): Page size.
+    - offset (int): Results to skip.
+
+    returns: The page of task ids, best first, and
+    whether more results follow.
+    ***********************************************
+    """
+    def search(self, terms: List[str], limit: int, offset: int) -> Tuple[List[int], bool]:
+        matches = []
+        for term in terms:
+            words = self.expand(term)
+            ids = set()
+            for word in words:
+                ids.update(self.title_postings.get(word, ()))
+                ids.update(self.description_postings.get(word, ()))
+            if not ids:
+                return [], False
+            matches.append((words, ids, term))
+
+        matches.sort(key=lambda match: len(match[1]))
+        candidates = set(matches[0][1])
+        for _, ids, _ in matches[1:]:
+            candidates &= ids
+            if not candidates:
+                return [], False
+
+        # Rarer query words weigh more (inverse document frequency)
+        total = len(self.docs) or 1
+        scores = dict.fromkeys(candidates, 0.0)
+        for words, ids, term in matches:
+            idf = math.log(1 + total / len(ids))
+            for word in words:
+                weight = idf if word == term else idf * PREFIX_WEIGHT
+                for task_id in self.title_postings.get(word, set()) & candidates:
+                    scores[task_id] += weight * TITLE_WEIGHT
+                for task_id in self.description_postings.get(word, set()) & candidates:
+                    scores[task_id] += weight
+
+        # Best score first; ties go to the oldest task
+        ranked = heapq.nsmallest(offset + limit + 1, scores, key=lambda task_id: (-scores[task_id], task_id))
+        page = ranked[offset:offset + limit]
+        return page, len(ranked) > offset + limit
+
+
+"""
+***********************************************
+Class: TaskSearchIndex
+
+Description: The in-process indexes of one
+worker, one OwnerIndex per recently searched
+user.
+***********************************************
+"""
+class TaskSearchIndex:
+    def __init__(self, max_owners: int = SEARCH_INDEX_MAX_OWNERS):
+        self.max_owners = max_owners
+        self._owners: "OrderedDict[int, OwnerIndex]" = OrderedDict()
+        self._build_locks: Dict[int, asyncio.Lock] = {}
+
+    """
+    ***********************************************
+    Method: get()
+
+    Description: This method is used to fetch the
+    user's index for a tasks_version, building it
+    from the database when it is missing or stale.
+
+    Parameters:
+    - db (AsyncSession): The database session.
+    - owner_id (int): The id of the user.
+    - version (int): The user's current tasks_version.
+
+    returns: An OwnerIndex.
+    ***********************************************
+    """
+    async def get(self, db: AsyncSession, owner_id: int, version: int) -> OwnerIndex:
+        index = self._owners.get(owner_id)
+        if index is not None and index.version == version:
+            self._owners.move_to_end(owner_id)
+            return index
+
+        lock = self._build_locks.setdefault(owner_id, asyncio.Lock())
+        async with lock:
+            index = self._owners.get(owner_id)
+            if index is None or index.version != version:
+                # The version was read before these rows, so the index can
+                # only be newer than its version, never older
+                index = OwnerIndex(version)
+                result = await db.execute(
+                    select(models.Task.id, models.Task.title, models.Task.description)
+                    .where(models.Task.owner_id == owner_id)
+                )
+                for task_id, title, description in result:
+                    index.put(task_id, title, description or "")
+                self._owners[owner_id] = index
+            self._owners.move_to_end(owner_id)
+            while len(self._owners) > self.max_owners:
+                evicted, _ = self._owners.popitem(last=False)
+                self._build_locks.pop(evicted, None)
+        return index
+
+    """
+    ***********************************************
+    Method: record_write()
+
+    Description: This method is used by the task
+    write routes, after they commit, to apply their
+    change to the user's index. A change is only
+    applied on top of the version just before it.
+    If this worker missed a change in between, the
+    index is dropped and rebuilt on the next search.
+
+    Parameters:
+    - owner_id (int): The id of the user.
+    - version (int): The tasks_version the write produced.
+    - created (Iterable[dict]): New tasks (id, title, description).
+    - updated (Iterable[tuple]): (task ids, changed fields) pairs.
+    - deleted (Iterable[int]): Ids of removed tasks.
+
+    returns: N/A
+    ***********************************************
+    """
+    def record_write(self, owner_id: int, version: int, created: Iterable[dict] = (),
+                     updated: Iterable[tuple] = (), deleted: Iterable[int] = ()):
+        index = self._owners.get(owner_id)
+        if index is None:
+            return
+        if index.version != version - 1:
+            del self._owners[owner_id]
+            return
+        for task in created:
+            index.put(task["id"], task["title"], task.get("description") or "")
+        for task_ids, changes in updated:
+            if "title" in changes or "description" in changes:
+                # A description set to null is cleared, not left as it was
+                title = changes.get("title")
+                description = (changes["description"] or "") if "description" in changes else None
+                for task_id in task_ids:
+                    index.put(task_id, title, description)
+        for task_id in deleted:
+            index.remove(task_id)
+        index.version = version
+
+    """
+    ***********************************************
+    Method: forget()
+
+    Description: This method is used to drop a
+    user's index, e.g. when the account is deleted.
+
+    Parameters:
+    - owner_id (int): The id of the user.
+
+    returns: N/A
+    ***********************************************
+    """
+    def forget(self, owner_id: int):
+        self._owners.pop(owner_id, None)
+        self._build_locks.pop(owner_id, None)
+
+task_index = TaskSearchIndex()
+
+
+"""
+***********************************************
+Method: uses_fulltext()
+
+Description: This method is used to pick the
+search backend for a database.
+
+Parameters:
+- db (AsyncSession): The database session.
+
+returns: True to use the MySQL FULLTEXT index.
+***********************************************
+"""
+def uses_fulltext(db: AsyncSession) -> bool:
+    if SEARCH_BACKEND in ("fulltext", "memory"):
+        return SEARCH_BACKEND == "fulltext"
+    return db.get_bind().dialect.name == "mysql"
+
+
+"""
+***********************************************
+Method: fulltext_indexed()
+
+Description: This method is used to check whether
+InnoDB indexes a word, i.e. whether MATCH can find
+it.
+
+Parameters:
+- term (str): A query word.
+
+returns: True if FULLTEXT can search for it.
+***********************************************
+"""
+def fulltext_indexed(term: str) -> bool:
+    return len(term) >= FULLTEXT_MIN_TOKEN_SIZE and term not in FULLTEXT_STOPWORDS
+
+
+"""
+***********************************************
+Method: fulltext_query()
+
+Description: This method is used to build the
+MySQL FULLTEXT search for one page of results.
+Every indexed word is required (+) and matches as
+a prefix (*). Words InnoDB does not index are
+required to start a word of the title or the
+description (REGEXP), checked on the rows the
+indexed words found. Results are ordered by the
+title-only score, then the title and description
+score. The words only contain letters, digits and
+underscores, so they cannot inject boolean search
+or regular expression operators.
+
+Parameters:
+- owner_id (int): The id of the user.
+- terms (list): Query words from query_terms().
+- columns (tuple): The columns to select.
+- limit (int): Rows to fetch.
+- offset (int): Rows to skip.
+
+returns: A select statement ordered by relevance.
+***********************************************
+"""
+def fulltext_query(owner_id: int, terms: List[str], columns: tuple, limit: int, offset: int):
+    indexed = [term for term in terms if fulltext_indexed(term)]
+    unindexed = [rf"\b{term}" for term in terms if not fulltext_indexed(term)]
+    query = select(*columns).where(models.Task.owner_id == owner_id)
+    order = []
+    if indexed:
+        match = text("MATCH (tasks.title, tasks.description) AGAINST (:terms IN BOOLEAN MODE)").bindparams(
+            terms=" ".join(f"+{term}*" for term in indexed)
+        )
+        title_match = text("MATCH (tasks.title) AGAINST (:title_terms IN BOOLEAN MODE)").bindparams(
+            title_terms=" ".join(f"{term}*" for term in indexed)
+        )
+        query = query.where(match)
+        order = [desc(title_match), desc(match)]
+    for pattern in unindexed:
+        query = query.where(or_(models.Task.title.regexp_match(pattern), models.Task.description.regexp_match(pattern)))
+    if not indexed:
+        order = [desc(models.Task.title.regexp_match(pattern)) for pattern in unindexed]
+    return query.order_by(*order, models.Task.id).limit(limit).offset(offset)
+
+
+"""
+***********************************************
+Method: search_tasks()
+
+Description: This method is used to find one page
+of a user's tasks that match a query, best match
+first.
+
+Parameters:
+- db (AsyncSession): The database session.
+- owner_id (int): The id of the user.
+- version (int): The user's current tasks_version.
+- query (str): The search text.
+- columns (tuple): The task columns to return.
+- limit (int): Page size.
+- offset (int): Results to skip.
+
+returns: The matching rows as dictionaries, and
+whether more results follow.
+***********************************************
+"""
+async def search_tasks(db: AsyncSession, owner_id: int, version: int, query: str,
+                       columns: tuple, limit: int, offset: int) -> Tuple[List[dict], bool]:
+    terms = query_terms(query)
+    if not terms:
+        return [], False
+
+    if uses_fulltext(db):
+        result = await db.execute(fulltext_query(owner_id, terms, columns, limit + 1, offset))
+        rows = [row._asdict() for row in result]
+        return rows[:limit], len(rows) > limit
+
+    index = await task_index.get(db, owner_id, version)
+    task_ids, has_more = index.search(terms, limit, offset)
+    if not task_ids:
+        return [], has_more
+    result = await db.execute(
+        select(*columns).where(models.Task.owner_id == owner_id, models.Task.id.in_(task_ids))
+    )
+    rows = {row.id: row._asdict() for row in result}
+    return [rows[task_id] for task_id in task_ids if task_id in rows], has_more
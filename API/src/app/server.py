@@ -0,0 +1,162 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: server.py
+
+Description: Production entry point for the API.
+It runs several uvicorn worker processes (one per
+CPU by default), each with its own event loop and
+connection pool. It uses uvloop and httptools when
+they are installed. Each worker is recycled after
+a set number of requests. On shutdown in-flight
+requests are drained before exiting. Use
+`uvicorn ... --reload` for local development
+instead.
+
+Usage (from the API directory, as in the container):
+    python -m src.app.server
+***********************************************
+"""
+import logging
+import os
+import uvicorn
+from Database.src.settings import load_environment
+
+logger = logging.getLogger(__name__)
+
+
+"""
+***********************************************
+Method: env_int()
+
+Description: This method is used to read an
+integer setting from the environment.
+
+Parameters:
+- name (str): The variable name.
+- default (int): Value used when it is not set.
+
+returns: The integer value.
+***********************************************
+"""
+def env_int(name: str, default: int) -> int:
+    value = os.getenv(name, "").strip()
+    return int(value) if value else default
+
+
+"""
+***********************************************
+Method: worker_pool_size()
+
+Description: This method is used to split a cap
+on total database connections between the
+workers. Each worker gets an equal share. Its
+pool size and overflow are trimmed to fit that
+share, so workers × (pool size + overflow) never
+goes over the cap.
+
+Parameters:
+- workers (int): Number of worker processes.
+- max_connections (int): Total connection cap.
+- pool_size (int): The configured pool size.
+- max_overflow (int): The configured overflow.
+
+returns: The (pool_size, max_overflow) for each worker.
+***********************************************
+"""
+def worker_pool_size(workers: int, max_connections: int, pool_size: int, max_overflow: int) -> tuple:
+    share = max_connections // workers
+    if share < 1:
+        raise ValueError(
+            f"DB_MAX_CONNECTIONS={max_connections} is too low for {workers} workers"
+        )
+    pool_size = min(pool_size, share)
+    max_overflow = min(max_overflow, share - pool_size)
+    return pool_size, max_overflow
+
+
+"""
+***********************************************
+Method: server_config()
+
+Description: This method is used to build the
+uvicorn settings from the environment.
+
+Environment:
+- API_HOST / API_PORT: Address to listen on.
+- WEB_CONCURRENCY: Worker processes (default: CPU count).
+- WORKER_MAX_REQUESTS: Requests before a worker is
+  replaced (0 turns recycling off).
+- GRACEFUL_TIMEOUT: Seconds to drain requests on shutdown.
+- KEEPALIVE_TIMEOUT: Seconds an idle keep-alive
+  connection stays open.
+- DB_MAX_CONNECTIONS: Cap on database connections
+  across all workers.
+- LOG_LEVEL / ACCESS_LOG: uvicorn logging.
+
+returns: A dictionary of keyword arguments for
+uvicorn.run().
+***********************************************
+"""
+def server_config() -> dict:
+    load_environment()
+    workers = max(1, env_int("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+    max_connections = env_int("DB_MAX_CONNECTIONS", 0)
+    if max_connections:
+        pool_size, max_overflow = worker_pool_size(
+            workers, max_connections, env_int("DB_POOL_SIZE", 5), env_int("DB_MAX_OVERFLOW", 10)
+        )
+        # Workers are separate processes that read the pool settings when
+        # they build their engines, so pass the sizes down this way
+        os.environ["DB_POOL_SIZE"] = str(pool_size)
+        os.environ["DB_MAX_OVERFLOW"] = str(max_overflow)
+
+    max_requests = env_int("WORKER_MAX_REQUESTS", 10_000)
+    return {
+        # Each worker builds its own app (and engines) with create_app()
+        "app": f"{__package__}.main:create_app",
+        "factory": True,
+        "host": os.getenv("API_HOST", "0.0.0.0"),
+        "port": env_int("API_PORT", 8000),
+        "workers": workers,
+        "loop": "auto",  # uvloop if installed
+        "http": "auto",  # httptools if installed
+        "limit_max_requests": max_requests or None,
+        "timeout_graceful_shutdown": env_int("GRACEFUL_TIMEOUT", 30),
+        "timeout_keep_alive": env_int("KEEPALIVE_TIMEOUT", 5),
+        "proxy_headers": True,
+        "log_level": os.getenv("LOG_LEVEL", "info").lower(),
+        "access_log": os.getenv("ACCESS_LOG", "false").lower() in ("1", "true", "yes", "on"),
+    }
+
+
+"""
+***********************************************
+Method: main()
+
+Description: This method is used to start the
+workers with the settings from server_config().
+
+returns: N/A
+***********************************************
+"""
+def main():
+    logging.basicConfig(level=logging.INFO)
+    config = server_config()
+    if config["workers"] > 1 and not os.getenv("EVENT_BROKER_URL"):
+        logger.warning(
+            "Running %d workers without EVENT_BROKER_URL: /tasks/stream only sees "
+            "changes made through the same worker", config["workers"]
+        )
+    logger.info(
+        "Starting %d workers on %s:%d (pool size %s, overflow %s per worker)",
+        config["workers"], config["host"], config["port"],
+        os.getenv("DB_POOL_SIZE", "5"), os.getenv("DB_MAX_OVERFLOW", "10"),
+    )
+    uvicorn.run(**config)
+
+
+if __name__ == "__main__":
+    main()
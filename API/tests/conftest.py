@@ -0,0 +1,51 @@
+"""
+***********************************************
+File: conftest.py
+
+Description: Shared test setup. When no database
+is configured in the environment the tests run
+against a throwaway SQLite file so they do not
+need the MySQL container. It also holds the
+helpers the test modules share, which they import
+with "from conftest import ...".
+***********************************************
+"""
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+_test_db_path = os.path.join(tempfile.mkdtemp(prefix="tdl-tests-"), "test.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_test_db_path}")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key")
+# Tests sign up many users from one client; test_ratelimit.py turns it on
+os.environ.setdefault("RATE_LIMIT", "false")
+
+from Database.src import database, migrate
+
+# Build the test schema the same way production does
+migrate.upgrade(database.engine)
+
+from fastapi.testclient import TestClient
+from API.src.app.main import tdlapp
+
+client = TestClient(tdlapp)
+
+"""
+***********************************************
+Method: auth_headers()
+
+Description: Helper that registers a user, logs
+in and returns the Authorization header for them.
+
+Returns: A headers dictionary with a bearer token.
+***********************************************
+"""
+def auth_headers(username, password="testpass"):
+    client.post("/users/", json={"username": username, "password": password})
+    login = client.post(
+        "/login",
+        data={"username": username, "password": password},
+        headers={"Content-Type": "application/x-www-form-urlencoded"}
+    )
+    return {"Authorization": f"Bearer {login.json()['access_token']}"}
@@ -0,0 +1,317 @@
+import time
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+from API.src.app.main import tdlapp
+from API.src.app import auth
+from API.src.app.auth import TokenCache, TokenVersionCache, UserPrincipal
+from Database.src import database
+
+client = TestClient(tdlapp)
+
+"""
+***********************************************
+Method: test_token_cache_ttl_and_size()
+
+Description: This method tests that the token cache
+drops entries once their TTL passes and evicts the
+least recently used entry when it is full.
+
+Returns: None. Asserts hits and misses.
+***********************************************
+"""
+def test_token_cache_ttl_and_size():
+    cache = TokenCache(ttl_seconds=0.05, max_size=2)
+    cache.set("a", UserPrincipal(1, "a"))
+    cache.set("b", UserPrincipal(2, "b"))
+    assert cache.get("a") == UserPrincipal(1, "a")
+    cache.set("c", UserPrincipal(3, "c"))
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+    # Never cache past the token's own expiry
+    cache.set("expired", UserPrincipal(4, "d"), token_exp=time.time() - 1)
+    assert cache.get("expired") is None
+
+"""
+***********************************************
+Method: test_token_cache_invalidate_user()
+
+Description: This method tests that invalidating a
+user removes every token cached for them and
+leaves other users alone.
+
+Returns: None. Asserts only the other user remains.
+***********************************************
+"""
+def test_token_cache_invalidate_user():
+    cache = TokenCache(ttl_seconds=60, max_size=10)
+    cache.set("t1", UserPrincipal(1, "a"))
+    cache.set("t2", UserPrincipal(1, "a"))
+    cache.set("t3", UserPrincipal(2, "b"))
+    cache.invalidate_user(1)
+    assert cache.get("t1") is None and cache.get("t2") is None
+    assert cache.get("t3") == UserPrincipal(2, "b")
+
+"""
+***********************************************
+Method: test_cached_token_skips_user_lookup()
+
+Description: This method tests that once a token
+has been verified, later requests with it do not
+query the users table, and that deleting the
+account stops the token from working.
+
+Returns: None. Asserts the query count and a 404
+after the account is deleted.
+***********************************************
+"""
+def test_cached_token_skips_user_lookup():
+    created = client.post("/users/", json={"username": "cacheuser", "password": "cachepass"})
+    headers = {"Authorization": f"Bearer {created.json()['access_token']}"}
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(database.async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        for _ in range(3):
+            assert client.get("/users/me", headers=headers).status_code == 200
+    finally:
+        event.remove(database.async_engine.sync_engine, "before_cursor_execute", record)
+    assert not [s for s in statements if "FROM users" in s]
+
+    assert client.delete("/users/me", headers=headers).status_code == 200
+    assert client.get("/users/me", headers=headers).status_code == 404
+
+def user_queries(func):
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(database.async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        func()
+    finally:
+        event.remove(database.async_engine.sync_engine, "before_cursor_execute", record)
+    return [s for s in statements if "FROM users" in s]
+
+"""
+***********************************************
+Method: test_token_version_cache_ttl()
+
+Description: This method tests that a cached token
+version is trusted until its TTL passes and that
+the least recently used user is evicted first.
+
+Returns: None. Asserts hits and misses.
+***********************************************
+"""
+def test_token_version_cache_ttl():
+    now = [100.0]
+    cache = TokenVersionCache(ttl_seconds=30, max_size=2, clock=lambda: now[0])
+    cache.set(1, 0)
+    cache.set(2, 3)
+    assert cache.get(1) == 0
+    cache.set(3, 1)
+    assert cache.get(2) is None and len(cache) == 2
+    now[0] += 30
+    assert cache.get(1) is None and cache.get(3) is None
+
+"""
+***********************************************
+Method: test_auth_settings_read_on_first_use()
+
+Description: This method tests that the auth
+settings come from the environment when they are
+first used rather than when auth.py is imported.
+
+Returns: None. Asserts the access token lifetime.
+***********************************************
+"""
+def test_auth_settings_read_on_first_use(monkeypatch):
+    import time
+    monkeypatch.setenv("ACCESS_TOKEN_EXPIRE_MINUTES", "5")
+    auth.get_auth_settings.cache_clear()
+    try:
+        assert auth.get_auth_settings().access_token_expire_minutes == 5
+        claims = auth.decode_access_token(auth.create_access_token({"sub": "lazysettings"}))
+        assert claims["exp"] - time.time() <= 5 * 60
+    finally:
+        auth.get_auth_settings.cache_clear()
+
+"""
+***********************************************
+Method: test_token_claims_skip_user_lookup()
+
+Description: This method tests that a token that
+carries the user id and token version is accepted
+without querying the users table, even when it is
+not in the token cache, and that tokens from
+before token versions still work.
+
+Returns: None. Asserts the query count.
+***********************************************
+"""
+def test_token_claims_skip_user_lookup():
+    created = client.post("/users/", json={"username": "claimsuser", "password": "claimspass"}).json()
+    headers = {"Authorization": f"Bearer {created['access_token']}"}
+    claims = auth.decode_access_token(created["access_token"])
+    assert claims["type"] == "access" and claims["ver"] == 0
+
+    def read_profile():
+        auth.token_cache.clear()
+        assert client.get("/users/me", headers=headers).json()["id"] == claims["uid"]
+    assert user_queries(read_profile) == []
+
+    legacy = auth.create_access_token({"sub": "claimsuser"})
+    response = client.get("/users/me", headers={"Authorization": f"Bearer {legacy}"})
+    assert response.json()["id"] == claims["uid"]
+
+"""
+***********************************************
+Method: test_refresh_token()
+
+Description: This method tests that /token/refresh
+trades a refresh token for a working token pair,
+and that access and refresh tokens cannot be used
+in place of each other.
+
+Returns: None. Asserts the status codes.
+***********************************************
+"""
+def test_refresh_token():
+    created = client.post("/users/", json={"username": "refreshuser", "password": "refreshpass"}).json()
+    refreshed = client.post("/token/refresh", json={"refresh_token": created["refresh_token"]})
+    assert refreshed.status_code == 200
+    headers = {"Authorization": f"Bearer {refreshed.json()['access_token']}"}
+    assert client.get("/users/me", headers=headers).json()["username"] == "refreshuser"
+
+    assert client.post("/token/refresh", json={"refresh_token": created["access_token"]}).status_code == 401
+    wrong = {"Authorization": f"Bearer {created['refresh_token']}"}
+    assert client.get("/users/me", headers=wrong).status_code == 401
+
+"""
+***********************************************
+Method: test_password_change_revokes_tokens()
+
+Description: This method tests that changing the
+password bumps the token version, so earlier
+access and refresh tokens stop working while new
+ones from /login do.
+
+Returns: None. Asserts the 401s and the new login.
+***********************************************
+"""
+def test_password_change_revokes_tokens():
+    created = client.post("/users/", json={"username": "revokeuser", "password": "revokepass"}).json()
+    headers = {"Authorization": f"Bearer {created['access_token']}"}
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+
+    assert client.put(f"/users/{user_id}", json={"password": "newrevokepass"}, headers=headers).status_code == 200
+    response = client.get("/users/me", headers=headers)
+    assert response.status_code == 401 and response.json()["detail"] == "Token has been revoked"
+    assert client.post("/token/refresh", json={"refresh_token": created["refresh_token"]}).status_code == 401
+
+    login = client.post("/login", data={"username": "revokeuser", "password": "newrevokepass"})
+    assert auth.decode_access_token(login.json()["access_token"])["ver"] == 1
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+"""
+***********************************************
+Method: test_only_the_user_can_update_themselves()
+
+Description: This method tests that PUT
+/users/{id} needs the user's own token, so no one
+else can rename them, change their password or
+revoke their sessions.
+
+Returns: None. Asserts the refusals and that the
+user's token still works.
+***********************************************
+"""
+def test_only_the_user_can_update_themselves():
+    victim = client.post("/users/", json={"username": "victimuser", "password": "victimpass"}).json()
+    headers = {"Authorization": f"Bearer {victim['access_token']}"}
+    victim_id = client.get("/users/me", headers=headers).json()["id"]
+    other = client.post("/users/", json={"username": "otheruser", "password": "otherpass"}).json()
+
+    change = {"username": "renamed", "password": "takenover"}
+    assert client.put(f"/users/{victim_id}", json=change).status_code == 401
+    forbidden = client.put(f"/users/{victim_id}", json=change,
+                           headers={"Authorization": f"Bearer {other['access_token']}"})
+    assert forbidden.status_code == 403
+
+    me = client.get("/users/me", headers=headers)
+    assert me.status_code == 200 and me.json()["username"] == "victimuser"
+    assert client.post("/token/refresh", json={"refresh_token": victim["refresh_token"]}).status_code == 200
+    assert client.post("/login", data={"username": "victimuser", "password": "victimpass"}).status_code == 200
+
+"""
+***********************************************
+Method: test_password_hash_pool_rejects_when_full()
+
+Description: This method tests that the password
+hash pool answers 503 once its pending limit is
+reached instead of queueing more bcrypt work.
+
+Returns: None. Asserts the 503 and that the first
+call still completes.
+***********************************************
+"""
+def test_password_hash_pool_rejects_when_full():
+    import asyncio
+    import threading
+    import pytest
+    from fastapi import HTTPException
+    from API.src.app.auth import PasswordHashPool
+
+    pool = PasswordHashPool(workers=1, max_pending=1)
+    release = threading.Event()
+
+    async def scenario():
+        first = asyncio.ensure_future(pool.run(release.wait, 5))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as error:
+            await pool.run(lambda: True)
+        release.set()
+        assert await first is True
+        return error.value
+
+    error = asyncio.run(scenario())
+    pool.shutdown()
+    assert error.status_code == 503
+    assert error.headers["Retry-After"] == "1"
+
+"""
+***********************************************
+Method: test_concurrent_signups_same_username()
+
+Description: This method tests that two signups
+for the same username at once, which both pass
+the duplicate check while bcrypt runs, end in one
+account and a 400 rather than a server error.
+
+Returns: None. Asserts the status codes.
+***********************************************
+"""
+def test_concurrent_signups_same_username():
+    import asyncio
+    import httpx
+
+    async def race():
+        transport = httpx.ASGITransport(app=tdlapp)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            responses = await asyncio.gather(*(
+                async_client.post("/users/", json={"username": "raceuser", "password": "racepass"})
+                for _ in range(2)
+            ))
+        # The pool's wait queue is tied to this event loop; start afresh for later tests
+        await database.async_engine.dispose()
+        return responses
+
+    responses = asyncio.run(race())
+    assert sorted(r.status_code for r in responses) == [200, 400]
+    assert [r.json()["detail"] for r in responses if r.status_code == 400] == ["Username already exists"]
@@ -0,0 +1,121 @@
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from API.src.app.compression import CompressionMiddleware, choose_encoding, parse_content_types
+from API.src.app.main import tdlapp
+from conftest import auth_headers
+
+client = TestClient(tdlapp)
+
+"""
+***********************************************
+Method: test_choose_encoding()
+
+Description: This method tests Accept-Encoding
+negotiation: q-values rule out encodings, and the
+server's order breaks ties.
+
+Returns: None. Asserts the chosen encodings.
+***********************************************
+"""
+def test_choose_encoding():
+    available = ["br", "zstd", "gzip"]
+    assert choose_encoding("gzip, deflate, br", available) == "br"
+    assert choose_encoding("gzip;q=1.0, br;q=0.5", available) == "gzip"
+    assert choose_encoding("br;q=0, *", available) == "zstd"
+    assert choose_encoding("identity", available) is None
+    assert choose_encoding("gzip;q=0", ["gzip"]) is None
+    assert choose_encoding("GZIP", ["gzip"]) == "gzip"
+    assert parse_content_types("application/json:512, text/plain", 1024) == {
+        "application/json": 512, "text/plain": 1024,
+    }
+
+"""
+***********************************************
+Method: test_task_list_is_compressed()
+
+Description: This method tests that a large task
+list is gzipped with a weak ETag that still
+revalidates, while small and identity responses
+are sent as they are.
+
+Returns: None. Asserts the headers and bodies.
+***********************************************
+"""
+def test_task_list_is_compressed():
+    headers = auth_headers("compressuser")
+    client.post("/tasks/bulk", json=[
+        {"title": f"Compressible task {i}", "description": "the same words again and again"} for i in range(100)
+    ], headers=headers)
+
+    plain = client.get("/tasks/", headers={**headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["vary"]
+
+    compressed = client.get("/tasks/", headers={**headers, "Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert int(compressed.headers["content-length"]) < len(plain.content) / 4
+    assert compressed.content == plain.content
+    assert compressed.headers["etag"] == "W/" + plain.headers["etag"]
+    assert compressed.headers["cache-control"] == "private, no-cache"
+
+    revalidated = client.get("/tasks/", headers={
+        **headers, "Accept-Encoding": "gzip", "If-None-Match": compressed.headers["etag"],
+    })
+    assert revalidated.status_code == 304
+
+    small = client.get("/tasks/?limit=1", headers={**headers, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+"""
+***********************************************
+Method: test_default_cache_control()
+
+Description: This method tests that responses
+without their own cache policy, such as tokens,
+are marked no-store.
+
+Returns: None. Asserts the Cache-Control headers.
+***********************************************
+"""
+def test_default_cache_control():
+    created = client.post("/users/", json={"username": "cacheuser", "password": "compresspass"})
+    assert created.headers["cache-control"] == "no-store"
+    headers = {"Authorization": f"Bearer {created.json()['access_token']}"}
+    assert client.get("/users/me", headers=headers).headers["cache-control"] == "no-store"
+
+"""
+***********************************************
+Method: test_thread_offload_and_streams()
+
+Description: This method tests that bodies above
+the thread threshold are still compressed, that
+per-type minimum sizes apply, and that streaming
+responses pass through untouched.
+
+Returns: None. Asserts the raw bodies.
+***********************************************
+"""
+def test_thread_offload_and_streams():
+    app = FastAPI()
+
+    @app.get("/text")
+    def text():
+        return PlainTextResponse("x" * 5000)
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"y" * 5000, b"z" * 5000]), media_type="text/plain")
+
+    app.add_middleware(
+        CompressionMiddleware, content_types="text/plain:100", min_size=10**9, thread_min_size=0,
+    )
+    test_client = TestClient(app)
+    response = test_client.get("/text", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < 100
+    assert response.content == b"x" * 5000
+
+    streamed = test_client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in streamed.headers
+    assert streamed.content == b"y" * 5000 + b"z" * 5000
@@ -0,0 +1,183 @@
+import asyncio
+from fastapi.testclient import TestClient
+from API.src.app.main import tdlapp
+from API.src.app import events
+from API.src.app.routes.tasks import task_event_stream
+
+client = TestClient(tdlapp)
+
+"""
+***********************************************
+Method: test_slow_subscriber_gets_resync()
+
+Description: This method tests that a subscriber
+whose queue fills up drops its backlog and gets a
+single resync event, so memory stays bounded.
+
+Returns: None. Asserts the queue contents.
+***********************************************
+"""
+def test_slow_subscriber_gets_resync():
+    subscriber = events.Subscriber(owner_id=1, queue_size=2)
+    for n in range(5):
+        subscriber.offer({"type": "created", "n": n})
+    assert subscriber.queue.qsize() == 1
+    assert asyncio.run(subscriber.next_event(0.1)) == {"type": "resync"}
+    subscriber.offer({"type": "deleted"})
+    assert asyncio.run(subscriber.next_event(0.1)) == {"type": "deleted"}
+
+"""
+***********************************************
+Method: test_broker_limits_and_fanout()
+
+Description: This method tests that the local
+broker only delivers a user's events to that
+user's subscribers and enforces its limits.
+
+Returns: None. Asserts deliveries and the limit.
+***********************************************
+"""
+def test_broker_limits_and_fanout():
+    broker = events.LocalBroker(max_subscribers=3, max_per_user=2)
+    first = broker.subscribe(1)
+    second = broker.subscribe(1)
+    other = broker.subscribe(2)
+    assert not broker.has_capacity(1)
+    try:
+        broker.subscribe(3)
+        assert False, "worker limit not enforced"
+    except events.SubscriberLimitReached:
+        pass
+
+    asyncio.run(broker.publish(1, {"type": "deleted", "task_ids": [5]}))
+    assert first.queue.qsize() == 1 and second.queue.qsize() == 1
+    assert other.queue.empty()
+
+    broker.unsubscribe(first)
+    broker.unsubscribe(first)
+    assert broker.count == 2 and broker.has_capacity(1)
+
+"""
+***********************************************
+Method: test_task_writes_publish_events()
+
+Description: This method tests that creating,
+updating and deleting tasks publishes matching
+events to the user's stream.
+
+Returns: None. Asserts the event types and payloads.
+***********************************************
+"""
+def test_task_writes_publish_events():
+    created = client.post("/users/", json={"username": "streamuser", "password": "streampass"})
+    headers = {"Authorization": f"Bearer {created.json()['access_token']}"}
+    owner_id = client.get("/users/me", headers=headers).json()["id"]
+    subscriber = events.broker.subscribe(owner_id)
+    try:
+        task = client.post("/tasks/", json={"title": "Streamed"}, headers=headers).json()
+        client.put(f"/tasks/{task['id']}", json={"completed": True}, headers=headers)
+        client.patch("/tasks/bulk", json=[{"id": task["id"], "title": "Bulk"}], headers=headers)
+        client.delete(f"/tasks/{task['id']}", headers=headers)
+        received = [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+    finally:
+        events.broker.unsubscribe(subscriber)
+
+    assert [e["type"] for e in received] == ["created", "updated", "updated", "deleted"]
+    assert received[0]["tasks"][0]["title"] == "Streamed"
+    assert received[1]["tasks"][0]["completed"] is True
+    assert received[2] == {"type": "updated", "task_ids": [task["id"]], "changes": {"title": "Bulk"}}
+    assert received[3]["task_ids"] == [task["id"]]
+
+"""
+***********************************************
+Method: test_task_event_stream_format()
+
+Description: This method tests the Server-Sent
+Events body of a task stream and that closing the
+stream releases its subscription.
+
+Returns: None. Asserts the encoded chunks.
+***********************************************
+"""
+def test_task_event_stream_format():
+    async def scenario():
+        stream = task_event_stream(events.broker.subscribe(424242))
+        assert (await stream.__anext__()).startswith(b"retry: 5000")
+        await events.broker.publish(424242, {"type": "deleted", "task_ids": [1]})
+        chunk = await stream.__anext__()
+        await stream.aclose()
+        return chunk
+
+    chunk = asyncio.run(scenario())
+    assert chunk == b'event: deleted\ndata: {"type":"deleted","task_ids":[1]}\n\n'
+    assert 424242 not in events.broker.subscribers
+    assert client.get("/tasks/stream").status_code == 401
+
+"""
+***********************************************
+Method: test_stream_refused_when_full()
+
+Description: This method tests that a stream is
+refused with a 503 before any response starts
+when the user has no free slot.
+
+Returns: None. Asserts the status and the slots.
+***********************************************
+"""
+def test_stream_refused_when_full(monkeypatch):
+    created = client.post("/users/", json={"username": "fullstream", "password": "streampass"})
+    headers = {"Authorization": f"Bearer {created.json()['access_token']}"}
+    monkeypatch.setattr(events, "broker", events.LocalBroker(max_per_user=0))
+    response = client.get("/tasks/stream", headers=headers)
+    assert response.status_code == 503 and response.headers["Retry-After"] == "5"
+    assert events.broker.count == 0
+
+"""
+***********************************************
+Method: test_redis_listener_recovers()
+
+Description: This method tests that the Redis
+listener skips a malformed message, resubscribes
+after the connection drops, and then tells the
+open streams to resync. Redis is replaced by a
+stand-in that replays one scripted session per
+subscription.
+
+Returns: None. Asserts the delivered events.
+***********************************************
+"""
+def test_redis_listener_recovers(monkeypatch):
+    sessions = [
+        [b"not json", b'{"owner_id": 7, "event": {"type": "deleted", "task_ids": [1]}}', ConnectionError("lost")],
+        [b'{"owner_id": 7, "event": {"type": "deleted", "task_ids": [2]}}'],
+    ]
+
+    class PubSub:
+        async def subscribe(self, channel):
+            self.messages = sessions.pop(0)
+        async def listen(self):
+            for message in self.messages:
+                if isinstance(message, Exception):
+                    raise message
+                yield {"type": "message", "data": message}
+            await asyncio.Event().wait()
+        async def reset(self):
+            pass
+
+    class Client:
+        def pubsub(self, ignore_subscribe_messages):
+            return PubSub()
+
+    monkeypatch.setattr(events, "REDIS_RETRY_MIN_SECONDS", 0)
+    broker = events.RedisBroker(client=Client())
+    subscriber = broker.subscribe(7)
+
+    async def run():
+        listener = asyncio.create_task(broker._listen())
+        received = [await subscriber.next_event(1) for _ in range(3)]
+        listener.cancel()
+        return received
+
+    assert asyncio.run(run()) == [
+        {"type": "deleted", "task_ids": [1]}, {"type": "resync"}, {"type": "deleted", "task_ids": [2]},
+    ]
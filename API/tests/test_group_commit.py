@@ -0,0 +1,90 @@
+import asyncio
+import httpx
+from fastapi.testclient import TestClient
+from API.src.app.main import tdlapp
+from API.src.app import group_commit, metrics
+from Database.src import database
+
+client = TestClient(tdlapp)
+
+"""
+***********************************************
+Method: test_group_commit_batches_writes()
+
+Description: This method tests that with group
+commit on, concurrent task writes from several
+users share commits and each still gets its own
+result. A write that fails (here a 404) is rolled
+back on its own without failing the rest of its
+group.
+
+Returns: None. Asserts fewer commits than writes
+and the stored tasks.
+***********************************************
+"""
+def test_group_commit_batches_writes(monkeypatch):
+    committer = group_commit.GroupCommitter(max_delay_ms=20, max_batch=100)
+    monkeypatch.setattr(group_commit, "GROUP_COMMIT", True)
+    monkeypatch.setattr(group_commit, "committer", committer)
+
+    users = []
+    for name in ("groupa", "groupb"):
+        created = client.post("/users/", json={"username": name, "password": "grouppass"})
+        users.append({"Authorization": f"Bearer {created.json()['access_token']}"})
+
+    async def burst():
+        transport = httpx.ASGITransport(app=tdlapp)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            created = await asyncio.gather(*(
+                async_client.post("/tasks/", json={"title": f"Task {n}"}, headers=headers)
+                for headers in users for n in range(10)
+            ))
+            toggled = await asyncio.gather(
+                *(async_client.patch(f"/tasks/{r.json()['id']}", json={"completed": True}, headers=users[0])
+                  for r in created[:10]),
+                async_client.patch("/tasks/999999", json={"completed": True}, headers=users[0]),
+            )
+            await committer.stop()
+        # The pool's wait queue is tied to this event loop; start afresh for later tests
+        await database.async_engine.dispose()
+        return created, toggled
+
+    created, toggled = asyncio.run(burst())
+    assert all(r.status_code == 200 for r in created)
+    assert [r.status_code for r in toggled] == [200] * 10 + [404]
+    assert committer.writes == 31
+    assert committer.groups < committer.writes
+
+    first = client.get("/tasks/", headers=users[0]).json()
+    assert [t["number"] for t in first] == list(range(1, 11))
+    assert all(t["completed"] for t in first)
+    assert len(client.get("/tasks/", headers=users[1]).json()) == 10
+    for headers in users:
+        client.delete("/users/me", headers=headers)
+
+"""
+***********************************************
+Method: test_flusher_has_no_request_context()
+
+Description: This method tests that the flusher a
+request starts does not inherit that request's
+metrics, so later groups are not counted against
+it.
+
+Returns: None. Asserts the flusher's context.
+***********************************************
+"""
+def test_flusher_has_no_request_context():
+    committer = group_commit.GroupCommitter(max_delay_ms=0)
+
+    async def seen_by_flusher(db):
+        return metrics.current_request.get()
+
+    async def request():
+        metrics.current_request.set(metrics.RequestStats("/tasks/"))
+        seen = await committer.submit(1, seen_by_flusher)
+        await committer.stop()
+        await database.async_engine.dispose()
+        return seen
+
+    assert asyncio.run(request()) is None
@@ -5,6 +5,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../.
 
 from fastapi.testclient import TestClient
 from API.src.app.main import tdlapp
+from conftest import auth_headers
 
 client = TestClient(tdlapp)
 
@@ -145,4 +146,478 @@ def test_delete_account():
     headers = {"Authorization": f"Bearer {token}"}
 
     response = client.delete("/users/me", headers=headers)
-    assert response.status_code == 200 or response.status_code == 204 or response.status_code == 202
\ No newline at end of file
+    assert response.status_code == 200 or response.status_code == 204 or response.status_code == 202
+
+"""
+***********************************************
+Method: test_task_pagination()
+
+Description: This method tests the keyset
+pagination and filters on the task list. It walks
+every page with the X-Next-Cursor header and checks
+the completed and title prefix filters.
+
+Returns: None. Asserts every task is returned once
+and the filters only return matching tasks.
+***********************************************
+"""
+def test_task_pagination():
+    headers = auth_headers("pageuser")
+    for i in range(7):
+        client.post("/tasks/", json={"title": f"Page {i}", "completed": i % 2 == 0}, headers=headers)
+    client.post("/tasks/", json={"title": "Other_%"}, headers=headers)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 3}
+        if cursor:
+            params["after"] = cursor
+        page = client.get("/tasks/", params=params, headers=headers)
+        assert page.status_code == 200
+        assert len(page.json()) <= 3
+        seen.extend(t["id"] for t in page.json())
+        cursor = page.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert len(seen) == 8
+    assert seen == sorted(seen)
+
+    done = client.get("/tasks/", params={"completed": True}, headers=headers).json()
+    assert len(done) == 4
+    assert all(t["completed"] for t in done)
+
+    prefixed = client.get("/tasks/", params={"title_prefix": "Page"}, headers=headers).json()
+    assert len(prefixed) == 7
+    literal = client.get("/tasks/", params={"title_prefix": "Other_%"}, headers=headers).json()
+    assert [t["title"] for t in literal] == ["Other_%"]
+    assert client.get("/tasks/", params={"title_prefix": "Oth%"}, headers=headers).json() == []
+
+"""
+***********************************************
+Method: test_pool_stats()
+
+Description: This method tests that the pool
+statistics endpoint reports checkouts made by
+earlier requests and that every connection was
+returned to the pool.
+
+Returns: None. Asserts the async pool counters.
+***********************************************
+"""
+def test_pool_stats():
+    client.get("/test-db-connection")
+    response = client.get("/pool-stats")
+    assert response.status_code == 200
+    pools = {p["pool"]: p for p in response.json()["pools"]}
+    assert pools["async"]["checkouts"] >= 1
+    assert pools["async"]["checkouts"] == pools["async"]["checkins"]
+    assert pools["async"]["checked_out"] == 0
+    assert pools["async"]["checkout_wait_seconds_total"] >= 0
+
+"""
+***********************************************
+Method: test_pool_stats_after_dispose()
+
+Description: This method tests that the pool
+statistics follow the engine's new pool after
+engine.dispose() replaces the old one.
+
+Returns: None. Asserts the sync pool gauges.
+***********************************************
+"""
+def test_pool_stats_after_dispose():
+    from Database.src import database
+
+    database.engine.dispose()
+    with database.engine.connect():
+        pools = {p["pool"]: p for p in database.get_pool_stats()}
+        assert database.pool_metrics.pool is database.engine.pool
+        assert pools["sync"]["checked_out"] == 1
+    assert {p["pool"]: p for p in database.get_pool_stats()}["sync"]["checked_out"] == 0
+
+"""
+***********************************************
+Method: test_bulk_task_endpoints()
+
+Description: This method tests the bulk create,
+update and delete endpoints, including items
+that are invalid or belong to another user.
+
+Returns: None. Asserts the per-item results and
+the stored tasks after each call.
+***********************************************
+"""
+def test_bulk_task_endpoints():
+    headers = auth_headers("bulkuser")
+    other = auth_headers("bulkother")
+    foreign = client.post("/tasks/", json={"title": "Not yours"}, headers=other).json()
+
+    created = client.post("/tasks/bulk", json=[
+        {"title": "Bulk 1"},
+        {"description": "missing title"},
+        {"title": "Bulk 2", "completed": True},
+        {"title": "Bulk 3"},
+    ], headers=headers)
+    assert created.status_code == 200
+    results = created.json()
+    assert [r["status"] for r in results] == ["created", "invalid", "created", "created"]
+    ids = [r["id"] for r in results if r["status"] == "created"]
+    titles = {t["id"]: t["title"] for t in client.get("/tasks/", headers=headers).json()}
+    assert [titles[i] for i in ids] == ["Bulk 1", "Bulk 2", "Bulk 3"]
+
+    updated = client.patch("/tasks/bulk", json=[
+        {"id": ids[0], "completed": True},
+        {"id": ids[2], "completed": True},
+        {"id": ids[1], "title": "Renamed"},
+        {"id": foreign["id"], "completed": True},
+    ], headers=headers).json()
+    assert [r["status"] for r in updated] == ["updated", "updated", "updated", "not_found"]
+    tasks = {t["id"]: t for t in client.get("/tasks/", headers=headers).json()}
+    assert all(tasks[i]["completed"] for i in ids)
+    assert tasks[ids[1]]["title"] == "Renamed"
+    assert client.get(f"/tasks/{foreign['id']}", headers=other).json()["completed"] is False
+
+    deleted = client.request("DELETE", "/tasks/bulk", json=[ids[0], foreign["id"], "x"], headers=headers).json()
+    assert [r["status"] for r in deleted] == ["deleted", "not_found", "invalid"]
+    assert sorted(tasks_left["id"] for tasks_left in client.get("/tasks/", headers=headers).json()) == ids[1:]
+    assert client.get(f"/tasks/{foreign['id']}", headers=other).status_code == 200
+
+    assert client.post("/tasks/bulk", json={"title": "not a list"}, headers=headers).status_code == 422
+
+"""
+***********************************************
+Method: test_concurrent_deletes_stay_owner_scoped()
+
+Description: This method sends deletes from many
+users at once and tests the statements they run:
+each delete is one DELETE scoped to its owner,
+with no table-wide COUNT or ALTER TABLE that
+would lock out other users' writes. It does not
+measure lock waits; SQLite runs one writer at a
+time whatever the statements are.
+
+Returns: None. Asserts every delete succeeded, the
+statements issued, and that every user's counters
+and list end up empty.
+***********************************************
+"""
+def test_concurrent_deletes_stay_owner_scoped():
+    import asyncio
+    import httpx
+    from sqlalchemy import event
+    from Database.src import database
+
+    users = [auth_headers(f"deleter{n}") for n in range(8)]
+    task_ids = []
+    for headers in users:
+        created = [client.post("/tasks/", json={"title": f"Task {i}"}, headers=headers).json() for i in range(3)]
+        assert [t["number"] for t in created] == [1, 2, 3]
+        task_ids.extend((headers, t["id"]) for t in created)
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.upper())
+
+    async def delete_all():
+        transport = httpx.ASGITransport(app=tdlapp)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(
+                async_client.delete(f"/tasks/{task_id}", headers=headers) for headers, task_id in task_ids
+            ))
+
+    event.listen(database.async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        responses = asyncio.run(delete_all())
+    finally:
+        event.remove(database.async_engine.sync_engine, "before_cursor_execute", record)
+
+    assert all(r.status_code == 200 for r in responses)
+    assert not [s for s in statements if "ALTER" in s or "COUNT(" in s]
+    deletes = [s for s in statements if s.startswith("DELETE FROM TASKS")]
+    assert len(deletes) == len(task_ids)
+    assert all("TASKS.OWNER_ID =" in s for s in deletes)
+    for headers in users:
+        assert client.get("/tasks/", headers=headers).json() == []
+        assert client.get("/tasks/summary", headers=headers).json()["total"] == 0
+    assert client.delete(f"/tasks/{task_ids[0][1]}", headers=task_ids[0][0]).status_code == 404
+
+"""
+***********************************************
+Method: test_bulk_delete_races_single_delete()
+
+Description: This method deletes the same tasks
+through the single and bulk endpoints at once, so
+the bulk delete reads ownership while the single
+deletes commit. Each task must be reported as
+deleted by exactly one of them, and a bulk delete
+that finds nothing must not change the ETag.
+
+Returns: None. Asserts the per-task outcomes, the
+summary counts and the ETag.
+***********************************************
+"""
+def test_bulk_delete_races_single_delete():
+    import asyncio
+    import httpx
+    from Database.src import database
+
+    headers = auth_headers("bulkracer")
+    ids = [r["id"] for r in client.post("/tasks/bulk", json=[
+        {"title": f"Race {i}", "completed": i % 2 == 0} for i in range(20)
+    ], headers=headers).json()]
+
+    async def race():
+        transport = httpx.ASGITransport(app=tdlapp)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            responses = await asyncio.gather(
+                async_client.request("DELETE", "/tasks/bulk", json=ids[:10], headers=headers),
+                *(async_client.delete(f"/tasks/{task_id}", headers=headers) for task_id in ids[:10]),
+            )
+        # The pool's wait queue is tied to this event loop; start afresh for later tests
+        await database.async_engine.dispose()
+        return responses
+
+    bulk, *singles = asyncio.run(race())
+    bulk_deleted = {r["id"] for r in bulk.json() if r["status"] == "deleted"}
+    single_deleted = {task_id for task_id, r in zip(ids[:10], singles) if r.status_code == 200}
+    assert all(r.status_code in (200, 404) for r in singles)
+    assert not bulk_deleted & single_deleted
+    assert bulk_deleted | single_deleted == set(ids[:10])
+    summary = client.get("/tasks/summary", headers=headers).json()
+    assert summary["total"] == 10 and summary["completed"] == 5
+
+    etag = client.get("/tasks/", headers=headers).headers["etag"]
+    nothing = client.request("DELETE", "/tasks/bulk", json=ids[:10], headers=headers).json()
+    assert {r["status"] for r in nothing} == {"not_found"}
+    assert client.get("/tasks/", headers=headers).headers["etag"] == etag
+
+"""
+***********************************************
+Method: test_update_user_hides_password_hash()
+
+Description: This method tests that updating a user
+only returns the public user fields and never the
+stored password hash.
+
+Returns: None. Asserts the exact response fields.
+***********************************************
+"""
+def test_update_user_hides_password_hash():
+    headers = auth_headers("hashhidden")
+    me = client.get("/users/me", headers=headers).json()
+    response = client.put(f"/users/{me['id']}", json={"password": "newpass"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"id": me["id"], "username": "hashhidden"}
+
+"""
+***********************************************
+Method: test_task_etags()
+
+Description: This method tests conditional requests
+on tasks. Unchanged lists and tasks answer
+If-None-Match with a 304, any task write changes
+the ETags, and If-Match on PUT refuses updates
+based on a stale copy.
+
+Returns: None. Asserts the status codes and ETags.
+***********************************************
+"""
+def test_task_etags():
+    headers = auth_headers("etaguser")
+    task = client.post("/tasks/", json={"title": "Cache me"}, headers=headers).json()
+
+    listing = client.get("/tasks/", headers=headers)
+    list_etag = listing.headers["ETag"]
+    assert listing.headers["Cache-Control"] == "private, no-cache"
+    cached = client.get("/tasks/", headers={**headers, "If-None-Match": list_etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    other_page = client.get("/tasks/", params={"limit": 1}, headers={**headers, "If-None-Match": list_etag})
+    assert other_page.status_code == 200
+
+    single = client.get(f"/tasks/{task['id']}", headers=headers)
+    task_etag = single.headers["ETag"]
+    assert client.get(f"/tasks/{task['id']}", headers={**headers, "If-None-Match": f"W/{task_etag}"}).status_code == 304
+
+    updated = client.put(f"/tasks/{task['id']}", json={"completed": True}, headers={**headers, "If-Match": task_etag})
+    assert updated.status_code == 200
+    new_etag = updated.headers["ETag"]
+    assert new_etag != task_etag
+    assert client.get(f"/tasks/{task['id']}", headers={**headers, "If-None-Match": new_etag}).status_code == 304
+
+    stale = client.put(f"/tasks/{task['id']}", json={"title": "Lost update"}, headers={**headers, "If-Match": task_etag})
+    assert stale.status_code == 412
+    assert client.put(f"/tasks/{task['id']}", json={"title": "x"}, headers={**headers, "If-Match": '"1-bogus"'}).status_code == 412
+    assert client.get(f"/tasks/{task['id']}", headers=headers).json()["title"] == "Cache me"
+
+    client.post("/tasks/", json={"title": "Another"}, headers=headers)
+    assert client.get("/tasks/", headers={**headers, "If-None-Match": list_etag}).status_code == 200
+
+"""
+***********************************************
+Method: test_patch_task_single_update()
+
+Description: This method tests that PATCH only
+changes the fields it is sent, that empty strings
+and null clear fields, and that creating or
+updating a task never re-selects the task row.
+
+Returns: None. Asserts the stored task and the SQL
+statements that were run.
+***********************************************
+"""
+def test_patch_task_single_update():
+    from sqlalchemy import event
+    from Database.src import database
+
+    headers = auth_headers("patchuser")
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(" ".join(statement.split()))
+    event.listen(database.async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        task = client.post("/tasks/", json={"title": "Draft", "description": "Some notes"}, headers=headers).json()
+        patched = client.patch(f"/tasks/{task['id']}", json={"description": ""}, headers=headers)
+    finally:
+        event.remove(database.async_engine.sync_engine, "before_cursor_execute", record)
+
+    assert patched.status_code == 200
+    assert patched.json() == {**task, "description": ""}
+    assert not [s for s in statements if s.startswith("SELECT") and "FROM tasks" in s]
+    assert len([s for s in statements if s.startswith("UPDATE tasks")]) == 1
+
+    cleared = client.patch(f"/tasks/{task['id']}", json={"description": None, "completed": True}, headers=headers)
+    assert cleared.json()["description"] is None and cleared.json()["title"] == "Draft"
+    assert client.put(f"/tasks/{task['id']}", json={"title": ""}, headers=headers).json()["title"] == ""
+    assert client.patch(f"/tasks/{task['id']}", json={"title": None}, headers=headers).status_code == 422
+    assert client.patch(f"/tasks/{task['id']}", json={}, headers=headers).json()["completed"] is True
+    assert client.patch("/tasks/999999", json={"completed": True}, headers=headers).status_code == 404
+
+"""
+***********************************************
+Method: test_task_summary()
+
+Description: This method tests that the task
+summary follows creates, toggles, deletes and
+bulk writes, and that it carries an ETag.
+
+Returns: None. Asserts the summary after each
+write.
+***********************************************
+"""
+def test_task_summary():
+    headers = auth_headers("summaryuser")
+    def summary():
+        return client.get("/tasks/summary", headers=headers).json()
+
+    assert summary() == {"total": 0, "completed": 0, "open": 0}
+    first = client.post("/tasks/", json={"title": "One"}, headers=headers).json()
+    second = client.post("/tasks/", json={"title": "Two", "completed": True}, headers=headers).json()
+    assert summary() == {"total": 2, "completed": 1, "open": 1}
+
+    client.patch(f"/tasks/{first['id']}", json={"completed": True}, headers=headers)
+    client.patch(f"/tasks/{first['id']}", json={"completed": True}, headers=headers)
+    assert summary()["completed"] == 2
+    client.patch(f"/tasks/{second['id']}", json={"title": "Still done"}, headers=headers)
+    client.delete(f"/tasks/{second['id']}", headers=headers)
+    client.delete(f"/tasks/{second['id']}", headers=headers)
+    assert summary() == {"total": 1, "completed": 1, "open": 0}
+
+    ids = [r["id"] for r in client.post("/tasks/bulk", json=[
+        {"title": "B1"}, {"title": "B2", "completed": True}, {"title": "B3"},
+    ], headers=headers).json()]
+    assert summary() == {"total": 4, "completed": 2, "open": 2}
+    client.patch("/tasks/bulk", json=[
+        {"id": ids[0], "completed": True}, {"id": ids[1], "completed": True}, {"id": first["id"], "completed": False},
+    ], headers=headers)
+    assert summary() == {"total": 4, "completed": 2, "open": 2}
+    client.request("DELETE", "/tasks/bulk", json=[ids[0], ids[2], 999999], headers=headers)
+    assert summary() == {"total": 2, "completed": 1, "open": 1}
+
+    response = client.get("/tasks/summary", headers=headers)
+    etag = response.headers["ETag"]
+    assert client.get("/tasks/summary", headers={**headers, "If-None-Match": etag}).status_code == 304
+    client.post("/tasks/", json={"title": "New"}, headers=headers)
+    assert client.get("/tasks/summary", headers={**headers, "If-None-Match": etag}).status_code == 200
+
+"""
+***********************************************
+Method: test_one_connection_per_request()
+
+Description: This method tests that auth and the
+route handler share one session, so a request
+checks out at most one pooled connection, even
+when the user is not in the auth cache yet.
+
+Returns: None. Asserts the checkouts made by each
+request.
+***********************************************
+"""
+def test_one_connection_per_request():
+    from sqlalchemy import event
+    from Database.src import database
+    from API.src.app.auth import token_cache
+
+    headers = auth_headers("sessionuser")
+    task = client.post("/tasks/", json={"title": "Shared session"}, headers=headers).json()
+
+    checkouts = []
+    def record(dbapi_connection, connection_record, connection_proxy):
+        checkouts.append(connection_record)
+    requests = [
+        ("GET", "/tasks/", None),
+        ("GET", f"/tasks/{task['id']}", None),
+        ("GET", "/tasks/summary", None),
+        ("POST", "/tasks/", {"title": "Another"}),
+        ("PATCH", f"/tasks/{task['id']}", {"completed": True}),
+        ("DELETE", f"/tasks/{task['id']}", None),
+    ]
+    event.listen(database.async_engine.sync_engine, "checkout", record)
+    try:
+        for method, path, body in requests:
+            for cached in (False, True):
+                if not cached:
+                    token_cache.clear()
+                checkouts.clear()
+                response = client.request(method, path, json=body, headers=headers)
+                assert response.status_code == 200, (method, path)
+                assert len(checkouts) == 1, (method, path, cached)
+                if method == "DELETE":
+                    break
+    finally:
+        event.remove(database.async_engine.sync_engine, "checkout", record)
+
+"""
+***********************************************
+Method: test_task_writes_for_deleted_user()
+
+Description: This method tests that a user deleted
+by another worker, whose token this worker still
+has cached, gets a 404 from task writes rather than
+a server error or a misleading 412.
+
+Returns: None. Asserts the status codes.
+***********************************************
+"""
+def test_task_writes_for_deleted_user():
+    from sqlalchemy import delete
+    from Database.src import database, models
+
+    headers = auth_headers("vanisheduser")
+    task = client.post("/tasks/", json={"title": "Orphan"}, headers=headers).json()
+    etag = client.get(f"/tasks/{task['id']}", headers=headers).headers["ETag"]
+    with database.engine.begin() as conn:
+        conn.execute(delete(models.Task).where(models.Task.owner_id == task["owner_id"]))
+        conn.execute(delete(models.User).where(models.User.id == task["owner_id"]))
+
+    for method, path, extra, body in (
+        ("POST", "/tasks/", {}, {"title": "Too late"}),
+        ("PATCH", f"/tasks/{task['id']}", {}, {"completed": True}),
+        ("PUT", f"/tasks/{task['id']}", {"If-Match": etag}, {"title": "Too late"}),
+        ("GET", "/tasks/", {}, None),
+        ("GET", "/tasks/summary", {}, None),
+    ):
+        response = client.request(method, path, json=body, headers={**headers, **extra})
+        assert response.status_code == 404, (method, path, response.text)
+        assert response.json()["detail"] == "User not found"
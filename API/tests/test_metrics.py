@@ -0,0 +1,76 @@
+import logging
+from fastapi.testclient import TestClient
+from API.src.app.main import tdlapp
+from API.src.app import metrics as metrics_module
+from API.src.app.metrics import Histogram
+
+client = TestClient(tdlapp)
+
+"""
+***********************************************
+Method: test_histogram_render()
+
+Description: This method tests that histograms
+are written as cumulative Prometheus buckets.
+
+Returns: None. Asserts the exposition lines.
+***********************************************
+"""
+def test_histogram_render():
+    histogram = Histogram("demo_seconds", "Demo.", (0.1, 1.0), ("route",))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(("/x",), value)
+    lines = histogram.render()
+    assert 'demo_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/x",le="1.0"} 3' in lines
+    assert 'demo_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'demo_seconds_count{route="/x"} 4' in lines
+
+"""
+***********************************************
+Method: test_metrics_endpoint()
+
+Description: This method tests that requests are
+recorded under their route template together with
+the SQL statements they ran, and that /metrics
+exports them with the pool stats.
+
+Returns: None. Asserts the series in /metrics.
+***********************************************
+"""
+def test_metrics_endpoint():
+    created = client.post("/users/", json={"username": "metricsuser", "password": "metricspass"})
+    headers = {"Authorization": f"Bearer {created.json()['access_token']}"}
+    task_id = client.post("/tasks/", json={"title": "measured"}, headers=headers).json()["id"]
+    assert client.get(f"/tasks/{task_id}", headers=headers).status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'tdl_http_request_duration_seconds_count{method="GET",route="/tasks/{task_id}",status="200"}' in body
+    assert f"/tasks/{task_id}\"" not in body
+    sql_line = next(line for line in body.splitlines()
+                    if line.startswith('tdl_http_request_sql_statements_sum{method="GET",route="/tasks/{task_id}"}'))
+    assert float(sql_line.split()[-1]) >= 1
+    assert 'tdl_db_pool_checkouts{pool="async"}' in body
+
+    client.delete("/users/me", headers=headers)
+
+"""
+***********************************************
+Method: test_slow_query_log()
+
+Description: This method tests that statements
+over the threshold are logged with the request
+that ran them.
+
+Returns: None. Asserts the log record.
+***********************************************
+"""
+def test_slow_query_log(monkeypatch, caplog):
+    monkeypatch.setattr(metrics_module, "SLOW_QUERY_MS", 0.000001)
+    with caplog.at_level(logging.WARNING, logger="tdl.slow_query"):
+        client.get("/test-db-connection")
+    assert any("during /test-db-connection" in record.getMessage() and "SELECT 1" in record.getMessage()
+               for record in caplog.records)
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from Database.src import migrate, models
+
+
+def fresh_engine():
+    path = os.path.join(tempfile.mkdtemp(prefix="tdl-migrate-"), "migrate.db")
+    return create_engine(f"sqlite:///{path}")
+
+"""
+***********************************************
+Method: test_migrations_match_models()
+
+Description: This method tests that running every
+migration on an empty database builds the same
+tables, columns and indexes as models.py.
+
+Returns: None. Asserts the schemas match.
+***********************************************
+"""
+def test_migrations_match_models():
+    engine = fresh_engine()
+    assert migrate.upgrade(engine) == list(range(1, migrate.LATEST_VERSION + 1))
+    assert migrate.upgrade(engine) == []
+
+    inspector = inspect(engine)
+    for table in models.Base.metadata.sorted_tables:
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        assert columns == {c.name for c in table.columns}, table.name
+        indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        assert {i.name for i in table.indexes} <= indexes, table.name
+
+    with engine.connect() as conn:
+        migrate.verify_schema(conn)
+
+"""
+***********************************************
+Method: test_upgrade_keeps_existing_tasks()
+
+Description: This method tests that upgrading a
+database made by the original schema keeps its
+rows and numbers each owner's tasks 1, 2, 3...
+
+Returns: None. Asserts the backfilled numbers and
+that startup refuses an unmigrated schema.
+***********************************************
+"""
+def test_upgrade_keeps_existing_tasks():
+    engine = fresh_engine()
+    migrate.upgrade(engine, target=1)
+    with engine.begin() as conn:
+        with pytest.raises(RuntimeError):
+            migrate.verify_schema(conn)
+        conn.execute(text("INSERT INTO users (id, username, hashed_password) VALUES (1, 'a', 'x'), (2, 'b', 'x')"))
+        conn.execute(text(
+            "INSERT INTO tasks (id, title, owner_id, completed) VALUES "
+            "(1, 'a1', 1, 0), (2, 'b1', 2, 0), (3, 'a2', 1, 1), (4, 'b2', 2, 0), (5, 'a3', 1, 0)"
+        ))
+
+    migrate.upgrade(engine)
+    with engine.connect() as conn:
+        numbers = conn.execute(text("SELECT id, number FROM tasks ORDER BY id")).all()
+        seqs = conn.execute(text("SELECT id, task_seq FROM users ORDER BY id")).all()
+    assert [tuple(row) for row in numbers] == [(1, 1), (2, 1), (3, 2), (4, 2), (5, 3)]
+    assert [tuple(row) for row in seqs] == [(1, 3), (2, 2)]
+
+    with engine.connect() as conn:
+        counts = conn.execute(text("SELECT id, task_count, completed_count FROM users ORDER BY id")).all()
+    assert [tuple(row) for row in counts] == [(1, 3, 1), (2, 2, 0)]
+
+    with engine.connect() as conn:
+        positions = conn.execute(text("SELECT id, position FROM tasks ORDER BY id")).all()
+        last = conn.execute(text("SELECT id, last_position FROM users ORDER BY id")).all()
+    assert [tuple(row) for row in positions] == [(1, 1024), (2, 1024), (3, 2048), (4, 2048), (5, 3072)]
+    assert [tuple(row) for row in last] == [(1, 3072), (2, 2048)]
+
+"""
+***********************************************
+Method: test_repair_task_counters()
+
+Description: This method tests that the repair
+job fixes counters that drifted from the tasks
+table and leaves correct ones alone.
+
+Returns: None. Asserts the repaired counters.
+***********************************************
+"""
+def test_repair_task_counters():
+    from Database.src.counters import repair_task_counters
+
+    engine = fresh_engine()
+    migrate.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO users (id, username, hashed_password, task_count, completed_count) VALUES "
+            "(1, 'a', 'x', 2, 1), (2, 'b', 'x', 5, 5), (3, 'c', 'x', 0, 0)"
+        ))
+        conn.execute(text(
+            "INSERT INTO tasks (id, title, owner_id, number, completed) VALUES "
+            "(1, 'a1', 1, 1, 0), (2, 'a2', 1, 2, 1), (3, 'b1', 2, 1, 1)"
+        ))
+
+    assert repair_task_counters(engine, batch_size=2) == 1
+    with engine.connect() as conn:
+        counts = conn.execute(text("SELECT id, task_count, completed_count FROM users ORDER BY id")).all()
+    assert [tuple(row) for row in counts] == [(1, 2, 1), (2, 1, 1), (3, 0, 0)]
+    assert repair_task_counters(engine) == 0
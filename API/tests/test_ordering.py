@@ -0,0 +1,200 @@
+from datetime import datetime
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+from API.src.app.main import tdlapp
+from API.src.app.routes import tasks
+from Database.src import database
+from conftest import auth_headers
+
+client = TestClient(tdlapp)
+
+"""
+***********************************************
+Method: create()
+
+Description: Helper that creates a task with the given
+title and fields.
+
+Returns: The created task.
+***********************************************
+"""
+def create(headers, title, **fields):
+    return client.post("/tasks/", json={"title": title, **fields}, headers=headers).json()
+
+"""
+***********************************************
+Method: titles()
+
+Description: Helper that reads one page of up to 500
+tasks with the given query parameters.
+
+Returns: The tasks' titles, in order.
+***********************************************
+"""
+def titles(headers, **params):
+    return [t["title"] for t in client.get("/tasks/", params={"limit": 500, **params}, headers=headers).json()]
+
+"""
+***********************************************
+Method: walk()
+
+Description: Helper that follows X-Next-Cursor from the
+first page to the last.
+
+Returns: The titles on every page, in order.
+***********************************************
+"""
+def walk(headers, **params):
+    seen, cursor = [], None
+    while True:
+        page = client.get("/tasks/", params={**params, **({"after": cursor} if cursor else {})}, headers=headers)
+        assert page.status_code == 200
+        seen.extend(t["title"] for t in page.json())
+        cursor = page.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return seen
+
+"""
+***********************************************
+Method: test_sorted_task_pages()
+
+Description: This method tests the due_at and
+priority sort orders, that their opaque cursors
+walk every page once, and that a bad cursor is
+refused.
+
+Returns: None. Asserts the order of the titles.
+***********************************************
+"""
+def test_sorted_task_pages():
+    headers = auth_headers("sortuser")
+    create(headers, "no date", priority=1)
+    create(headers, "later", due_at="2030-05-02T09:00:00Z", priority=3)
+    create(headers, "sooner", due_at="2030-05-02T10:00:00+02:00")
+    create(headers, "same time", due_at="2030-05-02T08:00:00", priority=3)
+    create(headers, "urgent", priority=3)
+
+    assert walk(headers, sort="due_at", limit=1) == ["sooner", "same time", "later"]
+    assert walk(headers, sort="priority", limit=2) == ["urgent", "same time", "later", "no date", "sooner"]
+    assert titles(headers, sort="priority", completed=False, title_prefix="s") == ["same time", "sooner"]
+
+    task = create(headers, "tz", due_at="2030-01-01T00:30:00+01:00")
+    assert task["due_at"] == "2029-12-31T23:30:00" and task["priority"] == 0
+    assert client.post("/tasks/", json={"title": "bad", "priority": 4}, headers=headers).status_code == 422
+    cleared = client.patch(f"/tasks/{task['id']}", json={"due_at": None, "priority": 2}, headers=headers).json()
+    assert cleared["due_at"] is None and cleared["priority"] == 2
+
+    for sort, cursor in (("priority", "not-a-cursor"), ("id", "-1"), ("id", "abc")):
+        assert client.get("/tasks/", params={"sort": sort, "after": cursor}, headers=headers).status_code == 400
+
+"""
+***********************************************
+Method: test_move_task()
+
+Description: This method tests that moving a task
+puts it right after the given task (or first),
+that new tasks go to the end, and that a move
+writes only the moved task's row.
+
+Returns: None. Asserts the order and the SQL.
+***********************************************
+"""
+def test_move_task():
+    headers = auth_headers("moveuser")
+    a, b, c, d = (create(headers, title) for title in "abcd")
+    assert titles(headers, sort="position") == ["a", "b", "c", "d"]
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(database.async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        moved = client.post(f"/tasks/{d['id']}/move", json={"after_id": a["id"]}, headers=headers)
+    finally:
+        event.remove(database.async_engine.sync_engine, "before_cursor_execute", record)
+    assert moved.status_code == 200
+    assert a["position"] < moved.json()["position"] < b["position"]
+    assert len([s for s in statements if s.startswith("UPDATE tasks")]) == 1
+
+    client.post(f"/tasks/{c['id']}/move", json={"after_id": None}, headers=headers)
+    client.post(f"/tasks/{a['id']}/move", json={"after_id": b["id"]}, headers=headers)
+    create(headers, "e")
+    assert titles(headers, sort="position") == ["c", "d", "b", "a", "e"]
+
+    assert client.post(f"/tasks/{a['id']}/move", json={"after_id": a["id"]}, headers=headers).status_code == 400
+    assert client.post(f"/tasks/{a['id']}/move", json={"after_id": 10**9}, headers=headers).status_code == 404
+    assert client.post(f"/tasks/{10**9}/move", json={"after_id": a["id"]}, headers=headers).status_code == 404
+
+"""
+***********************************************
+Method: test_move_rebalances_positions()
+
+Description: This method tests that moving tasks
+into the same spot over and over, until the gap
+between the neighbours runs out, spreads out the
+tasks around it and keeps the order intact.
+
+Returns: None. Asserts the order and that the
+positions are distinct.
+***********************************************
+"""
+def test_move_rebalances_positions(monkeypatch):
+    monkeypatch.setattr(tasks, "POSITION_REBALANCE_WINDOW", 2)
+    rebalanced = []
+    original = tasks.rebalance_positions
+    async def counting(*args):
+        rebalanced.append(await original(*args))
+        return rebalanced[-1]
+    monkeypatch.setattr(tasks, "rebalance_positions", counting)
+    headers = auth_headers("rebalanceuser")
+    created = [create(headers, f"t{i}") for i in range(10)]
+    first, x, y = created[0], created[8], created[9]
+
+    # Each move halves the gap after the first task
+    for i in range(60):
+        moving = (x, y)[i % 2]
+        assert client.post(f"/tasks/{moving['id']}/move", json={"after_id": first["id"]}, headers=headers).status_code == 200
+    order = client.get("/tasks/", params={"sort": "position"}, headers=headers).json()
+    assert [t["title"] for t in order] == ["t0", "t9", "t8"] + [f"t{i}" for i in range(1, 8)]
+    assert rebalanced and all(count < len(created) for count in rebalanced)
+    positions = [t["position"] for t in order]
+    assert positions == sorted(set(positions))
+    assert create(headers, "last")["position"] > positions[-1]
+
+"""
+***********************************************
+Method: test_sorted_pages_use_index_range()
+
+Description: This method tests that a page deep
+into each sort order, and the neighbour lookups of
+a move, read a range of the sort's own index
+rather than the owner's rows from the start or a
+sort of the rows, and that no row-value
+comparison is sent (see keyset_condition()).
+
+Returns: None. Asserts the query plans.
+***********************************************
+"""
+def test_sorted_pages_use_index_range():
+    def plan(query):
+        sql = str(query.compile(database.engine, compile_kwargs={"literal_binds": True}))
+        # MySQL only uses the index as a range for the expanded OR form
+        assert ", tasks.id) >" not in sql and ", tasks.id) <" not in sql, sql
+        with database.engine.connect() as conn:
+            return " ".join(row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql))
+
+    cursors = {"position": (2048.0, 5), "priority": (2, 5), "due_at": (datetime(2030, 1, 1), 5)}
+    indexes = {"position": "ix_tasks_owner_position_id", "priority": "ix_tasks_owner_priority_id",
+               "due_at": "ix_tasks_owner_due_id"}
+    for sort, cursor in cursors.items():
+        detail = plan(tasks.task_page_query(1, sort, cursor).limit(101))
+        assert f"INDEX {indexes[sort]} (owner_id=? AND " in detail, detail
+        assert "TEMP B-TREE" not in detail, detail
+
+    following = (
+        tasks.select(tasks.models.Task.id)
+        .where(tasks.models.Task.owner_id == 1, tasks.keyset_condition(tasks.models.Task.position, 2048.0, 5))
+        .order_by(tasks.models.Task.position, tasks.models.Task.id).limit(1)
+    )
+    detail = plan(following)
+    assert "ix_tasks_owner_position_id (owner_id=? AND position>" in detail, detail
@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from API.src.app.main import tdlapp
+from API.src.app.ratelimit import MemoryBucketStore, Rate, limiter, parse_limits
+from Database.src import database
+
+client = TestClient(tdlapp)
+
+"""
+***********************************************
+Method: test_token_bucket()
+
+Description: This method tests that a bucket
+allows a burst up to its size, then refills
+evenly, that idle buckets are dropped, and that a
+request empty in one bucket takes nothing from
+its others.
+
+Returns: None. Asserts the waits and store size.
+***********************************************
+"""
+def test_token_bucket():
+    now = [0.0]
+    store = MemoryBucketStore(max_keys=4, shards=1, clock=lambda: now[0])
+    rate = Rate.parse("3/minute")
+    take = lambda key: asyncio.run(store.take({key: rate}))
+
+    assert [take("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert take("a") == pytest.approx(20.0)
+    now[0] += 20
+    assert take("a") == 0.0
+    assert take("a") > 0
+
+    # Buckets that have filled up again are forgotten
+    take("b")
+    now[0] += 60
+    take("c")
+    take("d")
+    assert len(store) <= 3
+    # The store never grows past its cap
+    for i in range(20):
+        take(f"user{i}")
+    assert len(store) <= 4
+
+    # A request takes from all of its buckets or from none
+    store = MemoryBucketStore(clock=lambda: now[0])
+    for _ in range(3):
+        take("user")
+    assert asyncio.run(store.take({"ip": rate, "user": rate})) > 0
+    assert [asyncio.run(store.take({"ip": rate, "other": rate})) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert asyncio.run(store.take({"ip": rate})) > 0
+
+    assert parse_limits("ip=30/minute, username=5/hour") == {
+        "ip": Rate(30.0, 0.5), "username": Rate(5.0, 5 / 3600),
+    }
+    with pytest.raises(ValueError):
+        parse_limits("ip=often")
+
+"""
+***********************************************
+Method: test_login_and_signup_are_limited()
+
+Description: This method tests that /login is
+limited per username and POST /users/ per IP, and
+that rejected requests run no SQL and no bcrypt.
+
+Returns: None. Asserts the status codes and that
+nothing reached the database or the hash pool.
+***********************************************
+"""
+def test_login_and_signup_are_limited(monkeypatch):
+    monkeypatch.setattr(limiter, "enabled", True)
+    monkeypatch.setattr(limiter, "store", MemoryBucketStore())
+
+    signups = [
+        client.post("/users/", json={"username": f"limited{i}", "password": "limitpass"}).status_code
+        for i in range(6)
+    ]
+    assert signups == [200] * 5 + [429]
+
+    form = {"username": "limited0", "password": "wrong"}
+    assert [client.post("/login", data=form).status_code for _ in range(5)] == [401] * 5
+    # Another username from the same address still gets through
+    assert client.post("/login", data={"username": "limited1", "password": "limitpass"}).status_code == 200
+
+    statements = []
+    hashes = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    async def no_verify(password, hashed):
+        hashes.append(password)
+        return False
+    monkeypatch.setattr("API.src.app.routes.users.verify_password_async", no_verify)
+    event.listen(database.async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        rejected = client.post("/login", data=form)
+    finally:
+        event.remove(database.async_engine.sync_engine, "before_cursor_execute", record)
+    assert rejected.status_code == 429
+    assert int(rejected.headers["retry-after"]) > 0
+    assert statements == [] and hashes == []
@@ -0,0 +1,160 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+from fastapi.testclient import TestClient
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from API.src.app.main import tdlapp
+from Database.src import database, replicas
+from conftest import auth_headers
+
+client = TestClient(tdlapp)
+
+"""
+***********************************************
+Method: copy_of_primary()
+
+Description: Helper that snapshots the test database into
+a new file, a replica that has caught up.
+
+Returns: The path of the snapshot.
+***********************************************
+"""
+def copy_of_primary():
+    return copy_into(os.path.join(tempfile.mkdtemp(prefix="tdl-replica-"), "replica.db"))
+
+"""
+***********************************************
+Method: copy_into()
+
+Description: Helper that overwrites a replica file with the
+test database, as if replication caught up.
+
+Returns: The path it was given.
+***********************************************
+"""
+def copy_into(path):
+    source = sqlite3.connect(make_url(database.DATABASE_URL).database)
+    target = sqlite3.connect(path)
+    source.backup(target)
+    source.close()
+    target.close()
+    return path
+
+"""
+***********************************************
+Method: replica()
+
+Description: Helper that wraps a SQLite file in a Replica
+with its own engine.
+
+Returns: The Replica.
+***********************************************
+"""
+def replica(name, path):
+    return replicas.Replica(name, create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool))
+
+"""
+***********************************************
+Method: test_reads_use_replicas_after_writes_settle()
+
+Description: This method tests that task reads go
+to the replicas in turn, except for a user inside
+their read-your-writes window or whose last write
+a replica has not seen yet, even when another
+worker took the write, and that writes always go
+to the primary.
+
+Returns: None. Asserts which database answered.
+***********************************************
+"""
+def test_reads_use_replicas_after_writes_settle(monkeypatch):
+    headers = auth_headers("replicauser")
+    client.post("/tasks/", json={"title": "Copied to the replica"}, headers=headers)
+    snapshot = copy_of_primary()
+
+    now = [1000.0]
+    router = replicas.ReplicaRouter(
+        [replica("a", snapshot), replica("b", snapshot)], clock=lambda: now[0],
+    )
+    monkeypatch.setattr(replicas, "router", router)
+
+    # Only the primary has this task, and the user just wrote it
+    client.post("/tasks/", json={"title": "Only on the primary"}, headers=headers)
+    assert len(client.get("/tasks/", headers=headers).json()) == 2
+    assert router.primary_reads == 1 and router.replica_reads == 0
+
+    # Past the window (or on a worker that never saw the write) the
+    # replicas are still behind the user's tasks_version
+    now[0] += replicas.READ_YOUR_WRITES_SECONDS + 1
+    assert len(client.get("/tasks/", headers=headers).json()) == 2
+    assert router.primary_reads == 2 and router.lagging_reads == 2
+
+    # Once replication catches up the replicas serve the reads
+    copy_into(snapshot)
+    titles = [t["title"] for t in client.get("/tasks/", headers=headers).json()]
+    assert titles == ["Copied to the replica", "Only on the primary"]
+    assert client.get("/tasks/summary", headers=headers).json()["total"] == 2
+    assert router.replica_reads == 2 and router.next_index == 4
+
+"""
+***********************************************
+Method: test_failover_to_primary()
+
+Description: This method tests that an unreachable
+replica is skipped, that reads fall back to the
+primary when no replica works, and that a health
+check puts a recovered replica back.
+
+Returns: None. Asserts the rotation and results.
+***********************************************
+"""
+def test_failover_to_primary(monkeypatch):
+    headers = auth_headers("failoveruser")
+    client.post("/tasks/", json={"title": "Still readable"}, headers=headers)
+
+    now = [1000.0]
+    missing = os.path.join(tempfile.mkdtemp(prefix="tdl-replica-"), "missing", "replica.db")
+    broken = replica("broken", missing)
+    router = replicas.ReplicaRouter([broken], clock=lambda: now[0])
+    monkeypatch.setattr(replicas, "router", router)
+    now[0] += replicas.READ_YOUR_WRITES_SECONDS + 1
+
+    assert [t["title"] for t in client.get("/tasks/", headers=headers).json()] == ["Still readable"]
+    assert broken.down_until > now[0] and router.primary_reads == 1
+    assert router.pick() is None
+
+    os.makedirs(os.path.dirname(missing))
+    asyncio.run(router.check())
+    assert broken.down_until == 0.0
+    assert router.pick() is broken
+
+"""
+***********************************************
+Method: test_health_checks_survive_errors()
+
+Description: This method tests that an unexpected
+error in a health check is logged and the checks
+keep running.
+
+Returns: None. Asserts the checks ran again.
+***********************************************
+"""
+def test_health_checks_survive_errors(monkeypatch):
+    router = replicas.ReplicaRouter([])
+    calls = []
+    async def check():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise RuntimeError("unexpected")
+    monkeypatch.setattr(router, "check", check)
+
+    async def run():
+        checker = asyncio.create_task(router._check_forever(0))
+        while len(calls) < 3:
+            await asyncio.sleep(0)
+        checker.cancel()
+    asyncio.run(run())
+    assert len(calls) >= 3
@@ -0,0 +1,133 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from API.src.app.main import tdlapp
+from API.src.app.search import OwnerIndex, fulltext_query, query_terms, task_index
+from Database.src import database, models
+from conftest import auth_headers
+
+client = TestClient(tdlapp)
+
+"""
+***********************************************
+Method: test_owner_index_ranking()
+
+Description: This method tests that the in-process
+index needs every word to match (as a word or a
+prefix), ranks title matches first and follows
+changes and removals.
+
+Returns: None. Asserts the ranked ids.
+***********************************************
+"""
+def test_owner_index_ranking():
+    index = OwnerIndex(version=0)
+    index.put(1, "Buy milk", "from the corner shop")
+    index.put(2, "Call mom", "ask about milk and bread")
+    index.put(3, "Groceries", "milk, eggs and bread")
+    index.put(4, "Milkshake recipe", "")
+
+    assert query_terms("  MILK milk, Bread! ") == ["milk", "bread"]
+    # Whole word in the title, then prefix in the title, then the descriptions
+    assert index.search(["milk"], 10, 0) == ([1, 4, 2, 3], False)
+    assert index.search(["milk", "bread"], 10, 0) == ([2, 3], False)
+    assert index.search(["bre", "mil"], 1, 0) == ([2], True)
+    assert index.search(["nothing"], 10, 0) == ([], False)
+
+    index.put(1, title="Buy oat drink")
+    index.remove(4)
+    assert index.search(["milk"], 10, 0)[0] == [2, 3]
+    assert index.search(["oat"], 10, 0)[0] == [1]
+    assert index.search(["milks"], 10, 0)[0] == []
+
+"""
+***********************************************
+Method: test_search_endpoint()
+
+Description: This method tests GET /tasks/search:
+results are the user's own ranked tasks and are
+paginated. Writes through the API update the
+index in place. A write made elsewhere (which only
+bumps tasks_version) makes the index rebuild.
+
+Returns: None. Asserts the results and headers.
+***********************************************
+"""
+def test_search_endpoint():
+    headers = auth_headers("searchuser")
+    other = auth_headers("searchother")
+    for title, description in (
+        ("Pay rent", "due on the first"),
+        ("Rent a car", "for the trip"),
+        ("Plan trip", "book hotel and rental car"),
+    ):
+        client.post("/tasks/", json={"title": title, "description": description}, headers=headers)
+    client.post("/tasks/", json={"title": "Rent movie"}, headers=other)
+
+    response = client.get("/tasks/search", params={"q": "rent"}, headers=headers)
+    assert response.status_code == 200
+    assert [t["title"] for t in response.json()] == ["Pay rent", "Rent a car", "Plan trip"]
+    etag = response.headers["ETag"]
+    assert client.get("/tasks/search", params={"q": "rent"}, headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    page = client.get("/tasks/search", params={"q": "rent", "limit": 2}, headers=headers)
+    assert len(page.json()) == 2 and page.headers["X-Next-Offset"] == "2"
+    last = client.get("/tasks/search", params={"q": "rent", "limit": 2, "offset": 2}, headers=headers)
+    assert [t["title"] for t in last.json()] == ["Plan trip"] and "X-Next-Offset" not in last.headers
+
+    # API writes are applied to the existing index
+    owner_id = response.json()[0]["owner_id"]
+    index = task_index._owners[owner_id]
+    car_id = response.json()[1]["id"]
+    client.put(f"/tasks/{car_id}", json={"title": "Return car"}, headers=headers)
+    client.post("/tasks/", json={"title": "Rent bikes"}, headers=headers)
+    titles = [t["title"] for t in client.get("/tasks/search", params={"q": "re car"}, headers=headers).json()]
+    assert titles == ["Return car", "Plan trip"]
+    titles = [t["title"] for t in client.get("/tasks/search", params={"q": "bike"}, headers=headers).json()]
+    assert titles == ["Rent bikes"]
+    assert task_index._owners[owner_id] is index
+
+    # A change from another worker only shows up as a new tasks_version
+    with database.engine.begin() as conn:
+        conn.execute(update(models.Task).where(models.Task.id == car_id).values(title="Sell car"))
+        conn.execute(update(models.User).where(models.User.id == owner_id)
+                     .values(tasks_version=models.User.tasks_version + 1))
+    titles = [t["title"] for t in client.get("/tasks/search", params={"q": "sell"}, headers=headers).json()]
+    assert titles == ["Sell car"]
+    assert task_index._owners[owner_id] is not index
+
+    assert client.get("/tasks/search", params={"q": ""}, headers=headers).status_code == 422
+    assert client.get("/tasks/search", params={"q": "?!"}, headers=headers).json() == []
+
+    client.delete("/users/me", headers=headers)
+    client.delete("/users/me", headers=other)
+    assert owner_id not in task_index._owners
+
+"""
+***********************************************
+Method: test_fulltext_query()
+
+Description: This method tests the MySQL search
+statement: indexed words are required prefixes,
+words InnoDB does not index (short ones and
+stopwords) are matched with REGEXP instead, and
+the title-only score orders the results first.
+
+Returns: None. Asserts the compiled SQL.
+***********************************************
+"""
+def test_fulltext_query():
+    from sqlalchemy.dialects import mysql
+
+    def compiled(terms):
+        query = fulltext_query(1, terms, (models.Task.id,), 10, 0)
+        return str(query.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+
+    sql = compiled(query_terms("Go to the shop"))
+    assert "AGAINST ('+shop*' IN BOOLEAN MODE)" in sql
+    assert "tasks.title REGEXP '\\\\bgo'" in sql and "tasks.description REGEXP '\\\\bthe'" in sql
+    assert "+to*" not in sql and "+the*" not in sql
+    order = sql.split("ORDER BY")[1]
+    assert order.index("MATCH (tasks.title) AGAINST ('shop*'") < order.index("MATCH (tasks.title, tasks.description)")
+
+    sql = compiled(["to"])
+    assert "MATCH" not in sql and "ORDER BY tasks.title REGEXP" in sql
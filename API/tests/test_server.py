@@ -0,0 +1,77 @@
+import pytest
+from API.src.app import server
+
+"""
+***********************************************
+Method: test_worker_pool_size_respects_cap()
+
+Description: This method tests that the pool of
+each worker is trimmed so that all the workers
+together stay under DB_MAX_CONNECTIONS.
+
+Returns: None. Asserts the per-worker sizes.
+***********************************************
+"""
+def test_worker_pool_size_respects_cap():
+    assert server.worker_pool_size(4, 100, 5, 10) == (5, 10)
+    assert server.worker_pool_size(8, 60, 5, 10) == (5, 2)
+    assert server.worker_pool_size(8, 20, 5, 10) == (2, 0)
+    for workers in (1, 2, 4, 8, 16):
+        size, overflow = server.worker_pool_size(workers, 50, 5, 10)
+        assert size >= 1 and workers * (size + overflow) <= 50
+    with pytest.raises(ValueError):
+        server.worker_pool_size(8, 4, 5, 10)
+
+"""
+***********************************************
+Method: test_server_config_from_env()
+
+Description: This method tests that the launcher
+reads its settings from the environment and passes
+the trimmed pool sizes to the workers.
+
+Returns: None. Asserts the uvicorn settings.
+***********************************************
+"""
+def test_server_config_from_env(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setenv("API_PORT", "9000")
+    monkeypatch.setenv("WORKER_MAX_REQUESTS", "0")
+    monkeypatch.setenv("DB_MAX_CONNECTIONS", "40")
+    monkeypatch.setenv("DB_POOL_SIZE", "5")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "10")
+    config = server.server_config()
+    assert config["app"] == "API.src.app.main:create_app" and config["factory"] is True
+    assert config["workers"] == 4 and config["port"] == 9000
+    assert config["limit_max_requests"] is None
+    assert server.os.environ["DB_POOL_SIZE"] == "5"
+    assert server.os.environ["DB_MAX_OVERFLOW"] == "5"
+
+"""
+***********************************************
+Method: test_import_has_no_side_effects()
+
+Description: This method tests that importing the
+API and the database modules in a fresh process
+needs no configuration, prints nothing (the old
+import printed the database URL and password) and
+leaves the engines, JWT and bcrypt libraries
+unloaded until the app is built.
+
+Returns: None. Asserts the child process output.
+***********************************************
+"""
+def test_import_has_no_side_effects():
+    import os
+    import subprocess
+    import sys
+    env = {k: v for k, v in os.environ.items() if k not in ("DATABASE_URL", "JWT_SECRET_KEY")}
+    code = (
+        "import sys, API.src.app.main, Database.src.models, Database.src.database as db\n"
+        "assert 'engine' not in vars(db)\n"
+        "print(sorted(m for m in ('jose', 'passlib', 'aiosqlite', 'aiomysql') if m in sys.modules))\n"
+    )
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+    result = subprocess.run([sys.executable, "-c", code], cwd=root, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "[]\n"
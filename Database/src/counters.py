@@ -0,0 +1,101 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: counters.py
+
+Description: Repair job for the per-user task
+counters (users.task_count and completed_count).
+The API keeps them up to date on every write, but
+writes made around the API (manual SQL, restores)
+can leave them wrong. This job recounts the tasks
+of a batch of users at a time with one grouped
+query. It only rewrites the users whose counters
+drifted, and bumps their tasks_version so cached
+summaries are refreshed.
+
+Usage (from the repository root):
+    python -m Database.src.counters [--batch-size 1000]
+***********************************************
+"""
+import argparse
+from sqlalchemy import case, func, select, update
+from . import models
+
+
+"""
+***********************************************
+Method: repair_task_counters()
+
+Description: This method is used to recompute the
+task counters of every user.
+
+Parameters:
+- engine (Engine): A synchronous engine.
+- batch_size (int): Users recounted per transaction.
+
+returns: The number of users whose counters were fixed.
+***********************************************
+"""
+def repair_task_counters(engine, batch_size: int = 1000) -> int:
+    fixed = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            # Lock the batch's user rows first, like every task write does
+            users = conn.execute(
+                select(models.User.id, models.User.task_count, models.User.completed_count)
+                .where(models.User.id > last_id)
+                .order_by(models.User.id)
+                .limit(batch_size)
+                .with_for_update()
+            ).all()
+            if not users:
+                return fixed
+            last_id = users[-1].id
+
+            counts = conn.execute(
+                select(
+                    models.Task.owner_id,
+                    func.count(),
+                    func.coalesce(func.sum(case((models.Task.completed, 1), else_=0)), 0),
+                )
+                .where(models.Task.owner_id.between(users[0].id, last_id))
+                .group_by(models.Task.owner_id)
+            ).all()
+            actual = {owner_id: (total, completed) for owner_id, total, completed in counts}
+
+            for user in users:
+                total, completed = actual.get(user.id, (0, 0))
+                if (user.task_count, user.completed_count) != (total, completed):
+                    conn.execute(
+                        update(models.User)
+                        .where(models.User.id == user.id)
+                        .values(task_count=total, completed_count=completed,
+                                tasks_version=models.User.tasks_version + 1)
+                    )
+                    fixed += 1
+
+
+"""
+***********************************************
+Method: main()
+
+Description: This method is used to run the
+repair job from the command line.
+
+returns: N/A
+***********************************************
+"""
+def main():
+    parser = argparse.ArgumentParser(description="Recompute the per-user task counters.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    from .database import engine
+    fixed = repair_task_counters(engine, args.batch_size)
+    print(f"Fixed task counters for {fixed} users")
+
+
+if __name__ == "__main__":
+    main()
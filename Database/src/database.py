@@ -6,40 +6,177 @@ File: database.py
 
 Description: This class is used to create the 
 session that the database will be running on.
+The engines are built on first use, not at
+import, from the settings in settings.py.
 ***********************************************
 """
-
-import os
-from sqlalchemy import create_engine
+import logging
+from functools import lru_cache
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
+from .pool import PoolMetrics, engine_pool_kwargs, instrument_engine
+from .settings import get_settings
 
-# Load environment variables from .env file
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../../.env'))
+logger = logging.getLogger(__name__)
 
-# Access database connection variables from environment
-DATABASE_URL = os.getenv("DATABASE_URL")
+# Declarative Base for defining models
+Base = declarative_base()
 
-# Ensure DATABASE_URL is set
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL not found in environment variables")
+# Pool statistics for each engine, exposed through get_pool_stats()
+pool_metrics = PoolMetrics("sync")
+async_pool_metrics = PoolMetrics("async")
+replica_pool_metrics = []
 
-print(f"Connecting to MySQL database with URL: {DATABASE_URL}")
+# Async drivers used in place of the blocking ones for the API
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
 
-# SQLAlchemy engine for connecting to the database
-engine = create_engine(DATABASE_URL)
+"""
+***********************************************
+Method: to_async_url()
 
-# Declarative Base for defining models
-Base = declarative_base()
+Description: This method is used to turn the
+configured DATABASE_URL into the matching async
+driver URL (e.g. mysql+pymysql -> mysql+aiomysql)
+so both engines talk to the same database.
+
+Parameters:
+- url (str): The synchronous database URL.
+
+returns: The database URL for the async driver.
+***********************************************
+"""
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver is known for '{parsed.get_backend_name()}' databases")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+"""
+***********************************************
+Method: build_engines()
+
+Description: This method is used to create the
+engines and session factories the first time one
+of them is used, rather than when this module is
+imported. Importing the models, or a module that
+only needs the settings, therefore stays cheap and
+never needs a configured database. Creating an
+engine does not connect; the pools connect on
+first use.
+
+returns: A dictionary of the module attributes it
+built (engine, async_engine, SessionLocal,
+AsyncSessionLocal, replica_engines, ...).
+***********************************************
+"""
+@lru_cache(maxsize=None)
+def build_engines() -> dict:
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    settings = get_settings()
+    logger.info("Connecting to database %s", make_url(settings.database_url).render_as_string(hide_password=True))
+
+    # SQLAlchemy engine for connecting to the database
+    engine = create_engine(settings.database_url, **engine_pool_kwargs(settings.database_url, pool_metrics))
+    instrument_engine(engine, pool_metrics)
+
+    # Async engine used by the API; ASYNC_DATABASE_URL overrides the derived URL
+    async_url = settings.async_database_url or to_async_url(settings.database_url)
+    async_engine = create_async_engine(async_url, **engine_pool_kwargs(async_url, async_pool_metrics, is_async=True))
+    instrument_engine(async_engine.sync_engine, async_pool_metrics)
+
+    # Optional read replicas (DATABASE_REPLICA_URLS, comma separated URLs in
+    # the same form as DATABASE_URL); see replicas.py for how reads use them
+    replica_engines = []
+    replica_pool_metrics.clear()
+    for i, url in enumerate(settings.replica_urls):
+        replica_url = to_async_url(url)
+        metrics = PoolMetrics(f"replica{i}")
+        replica_engines.append(create_async_engine(replica_url, **engine_pool_kwargs(replica_url, metrics, is_async=True)))
+        instrument_engine(replica_engines[-1].sync_engine, metrics)
+        replica_pool_metrics.append(metrics)
 
-# Create a session factory for making database connections
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return {
+        "DATABASE_URL": settings.database_url,
+        "ASYNC_DATABASE_URL": async_url,
+        "engine": engine,
+        "async_engine": async_engine,
+        "replica_engines": replica_engines,
+        # Session factories for blocking code and for the API routes
+        "SessionLocal": sessionmaker(autocommit=False, autoflush=False, bind=engine),
+        "AsyncSessionLocal": async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False),
+    }
 
-# Dependency for FastAPI routes
-def get_db():
-    db = SessionLocal()
+"""
+***********************************************
+Method: __getattr__()
+
+Description: This method is used to build the
+engines when one of them is first looked up as a
+module attribute (database.engine, ...). The
+value is then stored on the module, so later
+lookups are plain attribute reads.
+
+Parameters:
+- name (str): The attribute being looked up.
+
+returns: The attribute.
+***********************************************
+"""
+def __getattr__(name: str):
+    if name.startswith("__"):
+        raise AttributeError(name)
+    built = build_engines()
+    if name not in built:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals().update(built)
+    return built[name]
+
+"""
+***********************************************
+Method: get_pool_stats()
+
+Description: This method is used to report the
+connection pool usage of both engines and of any
+read replicas.
+
+returns: A list of pool statistics dictionaries.
+***********************************************
+"""
+def get_pool_stats():
+    return [async_pool_metrics.snapshot(), pool_metrics.snapshot(), *(m.snapshot() for m in replica_pool_metrics)]
+
+# Blocking session dependency (only used by the benchmarks now)
+def get_sync_db():
+    db = build_engines()["SessionLocal"]()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+"""
+***********************************************
+Method: get_db()
+
+Description: This method is the database session
+dependency of every API route. FastAPI caches a
+dependency for the length of a request, so auth
+and the route handler get the same session, and
+a request uses at most one pooled connection. The
+session only checks a connection out when it runs
+its first statement, so requests answered from
+the auth cache alone never touch the pool.
+
+returns: N/A
+***********************************************
+"""
+async def get_db():
+    async with build_engines()["AsyncSessionLocal"]() as db:
+        yield db
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: migrate.py
+
+Description: Versioned schema migrations. Each
+module in Database/src/migrations named
+vNNNN_<name>.py upgrades the schema by one
+version. The schema_version table records every
+applied migration. The API only checks the schema
+is current at startup, so migrating is a separate
+deploy step and restarting a worker never touches
+the tables.
+
+Usage (from the repository root):
+    python -m Database.src.migrate           # apply pending migrations
+    python -m Database.src.migrate --check   # exit 1 if any are pending
+***********************************************
+"""
+import argparse
+import importlib
+import pkgutil
+import sys
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, text
+from . import migrations
+
+# Table recording which migrations have been applied
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    version_metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Seconds to wait for another process that is already migrating (MySQL)
+MIGRATION_LOCK_TIMEOUT = 300
+
+
+"""
+***********************************************
+Method: load_migrations()
+
+Description: This method is used to find every
+migration module, in version order.
+
+returns: A list of migration modules. Each one has
+VERSION, DESCRIPTION and upgrade(conn).
+***********************************************
+"""
+def load_migrations() -> list:
+    modules = []
+    for info in pkgutil.iter_modules(migrations.__path__):
+        if info.name.startswith("v") and info.name[1:5].isdigit():
+            modules.append(importlib.import_module(f"{migrations.__name__}.{info.name}"))
+    modules.sort(key=lambda module: module.VERSION)
+    versions = [module.VERSION for module in modules]
+    if versions != list(range(1, len(versions) + 1)):
+        raise RuntimeError(f"Migration versions must be 1..N without gaps, found {versions}")
+    return modules
+
+MIGRATIONS = load_migrations()
+LATEST_VERSION = MIGRATIONS[-1].VERSION if MIGRATIONS else 0
+
+
+"""
+***********************************************
+Method: current_version()
+
+Description: This method is used to read the
+version the database schema is at.
+
+Parameters:
+- conn (Connection): A database connection.
+
+returns: The highest applied version, or 0.
+***********************************************
+"""
+def current_version(conn) -> int:
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+"""
+***********************************************
+Method: verify_schema()
+
+Description: This method is used at API startup
+to make sure the migrations have been applied. It
+only reads the version table, so its cost does
+not grow with the schema.
+
+Parameters:
+- conn (Connection): A database connection.
+
+returns: N/A
+
+raises:
+- RuntimeError: If the schema is behind or ahead
+  of this version of the code.
+***********************************************
+"""
+def verify_schema(conn):
+    version = current_version(conn)
+    if version < LATEST_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version} but the API needs {LATEST_VERSION}; "
+            "run `python -m Database.src.migrate` first"
+        )
+    if version > LATEST_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version}, newer than this API ({LATEST_VERSION})"
+        )
+
+
+"""
+***********************************************
+Method: upgrade()
+
+Description: This method is used to apply every
+pending migration. Each migration and its
+schema_version row are committed together. On
+MySQL a named lock stops two deploy jobs from
+migrating at the same time.
+
+Parameters:
+- engine (Engine): A synchronous engine.
+- target (int): Version to stop at (default: latest).
+
+returns: The list of versions that were applied.
+***********************************************
+"""
+def upgrade(engine, target: int = None) -> list:
+    target = LATEST_VERSION if target is None else target
+    applied = []
+    with engine.connect() as lock_conn:
+        is_mysql = engine.dialect.name == "mysql"
+        if is_mysql:
+            got_lock = lock_conn.execute(
+                text("SELECT GET_LOCK('tdl_schema_migrate', :timeout)"), {"timeout": MIGRATION_LOCK_TIMEOUT}
+            ).scalar()
+            if got_lock != 1:
+                raise RuntimeError("Timed out waiting for another migration to finish")
+        try:
+            with engine.begin() as conn:
+                version_metadata.create_all(conn, checkfirst=True)
+            for migration in MIGRATIONS:
+                if migration.VERSION > target:
+                    break
+                with engine.begin() as conn:
+                    if migration.VERSION <= current_version(conn):
+                        continue
+                    migration.upgrade(conn)
+                    conn.execute(schema_version.insert().values(
+                        version=migration.VERSION,
+                        description=migration.DESCRIPTION,
+                        applied_at=datetime.utcnow(),
+                    ))
+                applied.append(migration.VERSION)
+        finally:
+            if is_mysql:
+                lock_conn.execute(text("SELECT RELEASE_LOCK('tdl_schema_migrate')"))
+    return applied
+
+
+"""
+***********************************************
+Method: main()
+
+Description: This method is used to run the
+migrations from the command line.
+
+returns: N/A
+***********************************************
+"""
+def main():
+    parser = argparse.ArgumentParser(description="Apply database schema migrations.")
+    parser.add_argument("--check", action="store_true", help="only report whether migrations are pending")
+    parser.add_argument("--target", type=int, default=None, help="version to migrate to (default: latest)")
+    args = parser.parse_args()
+
+    from .database import engine
+    with engine.connect() as conn:
+        version = current_version(conn)
+    print(f"Schema version {version}, latest {LATEST_VERSION}")
+    if args.check:
+        sys.exit(0 if version >= LATEST_VERSION else 1)
+    applied = upgrade(engine, args.target)
+    print(f"Applied migrations: {applied}" if applied else "Nothing to apply")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: __init__.py
+
+Description: Schema migrations, applied in order
+by Database/src/migrate.py. Each vNNNN_<name>.py
+module defines VERSION, DESCRIPTION and
+upgrade(conn). Migrations describe the tables as
+they were at that version instead of importing
+models.py, so old migrations keep working after
+the models change.
+***********************************************
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+
+
+"""
+***********************************************
+Method: add_column()
+
+Description: Helper for migrations that adds a
+column if it is not there yet. On MySQL it asks
+for an instant (metadata only) change, so large
+tables are not rebuilt or locked.
+
+Parameters:
+- conn (Connection): The migration's connection.
+- table (str): The table name.
+- column_ddl (str): The column definition, e.g.
+  "task_seq INTEGER NOT NULL DEFAULT 0".
+
+returns: N/A
+***********************************************
+"""
+def add_column(conn, table: str, column_ddl: str):
+    name = column_ddl.split()[0]
+    if name in {c["name"] for c in inspect(conn).get_columns(table)}:
+        return
+    statement = f"ALTER TABLE {table} ADD COLUMN {column_ddl}"
+    if conn.dialect.name == "mysql":
+        try:
+            conn.execute(text(statement + ", ALGORITHM=INSTANT"))
+            return
+        except OperationalError:
+            pass  # Older servers: fall back to the default algorithm
+    conn.execute(text(statement))
+
+
+"""
+***********************************************
+Method: create_index()
+
+Description: Helper for migrations that creates an
+index if it is not there yet. On MySQL the index
+is built online (ALGORITHM=INPLACE, LOCK=NONE),
+so reads and writes carry on while it builds.
+
+Parameters:
+- conn (Connection): The migration's connection.
+- name (str): The index name.
+- table (str): The table name.
+- columns (list): The indexed columns, in order.
+- unique (bool): Whether the index is unique.
+- kind (str): Optional index kind such as FULLTEXT.
+
+returns: N/A
+***********************************************
+"""
+def create_index(conn, name: str, table: str, columns: list, unique: bool = False, kind: str = ""):
+    if name in {index["name"] for index in inspect(conn).get_indexes(table)}:
+        return
+    prefix = "UNIQUE " if unique else (f"{kind} " if kind else "")
+    statement = f"CREATE {prefix}INDEX {name} ON {table} ({', '.join(columns)})"
+    if conn.dialect.name == "mysql" and not kind:
+        statement += " ALGORITHM=INPLACE LOCK=NONE"
+    conn.execute(text(statement))
@@ -0,0 +1,40 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: v0001_initial.py
+
+Description: The original users and tasks tables.
+Databases that were created by the old
+create_all() startup already have them, so the
+tables are only created when missing.
+***********************************************
+"""
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, MetaData, String, Table
+
+VERSION = 1
+DESCRIPTION = "Create users and tasks tables"
+
+metadata = MetaData()
+
+Table(
+    "users",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String(50), unique=True, index=True, nullable=False),
+    Column("hashed_password", String(100), nullable=False),
+)
+
+Table(
+    "tasks",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String(100), nullable=False),
+    Column("description", String(255)),
+    Column("owner_id", Integer, ForeignKey("users.id")),
+    Column("completed", Boolean, default=False),
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
@@ -0,0 +1,47 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: v0002_task_numbers_and_indexes.py
+
+Description: Adds the task list pagination
+indexes, the per-owner task numbers (task_seq and
+tasks.number) and the tasks_version counter behind
+the task ETags. Existing tasks are numbered
+1, 2, 3... per owner in id order.
+***********************************************
+"""
+from sqlalchemy import text
+from . import add_column, create_index
+
+VERSION = 2
+DESCRIPTION = "Task pagination indexes, per-owner task numbers and tasks_version"
+
+
+def upgrade(conn):
+    create_index(conn, "ix_tasks_owner_id_id", "tasks", ["owner_id", "id"])
+    create_index(conn, "ix_tasks_owner_completed_id", "tasks", ["owner_id", "completed", "id"])
+
+    add_column(conn, "users", "task_seq INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "users", "tasks_version INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "tasks", "number INTEGER")
+
+    # Number the existing tasks per owner
+    if conn.dialect.name == "mysql":
+        conn.execute(text(
+            "UPDATE tasks t JOIN ("
+            "  SELECT id, ROW_NUMBER() OVER (PARTITION BY owner_id ORDER BY id) AS rn FROM tasks"
+            ") numbered ON t.id = numbered.id SET t.number = numbered.rn"
+        ))
+    else:
+        conn.execute(text(
+            "UPDATE tasks SET number = ("
+            "  SELECT COUNT(*) FROM tasks AS earlier"
+            "  WHERE earlier.owner_id = tasks.owner_id AND earlier.id <= tasks.id"
+            ")"
+        ))
+    conn.execute(text(
+        "UPDATE users SET task_seq = COALESCE((SELECT MAX(number) FROM tasks WHERE tasks.owner_id = users.id), 0)"
+    ))
+
+    create_index(conn, "ux_tasks_owner_number", "tasks", ["owner_id", "number"], unique=True)
@@ -0,0 +1,24 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: v0003_task_fulltext.py
+
+Description: Adds the FULLTEXT index over task
+titles and descriptions used by GET /tasks/search
+on MySQL. Other databases search with the API's
+in-process index instead, so nothing changes for
+them. InnoDB rebuilds the table the first time a
+FULLTEXT index is added, so run this migration
+when traffic is low.
+***********************************************
+"""
+from . import create_index
+
+VERSION = 3
+DESCRIPTION = "FULLTEXT index on task title and description (MySQL)"
+
+
+def upgrade(conn):
+    if conn.dialect.name == "mysql":
+        create_index(conn, "ft_tasks_title_description", "tasks", ["title", "description"], kind="FULLTEXT")
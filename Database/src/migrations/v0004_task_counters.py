@@ -0,0 +1,26 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: v0004_task_counters.py
+
+Description: Adds the per-user task_count and
+completed_count counters behind GET /tasks/summary
+and fills them in from the existing tasks.
+***********************************************
+"""
+from sqlalchemy import text
+from . import add_column
+
+VERSION = 4
+DESCRIPTION = "Per-user task_count and completed_count"
+
+
+def upgrade(conn):
+    add_column(conn, "users", "task_count INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "users", "completed_count INTEGER NOT NULL DEFAULT 0")
+    conn.execute(text(
+        "UPDATE users SET"
+        " task_count = (SELECT COUNT(*) FROM tasks WHERE tasks.owner_id = users.id),"
+        " completed_count = (SELECT COUNT(*) FROM tasks WHERE tasks.owner_id = users.id AND tasks.completed)"
+    ))
@@ -0,0 +1,20 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: v0005_token_version.py
+
+Description: Adds users.token_version. Access and
+refresh tokens carry the version they were issued
+at. Bumping it on a password change or rename
+revokes every token issued before.
+***********************************************
+"""
+from . import add_column
+
+VERSION = 5
+DESCRIPTION = "Per-user token_version for token revocation"
+
+
+def upgrade(conn):
+    add_column(conn, "users", "token_version INTEGER NOT NULL DEFAULT 0")
@@ -0,0 +1,37 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: v0006_task_ordering.py
+
+Description: Adds the task due date, priority and
+user-defined position, with an index per sort
+order of the task list, and users.last_position,
+where new tasks are put. Existing tasks keep their
+current order: each one is positioned by its
+per-owner number, POSITION_GAP apart.
+***********************************************
+"""
+from sqlalchemy import text
+from . import add_column, create_index
+
+VERSION = 6
+DESCRIPTION = "Task due_at, priority and position with sort indexes"
+
+# Must match POSITION_GAP in API/src/app/routes/tasks.py
+POSITION_GAP = 1024
+
+
+def upgrade(conn):
+    add_column(conn, "tasks", "due_at DATETIME NULL")
+    add_column(conn, "tasks", "priority INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "tasks", "position DOUBLE PRECISION NOT NULL DEFAULT 0")
+    add_column(conn, "users", "last_position DOUBLE PRECISION NOT NULL DEFAULT 0")
+    conn.execute(text(f"UPDATE tasks SET position = COALESCE(number, id) * {POSITION_GAP}"))
+    conn.execute(text(
+        "UPDATE users SET last_position = COALESCE((SELECT MAX(position) FROM tasks WHERE tasks.owner_id = users.id), 0)"
+    ))
+
+    create_index(conn, "ix_tasks_owner_position_id", "tasks", ["owner_id", "position", "id"])
+    create_index(conn, "ix_tasks_owner_due_id", "tasks", ["owner_id", "due_at", "id"])
+    create_index(conn, "ix_tasks_owner_priority_id", "tasks", ["owner_id", "priority", "id"])
@@ -0,0 +1,20 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: v0007_task_title_index.py
+
+Description: Adds an (owner_id, title, id) index
+for the task list's title_prefix filter, so a
+prefix is looked up as a range of the owner's
+titles instead of a scan of all their tasks.
+***********************************************
+"""
+from . import create_index
+
+VERSION = 7
+DESCRIPTION = "Task title prefix index"
+
+
+def upgrade(conn):
+    create_index(conn, "ix_tasks_owner_title_id", "tasks", ["owner_id", "title", "id"])
@@ -0,0 +1,24 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: v0008_task_title_fulltext.py
+
+Description: Adds a FULLTEXT index over task
+titles alone (MySQL). MATCH needs an index with
+exactly the columns it names, so this is what lets
+GET /tasks/search rank title matches above
+description matches. Like migration 0003 it does
+nothing on other databases, and InnoDB may rebuild
+the table, so run it when traffic is low.
+***********************************************
+"""
+from . import create_index
+
+VERSION = 8
+DESCRIPTION = "FULLTEXT index on task title (MySQL)"
+
+
+def upgrade(conn):
+    if conn.dialect.name == "mysql":
+        create_index(conn, "ft_tasks_title", "tasks", ["title"], kind="FULLTEXT")
@@ -8,7 +8,7 @@ Description: This class is used to create tables
 for the database.
 ***********************************************
 """
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime, Double, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -18,7 +18,15 @@ from .database import Base
 Class: User(Base)
 
 Description: This class is used to create a
-table for users.
+table for users. task_seq is the last task number
+handed out to the user; it gives each user their
+own 1, 2, 3... task numbering. tasks_version goes
+up on every write to the user's tasks and backs
+the task ETags. task_count and completed_count are
+kept up to date by every task write, so the task
+summary never has to count rows. last_position is
+at or above the position of the user's last task,
+so new tasks are put at the end without a query.
 ***********************************************
 """
 class User(Base):
@@ -26,6 +34,12 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String(50), unique=True, index=True, nullable=False)  
     hashed_password = Column(String(100), nullable=False)                
+    task_seq = Column(Integer, nullable=False, default=0, server_default="0")
+    tasks_version = Column(Integer, nullable=False, default=0, server_default="0")
+    task_count = Column(Integer, nullable=False, default=0, server_default="0")
+    completed_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_position = Column(Double, nullable=False, default=0, server_default="0")
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     tasks = relationship("Task", back_populates="owner", cascade="all, delete-orphan")
 
@@ -34,7 +48,10 @@ class User(Base):
 Class: Task(Base)
 
 Description: This class is used to create a
-table for tasks.
+table for tasks. The composite indexes let the
+paginated task list read each page as a range
+scan over a single owner's rows, with or without
+a completed filter, in any of its sort orders.
 ***********************************************
 """
 class Task(Base):
@@ -44,5 +61,22 @@ class Task(Base):
     description = Column(String(255))                                       
     owner_id = Column(Integer, ForeignKey('users.id'))
     completed = Column(Boolean, default=False)
+    number = Column(Integer)                                                # Per-owner display number
+    due_at = Column(DateTime)                                               # UTC
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
+    position = Column(Double, nullable=False, default=0, server_default="0")  # User-defined order
 
-    owner = relationship("User", back_populates="tasks")
\ No newline at end of file
+    owner = relationship("User", back_populates="tasks")
+
+    __table_args__ = (
+        Index("ix_tasks_owner_id_id", "owner_id", "id"),
+        Index("ix_tasks_owner_completed_id", "owner_id", "completed", "id"),
+        Index("ux_tasks_owner_number", "owner_id", "number", unique=True),
+        Index("ix_tasks_owner_position_id", "owner_id", "position", "id"),
+        Index("ix_tasks_owner_due_id", "owner_id", "due_at", "id"),
+        Index("ix_tasks_owner_priority_id", "owner_id", "priority", "id"),
+        Index("ix_tasks_owner_title_id", "owner_id", "title", "id"),
+        # On MySQL migrations 0003 and 0008 also add FULLTEXT
+        # ft_tasks_title_description (title, description) and ft_tasks_title
+        # (title) for task search
+    )
\ No newline at end of file
@@ -0,0 +1,269 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: pool.py
+
+Description: Connection pool settings and pool
+instrumentation for the database engines. Pool
+sizing comes from environment variables so it can
+be tuned against MySQL's max_connections for each
+deployment, and every engine's pool reports its
+usage through a PoolMetrics object.
+
+Environment variables:
+- DB_POOL_SIZE: Connections kept open per engine (default 5).
+- DB_MAX_OVERFLOW: Extra connections allowed under bursts (default 10).
+- DB_POOL_RECYCLE: Seconds before a connection is replaced (default 1800).
+- DB_POOL_PRE_PING: Test connections before handing them out (default true).
+- DB_POOL_TIMEOUT: Seconds to wait for a free connection (default 30).
+***********************************************
+"""
+import os
+import time
+from threading import Lock
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+"""
+***********************************************
+Method: env_flag()
+
+Description: This method is used to read a
+true/false environment variable.
+
+Parameters:
+- name (str): The environment variable name.
+- default (bool): Value used when it is not set.
+
+returns: The flag as a boolean.
+***********************************************
+"""
+def env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+"""
+***********************************************
+Method: pool_settings_from_env()
+
+Description: This method is used to read the
+pool configuration from the environment.
+
+returns: A dictionary of create_engine() pool
+keyword arguments.
+***********************************************
+"""
+def pool_settings_from_env() -> dict:
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": env_flag("DB_POOL_PRE_PING", True),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    }
+
+
+"""
+***********************************************
+Class: PoolMetrics
+
+Description: Counters for one connection pool.
+They are fed by the pool events registered in
+instrument_engine() and by the timed checkout in
+the instrumented pool classes.
+***********************************************
+"""
+class PoolMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.engine = None
+        self._lock = Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.checkout_timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.overflow_max = 0
+
+    """
+    ***********************************************
+    Method: pool()
+
+    Description: This property is used to fetch the
+    engine's current pool. It is looked up on every
+    read, since engine.dispose() swaps in a new pool.
+
+    returns: The Pool, or None before instrument_engine().
+    ***********************************************
+    """
+    @property
+    def pool(self):
+        return self.engine.pool if self.engine is not None else None
+
+    """
+    ***********************************************
+    Method: record_wait()
+
+    Description: This method is used to record how
+    long a caller waited for a pooled connection.
+
+    Parameters:
+    - seconds (float): The time spent waiting.
+    - timed_out (bool): Whether the wait gave up.
+
+    returns: N/A
+    ***********************************************
+    """
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.checkout_timeouts += 1
+
+    def increment(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            pool = self.pool
+            if counter == "checkouts" and pool is not None:
+                self.overflow_max = max(self.overflow_max, pool.overflow())
+
+    """
+    ***********************************************
+    Method: snapshot()
+
+    Description: This method is used to read the
+    current pool gauges and counters.
+
+    returns: A dictionary of pool statistics.
+    ***********************************************
+    """
+    def snapshot(self) -> dict:
+        pool = self.pool
+        is_queue_pool = isinstance(pool, QueuePool)
+        with self._lock:
+            return {
+                "pool": self.name,
+                "size": pool.size() if is_queue_pool else None,
+                "checked_out": pool.checkedout() if is_queue_pool else None,
+                "checked_in": pool.checkedin() if is_queue_pool else None,
+                "overflow": max(pool.overflow(), 0) if is_queue_pool else None,
+                "overflow_max": self.overflow_max,
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "soft_invalidations": self.soft_invalidations,
+                "checkout_timeouts": self.checkout_timeouts,
+                "checkout_wait_seconds_total": round(self.wait_seconds_total, 6),
+                "checkout_wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+
+"""
+***********************************************
+Class: TimedCheckoutMixin
+
+Description: Pool mixin that times how long each
+checkout waits for a connection. The metrics
+object lives on the generated subclass so it
+survives Pool.recreate().
+***********************************************
+"""
+class TimedCheckoutMixin:
+    metrics: PoolMetrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+
+"""
+***********************************************
+Method: instrumented_pool_class()
+
+Description: This method is used to build a pool
+class that reports its checkout waits to the
+given metrics object.
+
+Parameters:
+- base (type): QueuePool or AsyncAdaptedQueuePool.
+- metrics (PoolMetrics): Where the timings go.
+
+returns: The instrumented pool class.
+***********************************************
+"""
+def instrumented_pool_class(base: type, metrics: PoolMetrics) -> type:
+    return type(f"Instrumented{base.__name__}", (TimedCheckoutMixin, base), {"metrics": metrics})
+
+
+"""
+***********************************************
+Method: engine_pool_kwargs()
+
+Description: This method is used to build the
+pool keyword arguments for create_engine() or
+create_async_engine(). In-memory SQLite keeps
+SQLAlchemy's default pool, since every pooled
+connection would otherwise open a new empty
+database.
+
+Parameters:
+- url (str): The database URL of the engine.
+- metrics (PoolMetrics): Metrics for this engine's pool.
+- is_async (bool): Whether this is for the async engine.
+
+returns: A dictionary of engine keyword arguments.
+***********************************************
+"""
+def engine_pool_kwargs(url: str, metrics: PoolMetrics, is_async: bool = False) -> dict:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return {}
+    base = AsyncAdaptedQueuePool if is_async else QueuePool
+    return {"poolclass": instrumented_pool_class(base, metrics), **pool_settings_from_env()}
+
+
+"""
+***********************************************
+Method: instrument_engine()
+
+Description: This method is used to hook the pool
+events of an engine up to its metrics object. The
+metrics keep the engine rather than its pool, so
+they follow the new pool after engine.dispose();
+the pool events carry over to it.
+
+Parameters:
+- engine (Engine): A synchronous engine (use
+  async_engine.sync_engine for the async one).
+- metrics (PoolMetrics): Metrics for this engine's pool.
+
+returns: N/A
+***********************************************
+"""
+def instrument_engine(engine, metrics: PoolMetrics):
+    metrics.engine = engine
+    for event_name, counter in (
+        ("connect", "connects"),
+        ("checkout", "checkouts"),
+        ("checkin", "checkins"),
+        ("invalidate", "invalidations"),
+        ("soft_invalidate", "soft_invalidations"),
+    ):
+        event.listen(engine, event_name, lambda *args, counter=counter: metrics.increment(counter))
@@ -0,0 +1,277 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: replicas.py
+
+Description: Routes read-only requests to the read
+replicas listed in DATABASE_REPLICA_URLS, so that
+task list and detail traffic does not compete with
+writes on the primary. Replicas are used in turn
+(round robin). A replica that cannot be reached
+is taken out of the rotation and its reads go to
+the next replica or to the primary. A background
+check puts it back once it answers again.
+
+Replicas lag behind the primary. So that users see
+their own changes, a replica only serves a user's
+read once it has their current tasks_version, read
+from the primary by the caller; otherwise the read
+goes to the next replica or the primary. This
+holds whichever worker handled the write. The
+worker that did handle it also keeps the user on
+the primary for READ_YOUR_WRITES_SECONDS, which
+saves it the version reads while the replicas are
+surely behind. Without replicas every read uses
+the primary.
+***********************************************
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from . import database, models
+
+# How long a user's reads stay on the primary after they write to this worker
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+# Seconds between health checks, and how long a failed replica is skipped
+REPLICA_HEALTH_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", "5"))
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+
+# Recent writers remembered per worker; the oldest are forgotten first
+RECENT_WRITERS_MAX = 100_000
+
+logger = logging.getLogger(__name__)
+
+
+"""
+***********************************************
+Class: Replica
+
+Description: One read replica: its engine, session
+factory and whether it is in the rotation.
+***********************************************
+"""
+class Replica:
+    __slots__ = ("name", "engine", "sessionmaker", "down_until")
+
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.sessionmaker = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+        self.down_until = 0.0
+
+
+"""
+***********************************************
+Class: ReplicaRouter
+
+Description: Picks the database a read should use.
+***********************************************
+"""
+class ReplicaRouter:
+    def __init__(self, replicas: Optional[List[Replica]] = None,
+                 read_your_writes_seconds: float = READ_YOUR_WRITES_SECONDS,
+                 retry_seconds: float = REPLICA_RETRY_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self._replicas = replicas
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.retry_seconds = retry_seconds
+        self.clock = clock
+        self.recent_writers = OrderedDict()
+        self.next_index = 0
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.lagging_reads = 0
+        self._checker: Optional[asyncio.Task] = None
+
+    """
+    ***********************************************
+    Method: replicas()
+
+    Description: This property is used to fetch the
+    replicas, building them from the configured
+    replica engines on first use.
+
+    returns: The list of Replicas.
+    ***********************************************
+    """
+    @property
+    def replicas(self) -> List[Replica]:
+        if self._replicas is None:
+            self._replicas = [Replica(f"replica{i}", engine) for i, engine in enumerate(database.replica_engines)]
+        return self._replicas
+
+    """
+    ***********************************************
+    Method: note_write()
+
+    Description: This method is used to record that a
+    user has written, so their reads stay on the
+    primary until the replicas have caught up.
+
+    Parameters:
+    - owner_id (int): The id of the user.
+
+    returns: N/A
+    ***********************************************
+    """
+    def note_write(self, owner_id: int):
+        if not self.replicas:
+            return
+        now = self.clock()
+        self.recent_writers.pop(owner_id, None)
+        self.recent_writers[owner_id] = now + self.read_your_writes_seconds
+        # Entries are in deadline order, so expired ones are at the front
+        while self.recent_writers:
+            oldest, deadline = next(iter(self.recent_writers.items()))
+            if deadline > now and len(self.recent_writers) <= RECENT_WRITERS_MAX:
+                break
+            del self.recent_writers[oldest]
+
+    """
+    ***********************************************
+    Method: wrote_recently()
+
+    Description: This method is used to check whether
+    a user's reads must stay on the primary.
+
+    Parameters:
+    - owner_id (int): The id of the user.
+
+    returns: True inside the read-your-writes window.
+    ***********************************************
+    """
+    def wrote_recently(self, owner_id: int) -> bool:
+        deadline = self.recent_writers.get(owner_id)
+        return deadline is not None and deadline > self.clock()
+
+    """
+    ***********************************************
+    Method: pick()
+
+    Description: This method is used to choose the
+    next replica in the rotation, skipping replicas
+    that recently failed.
+
+    returns: The Replica, or None if none is usable.
+    ***********************************************
+    """
+    def pick(self) -> Optional[Replica]:
+        now = self.clock()
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self.next_index % len(self.replicas)]
+            self.next_index += 1
+            if replica.down_until <= now:
+                return replica
+        return None
+
+    def mark_down(self, replica: Replica):
+        if replica.down_until <= self.clock():
+            logger.warning("Read replica %s is unavailable; reading from the others", replica.name)
+        replica.down_until = self.clock() + self.retry_seconds
+
+    """
+    ***********************************************
+    Method: replica_session()
+
+    Description: This method is used to open a
+    replica session for a read-only request. It
+    connects before returning, so an unreachable
+    replica is found here and the read fails over
+    instead of failing the request. With
+    min_tasks_version it also reads the user's
+    tasks_version on the replica, and skips a replica
+    that has not caught up to it. The session's
+    transaction has started by then, so the request
+    reads what the check saw.
+
+    Parameters:
+    - owner_id (int): The id of the user reading.
+    - min_tasks_version (int): The user's
+    tasks_version on the primary, if known.
+
+    returns: An AsyncSession the caller must close,
+    or None when the read should use the primary.
+    ***********************************************
+    """
+    async def replica_session(self, owner_id: int, min_tasks_version: Optional[int] = None) -> Optional[AsyncSession]:
+        if self.replicas and not self.wrote_recently(owner_id):
+            for _ in range(len(self.replicas)):
+                replica = self.pick()
+                if replica is None:
+                    break
+                session = replica.sessionmaker()
+                try:
+                    if min_tasks_version is None:
+                        await session.connection()
+                    else:
+                        version = (await session.execute(
+                            select(models.User.tasks_version).where(models.User.id == owner_id)
+                        )).scalar_one_or_none()
+                except (DBAPIError, OSError):
+                    await session.close()
+                    self.mark_down(replica)
+                    continue
+                if min_tasks_version is not None and (version is None or version < min_tasks_version):
+                    # Behind the user's last write, possibly made on another worker
+                    await session.close()
+                    self.lagging_reads += 1
+                    continue
+                self.replica_reads += 1
+                return session
+        self.primary_reads += 1
+        return None
+
+    """
+    ***********************************************
+    Method: check()
+
+    Description: This method is used to run a health
+    check on every replica, putting the ones that
+    answer back in the rotation.
+
+    returns: N/A
+    ***********************************************
+    """
+    async def check(self):
+        for replica in self.replicas:
+            try:
+                async with replica.engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+            except (DBAPIError, OSError):
+                self.mark_down(replica)
+            else:
+                if replica.down_until:
+                    logger.info("Read replica %s is back", replica.name)
+                replica.down_until = 0.0
+
+    async def _check_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            # Any other error would end the task silently and no replica
+            # would rejoin the rotation, so log it and check again later
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("Read replica health check failed")
+
+    async def start(self, interval: float = REPLICA_HEALTH_INTERVAL):
+        if self.replicas and self._checker is None:
+            self._checker = asyncio.create_task(self._check_forever(interval))
+
+    async def stop(self):
+        if self._checker is not None:
+            self._checker.cancel()
+            self._checker = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+router = ReplicaRouter()
@@ -0,0 +1,75 @@
+"""
+***********************************************
+Developer: Tai Sewell
+
+File: settings.py
+
+Description: Lazily loaded configuration. Nothing
+is read when this module is imported. The first
+call to get_settings() loads the repository's
+.env file (values already in the environment win)
+and checks that DATABASE_URL is set. The result
+is kept for the life of the process.
+***********************************************
+"""
+import os
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+ENV_FILE = os.path.join(os.path.dirname(__file__), '../../.env')
+
+
+"""
+***********************************************
+Class: Settings(NamedTuple)
+
+Description: The database configuration.
+***********************************************
+"""
+class Settings(NamedTuple):
+    database_url: str
+    async_database_url: Optional[str]
+    replica_urls: List[str]
+
+
+"""
+***********************************************
+Method: load_environment()
+
+Description: This method is used to load the .env
+file into os.environ, once per process.
+
+returns: N/A
+***********************************************
+"""
+@lru_cache(maxsize=None)
+def load_environment():
+    from dotenv import load_dotenv
+    load_dotenv(dotenv_path=ENV_FILE)
+
+
+"""
+***********************************************
+Method: get_settings()
+
+Description: This method is used to read the
+database settings from the environment the first
+time they are needed.
+
+returns: The Settings.
+
+raises:
+- ValueError: If DATABASE_URL is not set.
+***********************************************
+"""
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    load_environment()
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise ValueError("DATABASE_URL not found in environment variables")
+    return Settings(
+        database_url=database_url,
+        async_database_url=os.getenv("ASYNC_DATABASE_URL") or None,
+        replica_urls=[url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()],
+    )
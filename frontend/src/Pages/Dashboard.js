@@ -13,6 +13,8 @@ function Dashboard() {
     const [editedDescription, setEditedDescription] = useState("");
     const [editedCompleted, setEditedCompleted] = useState(false);
     const [accountDeleted, setAccountDeleted] = useState(false);
+    const [nextCursor, setNextCursor] = useState(null); // Cursor of the next page, null on the last one
+    const [loadingMore, setLoadingMore] = useState(false);
 
     /********************************************************
      * useEffect Hook
@@ -28,37 +30,60 @@ function Dashboard() {
 
     /********************************************************
      * Function: fetchTasks
-     * Description: Fetches all tasks for the authenticated user using
-     * the token stored in localStorage. Updates the local state with
-     * the retrieved task data. Called on initial render and after task
-     * updates, deletions, or additions.
+     * Description: Fetches one page of tasks for the authenticated
+     * user using the token stored in localStorage. Without a cursor it
+     * loads the first page and replaces the list; with one it appends
+     * the next page. The X-Next-Cursor header of the response is kept
+     * for the "Load more" button. Called on initial render and when
+     * the user asks for more tasks.
+     *
+     * Parameters:
+     *  - cursor (string): The X-Next-Cursor of the last page loaded.
     ********************************************************/
-    const fetchTasks = async () => {
+    const fetchTasks = async (cursor = null) => {
         //console.log("Authorization header:", `Bearer ${token}`); // Need to delete this line when pushing to prod
 
         try {
-            const response = await fetch("http://localhost:8000/tasks/", {
+            const url = cursor
+                ? `http://localhost:8000/tasks/?after=${encodeURIComponent(cursor)}`
+                : "http://localhost:8000/tasks/";
+            const response = await fetch(url, {
                 headers: {
                     Authorization: `Bearer ${token}`,
                 },
             });
-            if (response.ok) {
-                const data = await response.json();
-                setTasks(data);
-            } else {
+            if (!response.ok) {
                 alert("Failed to load tasks.");
+                return;
             }
+            const data = await response.json();
+            setTasks((prevTasks) => (cursor ? prevTasks.concat(data) : data));
+            setNextCursor(response.headers.get("X-Next-Cursor"));
         } catch (error) {
             console.error("Error fetching tasks:", error);
         }
     };
 
+    /********************************************************
+     * Function: handleLoadMore
+     * Description: Loads the next page of tasks after the ones
+     * already shown, ignoring clicks while a page is loading.
+    ********************************************************/
+    const handleLoadMore = async () => {
+        if (!nextCursor || loadingMore) return;
+        setLoadingMore(true);
+        await fetchTasks(nextCursor);
+        setLoadingMore(false);
+    };
+
     /********************************************************
      * Function: handleAddTask
      * Description: Sends a POST request to the backend API to create
      * a new task using the value from the newTask state. If the task
-     * is successfully added, clears the input field and refreshes the
-     * task list by calling fetchTasks.
+     * is successfully added, clears the input field and adds the new
+     * task to the end of the list. When later pages are not loaded
+     * yet, the task is left for "Load more" to bring in, so it is
+     * neither shown out of order nor twice.
     ********************************************************/
     const handleAddTask = async () => {
         if (!newTask.trim()) return;
@@ -77,8 +102,11 @@ function Dashboard() {
                  })
             });
             if (response.ok) {
+                const createdTask = await response.json();
                 setNewTask("");
-                fetchTasks(); // Refresh the task list
+                if (!nextCursor) {
+                    setTasks((prevTasks) => [...prevTasks, createdTask]);
+                }
             } else {
                 alert("Failed to add task.");
             }
@@ -141,7 +169,7 @@ function Dashboard() {
      * Function: handleDeleteTask
      * Description: Sends a DELETE request to remove a task identified
      * by taskId from the backend for the authenticated user. If successful,
-     * fetches and updates the task list to reflect the change.
+     * removes it from the local task list.
      * 
      * Parameters:
      *  - taskId (number): The ID of the task to delete.
@@ -155,7 +183,7 @@ function Dashboard() {
                 },
             });
             if (response.ok) {
-                fetchTasks(); // Refresh the list
+                setTasks((prevTasks) => prevTasks.filter((task) => task.id !== taskId));
             } else {
                 alert("Failed to delete task.");
             }
@@ -306,6 +334,12 @@ return (
   ))}
 </ul>
 
+        {nextCursor && (
+            <button className="dashboard-load-more" onClick={handleLoadMore} disabled={loadingMore}>
+                {loadingMore ? "Loading..." : "Load more"}
+            </button>
+        )}
+
         <div className="dashboard-actions">
             <button onClick={handleLogout}>Logout</button>
             <button onClick={handleDeleteAccount}>Delete Account</button>